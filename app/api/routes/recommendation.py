@@ -1,34 +1,39 @@
-import random
+import math
 import time
+import logging
 from aiohttp_retry import Tuple
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
 from typing import Optional, List
 from app.models.song import Pool_Song
+from app.core.config import settings
+from app.core.metrics import STAGE_LATENCY
+from app.core.tracing import span
+from app.core.media_pool import MediaPoolSaturated
+from app.core.circuit_breaker import CircuitOpenError
 from app.rec_service.recommendation import RecommendationService
-from app.utils.file_handlers import save_upload_file, read_file_content
+from app.utils.file_handlers import read_upload
 from app.services.service_instances import openai_service, spotify_service
-import os
-import tempfile
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 recommendation_service = RecommendationService()
 
-@router.post("/recommend", response_model=List[Tuple[Pool_Song, float]])
-async def get_song_recommendations(
-    image: UploadFile = File(...),
-    audio: Optional[UploadFile] = File(None),
-    location: Optional[str] = Form(None),
-    session_id: str = Form(...)
-):
+async def _rank_request(
+    engine: str,
+    image: UploadFile,
+    audio: Optional[UploadFile],
+    location: Optional[str],
+    session_id: str,
+    latency_budget_s: Optional[float],
+    llm_call_budget: Optional[int],
+    cascade: Optional[bool],
+) -> List[Tuple[Pool_Song, float]]:
     """
-    Get song recommendations based on an image, optional audio file, and optional location.
-    
-    Args:
-        image: Required image file for analysis
-        audio: Optional audio file for analysis
-        location: Optional location string in format "latitude,longitude"
-        session_id: Required Spotify session ID for user context
+    Shared pipeline of the recommendation endpoints: plan the pool, fill it while
+    preparing the context, shortlist or stratify it, rank it with engine
+    ("tourney" or "genetic") and queue the result on the user's device.
     """
     try:
         # Initialize audio-related variables
@@ -36,94 +41,163 @@ async def get_song_recommendations(
         audio_data = None
         image_data = None
 
-        # Create temporary files for processing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # --- Process Image (Required) ---
-            image_path = os.path.join(temp_dir, image.filename)
-            await save_upload_file(image, image_path)
-            image_data = await read_file_content(image_path)
-
-            # --- Process Audio (Optional) ---
-            if audio:
-                if not audio.filename:
-                    raise HTTPException(status_code=400, detail="Audio file name is missing.")
-                audio_path = os.path.join(temp_dir, audio.filename)
-                await save_upload_file(audio, audio_path)
-                audio_data = await read_file_content(audio_path)
-
-            time_prepare_start = time.time()
-            time_make_candidate_pool_start = time.time()
-            # Run prepare and candidate pool creation in parallel
-            prepare_task = asyncio.create_task(
-                recommendation_service.prepare(
+        # --- Process Image (Required), each upload is read once ---
+        image_data = (await read_upload(image, settings.MAX_IMAGE_UPLOAD_BYTES)).data
+
+        # --- Process Audio (Optional) ---
+        if audio:
+            if not audio.filename:
+                raise HTTPException(status_code=400, detail="Audio file name is missing.")
+            audio_data = (await read_upload(audio, settings.MAX_AUDIO_UPLOAD_BYTES)).data
+
+        time_prepare_start = time.time()
+        time_make_candidate_pool_start = time.time()
+        # Size the pool for the budget so sources only fetch songs that will be ranked
+        cascade = settings.CASCADE_RANKING if cascade is None else cascade
+        plan = recommendation_service.pool_planner.plan(engine, latency_budget_s, llm_call_budget, cascade)
+        # Fill the candidate pool in the background while preparing context
+        candidate_pool = recommendation_service.create_candidate_pool(session_id)
+        candidate_pool_task = asyncio.create_task(candidate_pool.add_songs_parallel(plan.source_targets))
+        try:
+            with span("prepare"):
+                context = await recommendation_service.prepare(
                     image_data=image_data,
                     audio_data=audio_data,
                     location=location,
                     session_id=session_id
                 )
-            )
-            candidate_pool_task = asyncio.create_task(
-                recommendation_service.make_candidate_pool(
-                    session_id=session_id
+            time_prepare_end = time.time()
+            # Ranking starts once enough songs arrived, the rest stream into the running engine
+            with span("candidate_pool.wait", min_pool_size=plan.min_pool_size):
+                await candidate_pool.wait_for_size(plan.min_pool_size)
+                if plan.cascade:
+                    # The cascade pre-ranks the whole pool, so give the sources a bounded time to finish
+                    await asyncio.wait({candidate_pool_task}, timeout=settings.CASCADE_FILL_TIMEOUT_S)
+            time_make_candidate_pool_end = time.time()
+            arrived_songs = list(candidate_pool.get_pool())
+            local_scores = None
+            if plan.cascade:
+                # Only the locally best songs are ranked with LLM calls
+                late_songs = None
+                initial_pool, local_scores = recommendation_service.cascade_shortlist(
+                    context, arrived_songs, plan.pool_size, plan.max_per_artist
+                )
+            else:
+                late_songs = candidate_pool.stream(start=len(arrived_songs))
+                # Keep the planned number of songs, spread across sources and artists
+                initial_pool = recommendation_service.pool_planner.stratify(
+                    arrived_songs, candidate_pool.song_sources, plan.pool_size, plan.max_per_artist
                 )
+            logger.info(
+                "Ranking %d of %d songs, planned pool size %d",
+                len(initial_pool), len(arrived_songs), plan.pool_size,
             )
-            _, candidate_pool = await asyncio.gather(prepare_task, candidate_pool_task)
-            print("Finished preparing recommendation service")
-            now_ts = time.time()
-            time_prepare_end = now_ts
-            time_make_candidate_pool_end = now_ts
-            print("Prepare Time", time_prepare_end - time_prepare_start)
-            print("Candidate Pool Time", time_make_candidate_pool_end - time_make_candidate_pool_start)
-
-            # MIGHT NEED TO REMOVE THIS
-            # MAKES IT SO I DON"T HAVE TOO BIG OF A TOURNAMENT
-            #TODO Make this a flag or parameter I can choose on frontend
-            max_size = 75
-            if len(candidate_pool) > max_size:
-                print(f"Shuffling candidate pool from {len(candidate_pool)} to {max_size}")
-                random.shuffle(candidate_pool)
-                candidate_pool = candidate_pool[:max_size]
-            # times already captured above after both tasks completed
             time_find_recommendations_start = time.time()
-            # Get recommendations using the candidate pool
-            recommendations = await recommendation_service.find_recommendations(candidate_pool)
-            time_find_recommendations_end = time.time()
-
-            if not recommendations:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No recommendations found based on the provided inputs"
+            # Late songs fill the remaining slots (tourney) or become available to mutations (genetic)
+            if engine == "genetic":
+                ranking = recommendation_service.find_recommendations_genetic(
+                    context,
+                    initial_pool,
+                    late_songs=late_songs,
+                    max_late_songs=plan.pool_size - len(initial_pool),
+                    generations=plan.ga_generations,
+                    num_runs=plan.ga_runs,
+                    local_scores=local_scores,
                 )
+            else:
+                ranking = recommendation_service.find_recommendations(
+                    context,
+                    initial_pool,
+                    late_songs=late_songs,
+                    max_late_songs=plan.pool_size - len(initial_pool),
+                    num_tournaments=plan.num_tournaments,
+                    local_scores=local_scores,
+                )
+            with span("ranking", engine=engine, pool_size=len(initial_pool)):
+                recommendations = await ranking
+            time_find_recommendations_end = time.time()
+        finally:
+            # Stop fetching songs the ranking can no longer use
+            candidate_pool_task.cancel()
+            await asyncio.gather(candidate_pool_task, return_exceptions=True)
+
+        if not recommendations:
+            raise HTTPException(
+                status_code=404,
+                detail="No recommendations found based on the provided inputs"
+            )
 
-            time_end = time.time()
-            print(f"Total time taken: {time_end - time_start} seconds")
-            print(f"Time taken to prepare: {time_prepare_end - time_prepare_start} seconds")
-            print(f"Time taken to make candidate pool: {time_make_candidate_pool_end - time_make_candidate_pool_start} seconds")
-            print(f"Time taken to find recommendations: {time_find_recommendations_end - time_find_recommendations_start} seconds")
-            # Queue the recommended songs on the user's active Spotify device
-            try:
-                songs_only = [song for (song, _score) in recommendations]
+        time_end = time.time()
+        logger.info(
+            "Recommendation timings (%s): total %.2fs, prepare %.2fs, candidate pool %.2fs, find recommendations %.2fs",
+            engine,
+            time_end - time_start,
+            time_prepare_end - time_prepare_start,
+            time_make_candidate_pool_end - time_make_candidate_pool_start,
+            time_find_recommendations_end - time_find_recommendations_start,
+        )
+        STAGE_LATENCY.observe(time_prepare_end - time_prepare_start, stage="prepare", engine=engine)
+        STAGE_LATENCY.observe(time_make_candidate_pool_end - time_make_candidate_pool_start, stage="candidate_pool", engine=engine)
+        STAGE_LATENCY.observe(time_find_recommendations_end - time_find_recommendations_start, stage="ranking", engine=engine)
+        # Queue the recommended songs on the user's active Spotify device
+        try:
+            songs_only = [song for (song, _score) in recommendations]
+            with STAGE_LATENCY.labels(stage="queueing", engine=engine).time(), span("queueing"):
                 await spotify_service.add_tracks_to_queue(session_id, songs_only)
-            except Exception as e:
-                # Do not block response on queue failures
-                print(f"Error queueing recommended songs: {e}")
-            
-            return recommendations
+        except Exception as e:
+            # Do not block response on queue failures
+            logger.warning("Error queueing recommended songs (%s): %s", engine, e)
+
+        return recommendations
 
     except HTTPException as http_exc:
         raise http_exc
+    except MediaPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after_s) or 1)})
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
+@router.post("/recommend", response_model=List[Tuple[Pool_Song, float]])
+async def get_song_recommendations(
+    image: UploadFile = File(...),
+    audio: Optional[UploadFile] = File(None),
+    location: Optional[str] = Form(None),
+    session_id: str = Form(...),
+    latency_budget_s: Optional[float] = Form(None),
+    llm_call_budget: Optional[int] = Form(None),
+    cascade: Optional[bool] = Form(None)
+):
+    """
+    Get song recommendations based on an image, optional audio file, and optional location.
+    
+    Args:
+        image: Required image file for analysis
+        audio: Optional audio file for analysis
+        location: Optional location string in format "latitude,longitude"
+        session_id: Required Spotify session ID for user context
+        latency_budget_s: Optional target ranking latency used to size the candidate pool
+        llm_call_budget: Optional maximum number of LLM calls used to size the candidate pool
+        cascade: Pre-rank the whole fetched pool locally and rank only the shortlist with LLM calls
+            (defaults to CASCADE_RANKING)
+    """
+    return await _rank_request(
+        "tourney", image, audio, location, session_id, latency_budget_s, llm_call_budget, cascade
+    )
+
 @router.post("/recommend-genetic", response_model=List[Tuple[Pool_Song, float]])
 async def get_song_recommendations_genetic(
     image: UploadFile = File(...),
     audio: Optional[UploadFile] = File(None),
     location: Optional[str] = Form(None),
-    session_id: str = Form(...)
+    session_id: str = Form(...),
+    latency_budget_s: Optional[float] = Form(None),
+    llm_call_budget: Optional[int] = Form(None),
+    cascade: Optional[bool] = Form(None)
 ):
     """
     Get song recommendations using genetic algorithm based on an image, optional audio file, and optional location.
@@ -133,82 +207,11 @@ async def get_song_recommendations_genetic(
         audio: Optional audio file for analysis
         location: Optional location string in format "latitude,longitude"
         session_id: Required Spotify session ID for user context
+        latency_budget_s: Optional target ranking latency used to size the candidate pool
+        llm_call_budget: Optional maximum number of LLM calls used to size the candidate pool
+        cascade: Pre-rank the whole fetched pool locally and rank only the shortlist with LLM calls
+            (defaults to CASCADE_RANKING)
     """
-    try:
-        # Initialize audio-related variables
-        time_start = time.time()
-        audio_data = None
-        image_data = None
-
-        # Create temporary files for processing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # --- Process Image (Required) ---
-            image_path = os.path.join(temp_dir, image.filename)
-            await save_upload_file(image, image_path)
-            image_data = await read_file_content(image_path)
-
-            # --- Process Audio (Optional) ---
-            if audio:
-                if not audio.filename:
-                    raise HTTPException(status_code=400, detail="Audio file name is missing.")
-                audio_path = os.path.join(temp_dir, audio.filename)
-                await save_upload_file(audio, audio_path)
-                audio_data = await read_file_content(audio_path)
-
-            time_prepare_start = time.time()
-            time_make_candidate_pool_start = time.time()
-            # Run prepare and candidate pool creation in parallel
-            prepare_task = asyncio.create_task(
-                recommendation_service.prepare(
-                    image_data=image_data,
-                    audio_data=audio_data,
-                    location=location,
-                    session_id=session_id
-                )
-            )
-            candidate_pool_task = asyncio.create_task(
-                recommendation_service.make_candidate_pool(
-                    session_id=session_id
-                )
-            )
-            _, candidate_pool = await asyncio.gather(prepare_task, candidate_pool_task)
-            print("Finished preparing recommendation service")
-            now_ts = time.time()
-            time_prepare_end = now_ts
-            time_make_candidate_pool_end = now_ts
-            print("Prepare Time", time_prepare_end - time_prepare_start)
-            print("Candidate Pool Time", time_make_candidate_pool_end - time_make_candidate_pool_start)
-            
-            time_find_recommendations_start = time.time()
-            # Get recommendations using genetic algorithm
-            recommendations = await recommendation_service.find_recommendations_genetic(candidate_pool)
-            time_find_recommendations_end = time.time()
-
-            if not recommendations:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No recommendations found based on the provided inputs"
-                )
-
-            time_end = time.time()
-            print(f"Total time taken: {time_end - time_start} seconds")
-            print(f"Time taken to prepare: {time_prepare_end - time_prepare_start} seconds")
-            print(f"Time taken to make candidate pool: {time_make_candidate_pool_end - time_make_candidate_pool_start} seconds")
-            print(f"Time taken to find recommendations GENETIC: {time_find_recommendations_end - time_find_recommendations_start} seconds")
-            # Queue the recommended songs on the user's active Spotify device
-            try:
-                songs_only = [song for (song, _score) in recommendations]
-                await spotify_service.add_tracks_to_queue(session_id, songs_only)
-            except Exception as e:
-                # Do not block response on queue failures
-                print(f"Error queueing recommended songs (genetic): {e}")
-            
-            return recommendations
-
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"An unexpected error occurred: {str(e)}"
-        )
\ No newline at end of file
+    return await _rank_request(
+        "genetic", image, audio, location, session_id, latency_budget_s, llm_call_budget, cascade
+    )
@@ -4,6 +4,9 @@ from app.services.spotify_service import SpotifyService
 from app.core.config import settings
 from typing import Dict, Optional
 from app.services.service_instances import spotify_service
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -37,7 +40,7 @@ async def check_auth(session_id: Optional[str] = None):
     """
     Check if a user is authenticated with Spotify
     """
-    print(f"[/check-auth] endpoint hit with session_id: {session_id}")
+    logger.debug("[/check-auth] endpoint hit")
     if not session_id:
         return JSONResponse({"authenticated": False, "message": "No session ID provided"})
     
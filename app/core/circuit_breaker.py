@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import BREAKER_STATE, BREAKER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+# Values of the circuit_breaker_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose breaker is open"""
+    def __init__(self, message: str, retry_after_s: float):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    """
+    Breaker for one service and call type. Closed, it records the outcome of
+    every call over a rolling window of window_s; once the window holds
+    min_calls calls and failure_rate of them failed or took at least
+    slow_call_s, it opens and allow() returns False for open_s. It then goes
+    half-open and lets half_open_probes trial calls through: any failure
+    re-opens it, that many successes close it.
+    """
+    def __init__(
+        self,
+        service: str,
+        call: str,
+        window_s: float = settings.LLM_BREAKER_WINDOW_S,
+        min_calls: int = settings.LLM_BREAKER_MIN_CALLS,
+        failure_rate: float = settings.LLM_BREAKER_FAILURE_RATE,
+        slow_call_s: float = float("inf"),
+        open_s: float = settings.LLM_BREAKER_OPEN_S,
+        half_open_probes: int = settings.LLM_BREAKER_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.service = service
+        self.call = call
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (finish time, failed) of recent calls while closed
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        BREAKER_STATE.labels(service=service, call=call).set(STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def retry_after_s(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_s - self.clock())
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; a True from a half-open breaker reserves a probe"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, success: bool, latency_s: float) -> None:
+        """Record the outcome of a call that allow() let through"""
+        failed = not success or latency_s >= self.slow_call_s
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._transition(CLOSED)
+            elif self._state == CLOSED:
+                now = self.clock()
+                self._outcomes.append((now, failed))
+                self._failures += failed
+                self._trim(now)
+                if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+                    self._transition(OPEN)
+            # Calls started before the breaker opened are ignored once it is open
+
+    def release(self) -> None:
+        """A call let through by allow() was cancelled before it finished"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_s:
+            _finished, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and self.clock() >= self._opened_at + self.open_s:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str) -> None:
+        logger.warning("Circuit breaker %s.%s: %s -> %s", self.service, self.call, self._state, state)
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self.clock()
+        self._outcomes.clear()
+        self._failures = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        BREAKER_STATE.labels(service=self.service, call=self.call).set(STATE_VALUES[state])
+        BREAKER_TRANSITIONS.inc(service=self.service, call=self.call, state=state)
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(service: str, call: str, slow_call_s: Optional[float] = None) -> CircuitBreaker:
+    """The shared breaker for one service and call type, created on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get((service, call))
+        if breaker is None:
+            breaker = _breakers[(service, call)] = CircuitBreaker(
+                service, call, slow_call_s=float("inf") if slow_call_s is None else slow_call_s
+            )
+        return breaker
+
+
+def reset_breakers() -> None:
+    """Forget every breaker (tests)"""
+    with _breakers_lock:
+        _breakers.clear()
@@ -19,6 +19,163 @@ class Settings(BaseSettings):
     GOOGLE_MAPS_KEY: str
     
     GEMINI_API_KEY: str
+
+    # Candidate pool streaming: ranking starts once context is ready and the
+    # pool holds at least this many songs; later songs join subsequent rounds
+    CANDIDATE_POOL_MIN_SIZE: int = 40
+    CANDIDATE_POOL_MAX_SIZE: int = 75
+
+    # Pool planning: expected per-call LLM latency used to size the pool for a
+    # latency budget, and how many extra songs to fetch to cover duplicates
+    LLM_JUDGE_LATENCY_S: float = 1.5
+    LLM_FITNESS_LATENCY_S: float = 1.5
+    CANDIDATE_POOL_OVERFETCH_FACTOR: float = 1.3
+    CANDIDATE_POOL_MAX_PER_ARTIST: int = 3
+
+    # LLM calls: per-attempt timeout by call type ("judge=10,vision=30"), with
+    # LLM_DEFAULT_TIMEOUT_S for the rest; timeouts, 429s and 5xx are retried up to
+    # LLM_MAX_ATTEMPTS times with jittered exponential backoff
+    LLM_CALL_TIMEOUTS_S: str = "judge=10,fitness=10,user_context=20,vision=30,audio_analysis=20,transcription=60"
+    LLM_DEFAULT_TIMEOUT_S: float = 20.0
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_WAIT_S: float = 0.5
+    LLM_RETRY_MAX_WAIT_S: float = 4.0
+    # Hedging: a judge or fitness call still pending after its threshold ("judge=3,fitness=3")
+    # is also sent to the other provider and the first valid answer wins; empty disables it
+    LLM_HEDGE_AFTER_S: str = ""
+    # Circuit breakers per provider and call type: when LLM_BREAKER_FAILURE_RATE of the
+    # calls in the last LLM_BREAKER_WINDOW_S (at least LLM_BREAKER_MIN_CALLS) failed or were
+    # slower than LLM_BREAKER_SLOW_CALL_S ("judge=8"), calls go to the other provider for
+    # LLM_BREAKER_OPEN_S, then LLM_BREAKER_HALF_OPEN_PROBES trial calls decide whether to close
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_WINDOW_S: float = 30.0
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_FAILURE_RATE: float = 0.5
+    LLM_BREAKER_SLOW_CALL_S: str = "judge=8,fitness=8"
+    LLM_BREAKER_OPEN_S: float = 15.0
+    LLM_BREAKER_HALF_OPEN_PROBES: int = 2
+
+    # Judge mode: "llm", "local" (feature model in app/rec_service/local_judge.py) or
+    # "hybrid" (the local judge decides tournament matchups whose score margin is at least
+    # LOCAL_JUDGE_HYBRID_MARGIN, the LLM the rest). With LOCAL_JUDGE_FALLBACK the local
+    # judge also answers when every provider fails or has its breaker open
+    JUDGE_MODE: str = "llm"
+    LOCAL_JUDGE_WEIGHTS: str = "popularity=0.1,recency=0.05,duration=0.1,genre=0.4,energy=0.35"
+    LOCAL_JUDGE_HYBRID_MARGIN: float = 0.15
+    LOCAL_JUDGE_FALLBACK: bool = True
+
+    # Cascade ranking: every fetched song is scored locally (local judge features plus
+    # CASCADE_AFFINITY_WEIGHT of affinity to the user's top and recent artists), only the
+    # planned pool size goes to the tournament/GA, and CASCADE_BLEND_WEIGHT of the local
+    # score is blended into the final ranking. CASCADE_FILL_TIMEOUT_S bounds the wait for
+    # the rest of the pool once ranking could start
+    CASCADE_RANKING: bool = False
+    CASCADE_AFFINITY_WEIGHT: float = 0.3
+    CASCADE_BLEND_WEIGHT: float = 0.25
+    CASCADE_FILL_TIMEOUT_S: float = 3.0
+
+    # Tournament score aggregation: "rounds" scores songs by the rounds they reached,
+    # "bradley_terry" fits strengths to every judgement of the request
+    # (app/rec_service/bradley_terry.py). With Bradley-Terry the brackets stop once the
+    # top recommendations are apart by TOURNEY_SEPARATION_Z standard errors, checked
+    # every TOURNEY_SEPARATION_CHECK_EVERY judgements
+    TOURNEY_AGGREGATION: str = "rounds"
+    BRADLEY_TERRY_PRIOR_GAMES: float = 1.0
+    TOURNEY_SEPARATION_Z: float = 1.64
+    TOURNEY_SEPARATION_CHECK_EVERY: int = 16
+
+    # Tournament selection: "brackets" scores songs over three full brackets,
+    # "tree" builds one bracket and replays the winner's path for each next best song
+    # (app/rec_service/topk_selection.py), about n + k log2 n judgements for the top k.
+    # With COMPARISON_CACHE_ENABLED, LLM judgements are reused across brackets and
+    # requests made under the same prompt context, and COMPARISON_CACHE_AWARE_PAIRING
+    # pairs first-round songs whose outcome is cached where it can (randomly otherwise)
+    TOURNEY_SELECTION: str = "brackets"
+    COMPARISON_CACHE_ENABLED: bool = False
+    COMPARISON_CACHE_AWARE_PAIRING: bool = True
+    COMPARISON_CACHE_TTL_S: float = 3600.0
+    COMPARISON_CACHE_MAX_ENTRIES: int = 50000
+
+    # Per-user ratings: with RATING_STORE ("sqlite" at RATING_STORE_PATH, or "redis" at
+    # RATING_STORE_REDIS_URL) every tournament judgement updates Elo ratings per user,
+    # track and coarse context bucket. Later requests seed their brackets with them and
+    # blend RATING_BLEND_WEIGHT of them into the tournament scores
+    RATING_STORE: str = ""
+    RATING_STORE_PATH: str = "data/ratings.sqlite3"
+    RATING_STORE_REDIS_URL: str = "redis://localhost:6379/0"
+    RATING_STORE_TTL_S: int = 90 * 24 * 3600
+    RATING_ELO_K: float = 24.0
+    RATING_BLEND_WEIGHT: float = 0.2
+    RATING_SEED_NOISE: float = 50.0
+
+    # Weather: current conditions are cached per geohash cell (5 characters is ~5 km)
+    # for WEATHER_CACHE_TTL_S
+    WEATHER_CACHE_GEOHASH_PRECISION: int = 5
+    WEATHER_CACHE_TTL_S: float = 900.0
+    WEATHER_CACHE_MAX_ENTRIES: int = 10000
+    WEATHER_HTTP_TIMEOUT_S: float = 10.0
+
+    # Song genres: Spotify tracks carry none, so with SPOTIFY_ARTIST_GENRES each fetched
+    # song gets the genres of its artists, looked up in batches and cached per artist
+    # for SPOTIFY_ARTIST_GENRES_TTL_S
+    SPOTIFY_ARTIST_GENRES: bool = True
+    SPOTIFY_ARTIST_GENRES_TTL_S: float = 86400.0
+    SPOTIFY_ARTIST_GENRES_MAX_ENTRIES: int = 50000
+
+    # Outbound HTTP (app/core/http_transport.py): pooled connections per host kept alive
+    # for HTTP_KEEPALIVE_S (HTTP_LLM_POOL_SIZE for the OpenAI and Gemini hosts, which see
+    # a tournament's worth of concurrent calls), DNS answers cached for HTTP_DNS_CACHE_TTL_S
+    # (aiohttp clients), and with HTTP_WARM_CONNECTIONS a connection opened to each API at startup
+    HTTP_POOL_SIZE_PER_HOST: int = 20
+    HTTP_LLM_POOL_SIZE: int = 200
+    HTTP_KEEPALIVE_S: float = 60.0
+    HTTP_DNS_CACHE_TTL_S: int = 300
+    HTTP_WARM_CONNECTIONS: bool = True
+    HTTP_WARM_TIMEOUT_S: float = 3.0
+
+    # Logging: LOG_LEVELS overrides per module ("app.rec_service.tourney=DEBUG,app.services=WARNING"),
+    # LOG_SAMPLE_RATES keeps a fraction of high-volume events ("tourney.matchup=0.1")
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""
+    LOG_FORMAT: str = "text"  # "text" or "json"
+    LOG_SAMPLE_RATES: str = "tourney.matchup=0.1,genetic.fitness=0.1,candidate_pool.add=0.1"
+
+    # Uploads: larger bodies are rejected with 413
+    MAX_IMAGE_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    MAX_AUDIO_UPLOAD_BYTES: int = 25 * 1024 * 1024
+
+    # Image preprocessing before vision calls: longest edge in pixels, output
+    # format ("JPEG" or "WEBP") and quality
+    IMAGE_MAX_EDGE: int = 1024
+    IMAGE_FORMAT: str = "JPEG"
+    IMAGE_QUALITY: int = 85
+    # Media decoding (images today) runs in a process pool of MEDIA_POOL_WORKERS;
+    # at most MEDIA_POOL_MAX_QUEUE more tasks wait, for up to MEDIA_POOL_QUEUE_TIMEOUT_S
+    MEDIA_POOL_WORKERS: int = 2
+    MEDIA_POOL_MAX_QUEUE: int = 8
+    MEDIA_POOL_QUEUE_TIMEOUT_S: float = 10.0
+
+    # Image analysis cache: photos whose perceptual hashes differ by at most
+    # IMAGE_CACHE_MAX_DISTANCE bits reuse the same user's previous analysis;
+    # analyses of at most IMAGE_CACHE_MAX_USERS users are kept
+    IMAGE_CACHE_TTL_S: float = 3600
+    IMAGE_CACHE_MAX_DISTANCE: int = 6
+    IMAGE_CACHE_MAX_ENTRIES_PER_USER: int = 32
+    IMAGE_CACHE_MAX_USERS: int = 10000
+
+    # Prompts are loaded once at startup; in dev set PROMPTS_HOT_RELOAD to pick up edits
+    PROMPTS_HOT_RELOAD: bool = False
+
+    # Prompt context compaction: token budget for each context block (weather,
+    # user context, image analysis) and the longest string kept inside it
+    PROMPT_CONTEXT_MAX_TOKENS: int = 300
+    PROMPT_CONTEXT_MAX_STRING_CHARS: int = 400
+
+    # Tracing: a request is traced when it sends "X-Trace: 1" or "?trace=1" (the span
+    # tree is returned in the response), or for every request when an exporter is set
+    TRACE_EXPORTER: str = ""  # "", "file" or "otlp"
+    TRACE_FILE_PATH: str = "traces.jsonl"
+    OTLP_TRACES_ENDPOINT: str = "http://localhost:4318/v1/traces"
     
     model_config = ConfigDict(
         case_sensitive=True,
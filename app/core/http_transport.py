@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSession(requests.Session):
+    """
+    A requests session shared by several clients. spotipy closes the session
+    it was given whenever a client is garbage collected, which would drop the
+    pooled connections, so close() is a no-op here and shutdown() closes it.
+    """
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        super().close()
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport holding one connection pool for the running event loop.
+    Pooled connections cannot move between loops, and the SDK clients this is
+    passed to are built at import time, before the serving loop exists. Like
+    SharedSession, closing a client that uses it leaves the pool open;
+    shutdown() closes it.
+    """
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self._pool: Optional[httpx.AsyncHTTPTransport] = None
+        self._pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if self._pool is None or self._pool_loop is not loop:
+            self._pool_loop = loop
+            self._pool = httpx.AsyncHTTPTransport(limits=self.limits)
+        return self._pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._get_pool().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._pool is not None and self._pool_loop is asyncio.get_running_loop():
+            await self._pool.aclose()
+        self._pool = None
+        self._pool_loop = None
+
+
+class HttpTransport:
+    """
+    Outbound connections for every external client, so connection setup stays
+    off the per-call path:
+
+    - aiohttp_session(): one session for the aiohttp clients (weather, Shazam),
+      HTTP_POOL_SIZE_PER_HOST connections per host, DNS answers cached for
+      HTTP_DNS_CACHE_TTL_S, idle connections kept for HTTP_KEEPALIVE_S
+    - httpx_transport(name): a pool per SDK (OpenAI, Gemini), each talking
+      to one host, so its size is that host's limit
+    - requests_session(name): a pooled session per blocking client (spotipy,
+      lyricsgenius), sized for the threads that call it
+
+    Clients register the URLs they call with add_warm_url(); start() opens a
+    connection to each of them and close() closes everything. Both run in
+    the app lifespan.
+    """
+    def __init__(
+        self,
+        pool_size_per_host: int = settings.HTTP_POOL_SIZE_PER_HOST,
+        keepalive_s: float = settings.HTTP_KEEPALIVE_S,
+        dns_cache_ttl_s: int = settings.HTTP_DNS_CACHE_TTL_S,
+        warm_timeout_s: float = settings.HTTP_WARM_TIMEOUT_S,
+    ):
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_s = keepalive_s
+        self.dns_cache_ttl_s = dns_cache_ttl_s
+        self.warm_timeout_s = warm_timeout_s
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._httpx_transports: Dict[str, LoopLocalTransport] = {}
+        self._requests_sessions: Dict[str, SharedSession] = {}
+        # (client, kind, url) to open a connection to at startup
+        self._warm_urls: List[Tuple[str, str, str]] = []
+
+    def add_warm_url(self, name: str, kind: str, url: str) -> None:
+        """Open a connection to url at startup through the pool of that kind ("aiohttp", "httpx" or "requests") and name"""
+        if (name, kind, url) not in self._warm_urls:
+            self._warm_urls.append((name, kind, url))
+
+    def aiohttp_session(self) -> aiohttp.ClientSession:
+        """The shared aiohttp session of the running loop; callers pass their own timeouts"""
+        # A session belongs to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session_loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.pool_size_per_host,
+                    ttl_dns_cache=self.dns_cache_ttl_s,
+                    keepalive_timeout=self.keepalive_s,
+                ),
+            )
+        return self._session
+
+    def httpx_transport(self, name: str, pool_size: Optional[int] = None) -> LoopLocalTransport:
+        """
+        The transport of an httpx-based client, for its http_client or
+        async_client_args; pool_size defaults to HTTP_POOL_SIZE_PER_HOST.
+        """
+        if name not in self._httpx_transports:
+            pool_size = pool_size or self.pool_size_per_host
+            self._httpx_transports[name] = LoopLocalTransport(httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=self.keepalive_s,
+            ))
+        return self._httpx_transports[name]
+
+    def requests_session(self, name: str, max_retries=0, pool_size: Optional[int] = None) -> SharedSession:
+        """
+        The pooled requests session of a blocking client. max_retries is passed
+        to the HTTPAdapter; pool_size defaults to HTTP_POOL_SIZE_PER_HOST.
+        """
+        if name not in self._requests_sessions:
+            session = SharedSession()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=pool_size or self.pool_size_per_host,
+                max_retries=max_retries,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._requests_sessions[name] = session
+        return self._requests_sessions[name]
+
+    async def _warm(self, name: str, kind: str, url: str) -> bool:
+        """Open a pooled connection to url; any HTTP response leaves a kept-alive connection behind"""
+        try:
+            if kind == "aiohttp":
+                timeout = aiohttp.ClientTimeout(total=self.warm_timeout_s)
+                async with self.aiohttp_session().head(url, timeout=timeout) as response:
+                    await response.read()
+            elif kind == "httpx":
+                request = httpx.Request(
+                    "HEAD", url, extensions={"timeout": httpx.Timeout(self.warm_timeout_s).as_dict()}
+                )
+                response = await self._httpx_transports[name].handle_async_request(request)
+                await response.aread()
+                await response.aclose()
+            else:
+                session = self._requests_sessions[name]
+                await asyncio.to_thread(session.head, url, timeout=self.warm_timeout_s)
+            return True
+        except Exception as e:
+            logger.warning("Could not warm %s connection to %s: %s", name, url, e)
+            return False
+
+    async def start(self) -> None:
+        """Open a connection to each registered warm URL; failures are logged and skipped"""
+        if not settings.HTTP_WARM_CONNECTIONS or not self._warm_urls:
+            return
+        start = time.perf_counter()
+        warmed = await asyncio.gather(*(self._warm(name, kind, url) for name, kind, url in self._warm_urls))
+        logger.info(
+            "Warmed %d of %d outbound connections in %.2fs", sum(warmed), len(warmed), time.perf_counter() - start
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        for transport in self._httpx_transports.values():
+            await transport.shutdown()
+        for session in self._requests_sessions.values():
+            session.shutdown()
+
+
+http_transport = HttpTransport()
@@ -0,0 +1,119 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Dict, Optional
+from app.core.config import settings
+
+# Correlates every log line emitted while handling one request, including
+# lines from tasks and threads spawned by it (both copy the current context)
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """Parse "a=1,b=2" style settings into a dict"""
+    mapping = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, val = item.split("=", 1)
+            mapping[key.strip()] = val.strip()
+    return mapping
+
+
+def sampled(event: str) -> dict:
+    """
+    Tag a high-volume log call so SamplingFilter can thin it out, e.g.
+    logger.debug("%s defeats %s", a, b, extra=sampled("tourney.matchup"))
+    """
+    return {"event": event}
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every record"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records tagged with a sampled event name"""
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or event not in self.rates:
+            return True
+        return random.random() < self.rates[event]
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            payload["event"] = event
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload)
+
+
+def setup_logging() -> None:
+    """
+    Configure the "app" logger hierarchy once at startup.
+
+    Records are filtered and formatted lazily: a call below its logger's level
+    never formats its arguments, and sampled events are dropped before formatting.
+    Accepted records go through a QueueHandler so request handlers never block
+    on stdout; a background QueueListener thread does the actual writing.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output_handler.setFormatter(JsonFormatter())
+    else:
+        output_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestIdFilter())
+    sample_rates = {event: float(rate) for event, rate in _parse_mapping(settings.LOG_SAMPLE_RATES).items()}
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.LOG_LEVEL.upper())
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+    # Per-module overrides, e.g. "app.rec_service.tourney=DEBUG,app.services=WARNING"
+    for name, level in _parse_mapping(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from app.core.config import settings
+from app.core.metrics import MEDIA_POOL_ACTIVE, MEDIA_POOL_QUEUED, MEDIA_POOL_REJECTED, MEDIA_TASK_LATENCY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class MediaPoolSaturated(RuntimeError):
+    """Raised when a media task waited longer than the queue timeout for a worker"""
+
+
+def _warm_up() -> None:
+    """Import the media libraries in the worker so the first request does not pay for it"""
+    import app.utils.image_processing  # noqa: F401
+
+
+class MediaPool:
+    """
+    Bounded process pool for CPU-heavy media work (image decode/resize/encode).
+
+    Work runs outside the main process, so it neither holds the GIL nor occupies
+    the default thread pool used by the spotipy calls. One task runs per worker;
+    up to max_queue more wait for at most queue_timeout_s, and anything beyond
+    that gets MediaPoolSaturated, which the routes turn into a 503.
+    """
+    def __init__(
+        self,
+        max_workers: int = settings.MEDIA_POOL_WORKERS,
+        max_queue: int = settings.MEDIA_POOL_MAX_QUEUE,
+        queue_timeout_s: float = settings.MEDIA_POOL_QUEUE_TIMEOUT_S,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    def _ensure_started(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process runs threads (logging, executors)
+            # that must not be duplicated into the workers mid-operation
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            # One slot per worker, so tasks beyond that wait here where they can be bounded
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._executor
+
+    async def start(self) -> None:
+        """Start the workers and import the media libraries in each of them"""
+        executor = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(self.max_workers)))
+        logger.info("Media pool warmed up %d workers in %.2fs", self.max_workers, time.perf_counter() - start)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+    async def run(self, task: str, fn: Callable[..., T], *args: Any) -> T:
+        """Run a picklable module-level function in a worker process"""
+        executor = self._ensure_started()
+        if self._waiting >= self.max_queue and self._slots.locked():
+            MEDIA_POOL_REJECTED.inc(task=task)
+            raise MediaPoolSaturated(f"Media pool saturated, {self._waiting} {task} tasks already waiting")
+
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        MEDIA_POOL_QUEUED.labels().inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            MEDIA_POOL_REJECTED.inc(task=task)
+            raise MediaPoolSaturated(f"Media pool saturated, {task} waited {self.queue_timeout_s:.0f}s")
+        finally:
+            self._waiting -= 1
+            MEDIA_POOL_QUEUED.labels().dec()
+
+        try:
+            with MEDIA_POOL_ACTIVE.labels().track_inprogress():
+                started_at = time.perf_counter()
+                MEDIA_TASK_LATENCY.observe(started_at - queued_at, task=task, phase="queue")
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+                finally:
+                    MEDIA_TASK_LATENCY.observe(time.perf_counter() - started_at, task=task, phase="run")
+        finally:
+            self._slots.release()
+
+
+media_pool = MediaPool()
@@ -0,0 +1,374 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from app.core.tracing import span
+
+# Latency buckets in seconds, from cache-hit fast paths up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """Base class for a metric family keyed by label values"""
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, **labelvalues: str):
+        """Return the child metric for one combination of label values"""
+        key = tuple(str(labelvalues[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for one combination of label values"""
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        """Exposition lines of every child"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0, **labelvalues: str) -> None:
+        self.labels(**labelvalues).inc(amount)
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in sorted(self._children.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in sorted(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block, including awaits inside it"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, **labelvalues: str) -> None:
+        self.labels(**labelvalues).observe(value)
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for upper, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(upper))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {child.count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {child.count}"
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them in the Prometheus text format"""
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "recommendation_stage_seconds",
+    "Latency of each recommendation pipeline stage",
+    ["stage", "engine"],
+)
+EXTERNAL_CALL_LATENCY = REGISTRY.histogram(
+    "external_call_seconds",
+    "Latency of calls to external services",
+    ["service", "call"],
+)
+EXTERNAL_CALL_ERRORS = REGISTRY.counter(
+    "external_call_errors",
+    "Failed calls to external services",
+    ["service", "call"],
+)
+EXTERNAL_CALL_RETRIES = REGISTRY.counter(
+    "external_call_retries",
+    "Retried calls to external services",
+    ["service", "call"],
+)
+RATE_LIMITED = REGISTRY.counter(
+    "external_call_rate_limited",
+    "Calls rejected with HTTP 429 by external services",
+    ["service", "call"],
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "llm_calls_in_flight",
+    "LLM calls currently awaiting a response",
+    ["provider", "call"],
+)
+LLM_HEDGES = REGISTRY.counter(
+    "llm_hedged_requests",
+    "LLM calls re-issued to the other provider after the hedge threshold, by hedge provider",
+    ["call", "provider"],
+)
+LLM_HEDGE_WINS = REGISTRY.counter(
+    "llm_hedge_wins",
+    "Hedged LLM calls by which request answered first (primary or hedge)",
+    ["call", "winner"],
+)
+LLM_REROUTES = REGISTRY.counter(
+    "llm_rerouted_requests",
+    "LLM calls sent to the other provider because this provider's breaker was open or its call failed",
+    ["call", "provider"],
+)
+LOCAL_JUDGE_CALLS = REGISTRY.counter(
+    "local_judge_calls",
+    "Judgements and fitness scores answered by the local judge, by reason (mode, confident, breaker_open, error)",
+    ["call", "reason"],
+)
+TOURNEY_CACHED_MATCHUPS = REGISTRY.histogram(
+    "tourney_cached_matchup_fraction",
+    "Share of a tournament's matchups answered by the comparison cache",
+    [],
+    [0.0, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0],
+)
+TOURNEY_EARLY_STOPS = REGISTRY.counter(
+    "tourney_early_stops",
+    "Tournaments stopped once the Bradley-Terry top recommendations separated",
+)
+BREAKER_STATE = REGISTRY.gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state per service and call type (0 closed, 1 half-open, 2 open)",
+    ["service", "call"],
+)
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "circuit_breaker_transitions",
+    "Circuit breaker state changes, by the state entered",
+    ["service", "call", "state"],
+)
+MEDIA_POOL_QUEUED = REGISTRY.gauge(
+    "media_pool_queued",
+    "Media tasks waiting for a free worker",
+)
+MEDIA_POOL_ACTIVE = REGISTRY.gauge(
+    "media_pool_active",
+    "Media tasks running in worker processes",
+)
+MEDIA_POOL_REJECTED = REGISTRY.counter(
+    "media_pool_rejected",
+    "Media tasks rejected because the pool stayed saturated",
+    ["task"],
+)
+MEDIA_TASK_LATENCY = REGISTRY.histogram(
+    "media_task_seconds",
+    "Time media tasks spend queued and running",
+    ["task", "phase"],
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "llm_prompt_tokens",
+    "Estimated prompt tokens sent per LLM call",
+    ["service", "call"],
+    buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens",
+    "Tokens reported by the LLM provider, by kind (prompt, cached_prompt, completion)",
+    ["service", "call", "kind"],
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests",
+    "Cache lookups by result",
+    ["cache", "result"],
+)
+
+LLM_PROVIDERS = {"openai", "gemini"}
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Detect HTTP 429 across the spotipy, openai, google-genai and aiohttp error types"""
+    for attribute in ("status_code", "http_status", "status", "code"):
+        if getattr(error, attribute, None) == 429:
+            return True
+    return False
+
+
+@contextmanager
+def track_call(service: str, call: str):
+    """
+    Time one external call and count its errors and 429s.
+    LLM calls are also counted as in flight while the block runs.
+    The call is recorded as a span when the request is traced.
+    """
+    in_flight: Optional[_GaugeChild] = None
+    if service in LLM_PROVIDERS:
+        in_flight = LLM_IN_FLIGHT.labels(provider=service, call=call)
+        in_flight.inc()
+    start = time.perf_counter()
+    try:
+        with span(f"{service}.{call}", service=service):
+            yield
+    except Exception as e:
+        # Cancellation (BaseException) is not a failure of the external service
+        EXTERNAL_CALL_ERRORS.inc(service=service, call=call)
+        if _is_rate_limited(e):
+            RATE_LIMITED.inc(service=service, call=call)
+        raise
+    finally:
+        EXTERNAL_CALL_LATENCY.observe(time.perf_counter() - start, service=service, call=call)
+        if in_flight is not None:
+            in_flight.dec()
+
+
+def _first_int(obj, *paths: str) -> Optional[int]:
+    """First integer found along dotted attribute paths, e.g. "usage.prompt_tokens" """
+    for path in paths:
+        value = obj
+        for attribute in path.split("."):
+            value = getattr(value, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def record_llm_usage(service: str, call: str, response) -> None:
+    """Count the token usage an OpenAI or Gemini response reports, if any"""
+    counts = {
+        "prompt": _first_int(response, "usage.prompt_tokens", "usage_metadata.prompt_token_count"),
+        "cached_prompt": _first_int(
+            response, "usage.prompt_tokens_details.cached_tokens", "usage_metadata.cached_content_token_count"
+        ),
+        "completion": _first_int(response, "usage.completion_tokens", "usage_metadata.candidates_token_count"),
+    }
+    for kind, count in counts.items():
+        if count:
+            LLM_TOKENS.inc(count, service=service, call=call, kind=kind)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_coalesced_lookup(cache: str) -> None:
+    """A miss that joined a fetch already in flight instead of starting its own"""
+    CACHE_REQUESTS.inc(cache=cache, result="coalesced")
@@ -0,0 +1,62 @@
+import json
+import math
+from typing import Any
+from app.core.config import settings
+from app.core.metrics import PROMPT_TOKENS
+
+# Rough size of a token for English text and JSON, good enough to budget prompts
+# without shipping a tokenizer; provider-reported counts are in llm_tokens_total
+CHARS_PER_TOKEN = 4
+ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _prune(value: Any, max_string_chars: int, max_items: int) -> Any:
+    """Drop empty fields and shorten long strings and lists"""
+    if isinstance(value, dict):
+        pruned = {key: _prune(item, max_string_chars, max_items) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if not _is_empty(item)}
+    if isinstance(value, (list, tuple)):
+        pruned = [_prune(item, max_string_chars, max_items) for item in value[:max_items]]
+        return [item for item in pruned if not _is_empty(item)]
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) > max_string_chars:
+            return value[:max_string_chars - 1].rstrip() + ELLIPSIS
+    return value
+
+
+def compact_context(
+    value: Any,
+    max_tokens: int = settings.PROMPT_CONTEXT_MAX_TOKENS,
+    max_string_chars: int = settings.PROMPT_CONTEXT_MAX_STRING_CHARS,
+) -> str:
+    """
+    Serialise one piece of request context (weather, user context, image analysis)
+    for a prompt: compact separators, sorted keys so every call of a request
+    shares the same prompt prefix, no empty fields, and strings and lists
+    shortened until it fits max_tokens. Strings are assumed to be compacted already.
+    """
+    if isinstance(value, str):
+        return value
+    max_items = 64
+    while True:
+        text = json.dumps(
+            _prune(value, max_string_chars, max_items), separators=(",", ":"), sort_keys=True, ensure_ascii=False
+        )
+        if estimate_tokens(text) <= max_tokens or (max_string_chars <= 16 and max_items <= 1):
+            return text
+        max_string_chars = max(16, max_string_chars // 2)
+        max_items = max(1, max_items // 2)
+
+
+def record_prompt_tokens(service: str, call: str, *parts: str) -> None:
+    """Observe the estimated prompt size of one LLM call"""
+    PROMPT_TOKENS.observe(sum(estimate_tokens(str(part)) for part in parts), service=service, call=call)
@@ -0,0 +1,135 @@
+import logging
+import os
+import string
+import threading
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+# Placeholders each prompt must contain, checked when the prompts are loaded
+PROMPT_FIELDS: Dict[str, FrozenSet[str]] = {
+    "audio_analysis.txt": frozenset(),
+    "fit_func.txt": frozenset({
+        "song_title", "song_artist", "song_popularity", "song_duration", "song_release_date",
+        "weather_data", "user_context", "image_analysis",
+    }),
+    "image_analysis.txt": frozenset({"top_songs", "top_artists"}),
+    "song_recommendation.txt": frozenset({
+        "weather_data", "user_context", "image_analysis",
+        "song1_title", "song1_artist", "song1_popularity", "song1_duration", "song1_release_date",
+        "song2_title", "song2_artist", "song2_popularity", "song2_duration", "song2_release_date",
+    }),
+    "user_context.txt": frozenset({
+        "top_songs_short", "top_songs_medium", "top_songs_long",
+        "top_artists_short", "top_artists_medium", "top_artists_long", "recently_played",
+    }),
+}
+
+
+class PromptTemplateError(ValueError):
+    """A prompt file is missing or its placeholders do not match what the code fills in"""
+
+
+class PromptTemplate:
+    """
+    A prompt parsed once into literal text and placeholder segments.
+    format() has the same signature as str.format (extra keyword arguments are
+    ignored) and partial() fills some placeholders ahead of time, without the
+    brace escaping a pre-formatted string would need.
+    """
+    def __init__(self, name: str, segments: List[Tuple[str, Optional[str]]]):
+        self.name = name
+        self.segments = segments
+        self.fields = frozenset(field for _literal, field in segments if field is not None)
+
+    @classmethod
+    def parse(cls, name: str, text: str) -> "PromptTemplate":
+        segments = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(text):
+            if field is not None and (format_spec or conversion or not field.isidentifier()):
+                raise PromptTemplateError(f"{name}: only plain {{name}} placeholders are supported, got {{{field}}}")
+            segments.append((literal, field))
+        return cls(name, segments)
+
+    def format(self, **values: Any) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"{self.name} is missing values for {sorted(missing)}")
+        return "".join(
+            literal if field is None else literal + str(values[field])
+            for literal, field in self.segments
+        )
+
+    def partial(self, **values: Any) -> "PromptTemplate":
+        """A template with the given placeholders replaced by their values"""
+        segments: List[Tuple[str, Optional[str]]] = []
+        pending = ""
+        for literal, field in self.segments:
+            pending += literal
+            if field is not None and field in values:
+                pending += str(values[field])
+            elif field is not None:
+                segments.append((pending, field))
+                pending = ""
+        if pending:
+            segments.append((pending, None))
+        return PromptTemplate(self.name, segments)
+
+    def __str__(self) -> str:
+        return "".join(literal + ("{" + field + "}" if field else "") for literal, field in self.segments)
+
+
+class PromptRegistry:
+    """
+    Loads every prompt in app/prompts once and validates its placeholders, so
+    no request touches the disk or depends on the working directory. With
+    hot_reload (dev mode) a prompt is re-read when its file changes.
+    """
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR, hot_reload: bool = settings.PROMPTS_HOT_RELOAD):
+        self.prompts_dir = prompts_dir
+        self.hot_reload = hot_reload
+        self._lock = threading.Lock()
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._mtimes: Dict[str, float] = {}
+
+    def _load_file(self, name: str) -> PromptTemplate:
+        path = self.prompts_dir / name
+        try:
+            text = path.read_text().strip()
+        except OSError as e:
+            raise PromptTemplateError(f"Cannot read prompt {path}: {e}") from e
+        template = PromptTemplate.parse(name, text)
+        expected = PROMPT_FIELDS.get(name)
+        if expected is not None and template.fields != expected:
+            raise PromptTemplateError(
+                f"{name}: missing placeholders {sorted(expected - template.fields)}, "
+                f"unexpected placeholders {sorted(template.fields - expected)}"
+            )
+        self._mtimes[name] = os.path.getmtime(path)
+        return template
+
+    def load(self) -> None:
+        """Load and validate every known prompt; raises PromptTemplateError on the first problem"""
+        templates = {name: self._load_file(name) for name in PROMPT_FIELDS}
+        with self._lock:
+            self._templates = templates
+        logger.info("Loaded %d prompt templates from %s", len(templates), self.prompts_dir)
+
+    def reload(self) -> None:
+        self.load()
+
+    def get(self, name: str) -> PromptTemplate:
+        if not self._templates:
+            self.load()
+        if self.hot_reload and os.path.getmtime(self.prompts_dir / name) != self._mtimes.get(name):
+            logger.info("Reloading changed prompt %s", name)
+            with self._lock:
+                self._templates[name] = self._load_file(name)
+        return self._templates[name]
+
+
+prompt_registry = PromptRegistry()
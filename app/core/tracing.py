@@ -0,0 +1,235 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# The trace of the current request and the innermost open span. Tasks created
+# with asyncio.create_task/gather and threads started with asyncio.to_thread
+# copy the context, so their spans nest under the span that spawned them.
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+def _new_id(num_bytes: int) -> str:
+    return os.urandom(num_bytes).hex()
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    parent_id: Optional[str] = None
+    span_id: str = field(default_factory=lambda: _new_id(8))
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    status: str = "ok"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """All spans recorded while handling one request"""
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = _new_id(16)
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+        self.root = self.add_span(name, None, attributes)
+
+    def add_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, self.trace_id, parent.span_id if parent else None, attributes=dict(attributes))
+        # Spans may be opened from worker threads (asyncio.to_thread)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The span tree as JSON-serialisable dicts, with times relative to the trace start"""
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            children.setdefault(span.parent_id, []).append(span)
+
+        def build(span: Span) -> Dict[str, Any]:
+            node = {
+                "name": span.name,
+                "span_id": span.span_id,
+                "start_ms": round((span.start_ns - self.root.start_ns) / 1e6, 3),
+                "duration_ms": None if span.duration_ms is None else round(span.duration_ms, 3),
+                "status": span.status,
+            }
+            if span.attributes:
+                node["attributes"] = span.attributes
+            if span.span_id in children:
+                node["children"] = [build(child) for child in children[span.span_id]]
+            return node
+
+        return {"trace_id": self.trace_id, "root": build(self.root)}
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """Start recording spans for the enclosed block (one request)"""
+    trace = Trace(name, **attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.status = "error"
+        trace.root.set_attribute("error", repr(e))
+        raise
+    finally:
+        trace.root.end_ns = time.time_ns()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Record a span under the current one. Outside of a trace this is a no-op
+    and yields None, so instrumented code costs nothing on untraced requests.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.add_span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = "error"
+        current.set_attribute("error", repr(e))
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+async def traced(name: str, awaitable: Awaitable[T], **attributes: Any) -> T:
+    """Await a coroutine inside a span, e.g. in a list passed to asyncio.gather"""
+    with span(name, **attributes):
+        return await awaitable
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class SpanExporter(ABC):
+    """Exporter hook: receives every finished trace when an exporter is configured"""
+    @abstractmethod
+    def export(self, trace: Trace) -> None:
+        """Send one finished trace"""
+
+
+class FileSpanExporter(SpanExporter):
+    """Append each trace's span tree as one JSON line, for local debugging and tests"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict())
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Send traces to an OpenTelemetry collector using OTLP/HTTP with the JSON encoding"""
+    def __init__(self, endpoint: str, service_name: str, timeout_s: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout_s = timeout_s
+
+    def to_otlp(self, trace: Trace) -> Dict[str, Any]:
+        spans = []
+        for span in trace.spans:
+            otlp_span = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [
+                    {"key": key, "value": {"stringValue": str(value)}}
+                    for key, value in span.attributes.items()
+                ],
+                "status": {"code": 2 if span.status == "error" else 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+            }]
+        }
+
+    def export(self, trace: Trace) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.to_otlp(trace)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+            response.read()
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_loaded = False
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Install a custom exporter (or None to disable exporting)"""
+    global _exporter, _exporter_loaded
+    _exporter = exporter
+    _exporter_loaded = True
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    """The exporter configured by TRACE_EXPORTER ("file" or "otlp"), built on first use"""
+    global _exporter, _exporter_loaded
+    if not _exporter_loaded:
+        if settings.TRACE_EXPORTER == "file":
+            _exporter = FileSpanExporter(settings.TRACE_FILE_PATH)
+        elif settings.TRACE_EXPORTER == "otlp":
+            _exporter = OTLPHttpSpanExporter(settings.OTLP_TRACES_ENDPOINT, settings.PROJECT_NAME)
+        elif settings.TRACE_EXPORTER:
+            logger.warning("Unknown TRACE_EXPORTER %r, traces will not be exported", settings.TRACE_EXPORTER)
+        _exporter_loaded = True
+    return _exporter
+
+
+def export_trace(trace: Trace) -> None:
+    """Export a finished trace, logging rather than raising on exporter failures"""
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    try:
+        exporter.export(trace)
+    except Exception as e:
+        logger.warning("Failed to export trace %s: %s", trace.trace_id, e)
@@ -1,9 +1,18 @@
 from typing import List, Callable, Optional, Dict, Tuple
 import random
 import asyncio
+import logging
 from collections import Counter
 from app.models.song import Pool_Song
 from app.services.service_instances import openai_service, gemini_service
+from app.services.llm_routing import route_call
+from app.core.logging_config import sampled
+from app.core.config import settings
+from app.core.metrics import LOCAL_JUDGE_CALLS, record_cache_lookup
+from app.rec_service.local_judge import LocalJudge
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
 
 #TODO Can create some sort of stop condition instead of having a fixed # of generations
 #TODO Edit to run multiple times in parallel for multiple song recs
@@ -17,7 +26,9 @@ class GeneticAlgorithm:
         weather_data: dict = None,
         user_context: dict = None,
         image_analysis: dict = None,
-        use_openai: bool = True
+        use_openai: bool = True,
+        local_judge: Optional[LocalJudge] = None,
+        judge_mode: Optional[str] = None,
     ):
         self.candidate_pool = candidate_pool
         self.population_size = population_size
@@ -30,25 +41,40 @@ class GeneticAlgorithm:
         self.image_analysis = image_analysis
         self.fitness_cache: Dict[str, float] = {}  # Cache for fitness scores using song ID as key
         self.use_openai = use_openai
-    def print_population(self):
+        # In "local" mode fitness comes from the local judge; "hybrid" only affects tournaments
+        self.local_judge = local_judge
+        self.judge_mode = (judge_mode or settings.JUDGE_MODE) if local_judge is not None else "llm"
+    def print_population(self): #FOR DEBUGGING
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         for index, song in enumerate(self.current_population):
-            print(f"#{index}: {song.title} by {song.artist}, Fitness score: {self.fitness_scores.get(song, 'N/A')}")
+            logger.debug("#%d: %s by %s, Fitness score: %s", index, song.title, song.artist, self.fitness_scores.get(song, 'N/A'))
             
     async def fitness_function(self, song: Pool_Song) -> Tuple[Pool_Song, float]:
         """Fitness function for a song with caching"""
         # Check if we have a cached score for this song
         song_id = song.title + " " + song.artist
+        record_cache_lookup("fitness", song_id in self.fitness_cache)
         if song_id in self.fitness_cache:
-            print(f"Cache hit for song {song.title} by {song.artist}")
+            logger.debug("Cache hit for song %s by %s", song.title, song.artist, extra=sampled("genetic.fitness"))
             return (song, self.fitness_cache[song_id])
         
         # If not in cache, compute the score
-        print(f"Cache miss for song {song.title} by {song.artist}")
-        if self.use_openai:
-            fitness_score = await openai_service.generate_fitness_scores(song, self.weather_data, self.user_context, self.image_analysis)
+        logger.debug("Cache miss for song %s by %s", song.title, song.artist, extra=sampled("genetic.fitness"))
+        if self.judge_mode == "local":
+            LOCAL_JUDGE_CALLS.inc(call="fitness", reason="mode")
+            fitness_score = await self.local_judge.generate_fitness_scores(song, self.weather_data, self.user_context, self.image_analysis)
         else:
-            fitness_score = await gemini_service.generate_fitness_scores(song, self.weather_data, self.user_context, self.image_analysis)
-        print(f"Fitness score for song {song.title} by {song.artist}: {fitness_score}")
+            service, backup = (openai_service, gemini_service) if self.use_openai else (gemini_service, openai_service)
+            fitness_score = await route_call(
+                "fitness", service, backup,
+                lambda provider: provider.generate_fitness_scores(song, self.weather_data, self.user_context, self.image_analysis),
+                fallback=self.local_judge if settings.LOCAL_JUDGE_FALLBACK else None,
+            )
+        logger.debug(
+            "Fitness score for song %s by %s: %s", song.title, song.artist, fitness_score,
+            extra=sampled("genetic.fitness"),
+        )
         # Store in cache
         self.fitness_cache[song_id] = fitness_score
         return (song, fitness_score)
@@ -56,16 +82,16 @@ class GeneticAlgorithm:
     async def initialize_population(self) -> None:
         """Initialize the population by randomly sampling from candidate pool"""
         self.current_population = random.sample(self.candidate_pool, self.population_size)
-        print("Initial population:")
+        logger.debug("Initial population:")
         self.print_population()
-        print("--------------------------------")
         
     async def _evaluate_population(self) -> None:
         """Evaluate fitness of all songs in current population concurrently"""
         # Create tasks for all fitness evaluations
         tasks = [self.fitness_function(song) for song in self.current_population]
         # Run all tasks concurrently and gather results
-        results = await asyncio.gather(*tasks)
+        with span("genetic.evaluate", population=len(self.current_population)):
+            results = await asyncio.gather(*tasks)
         # Update fitness scores dictionary
         self.fitness_scores = {song: score for song, score in results}
     async def _select_survivors(self) -> List[Pool_Song]:
@@ -117,26 +143,28 @@ class GeneticAlgorithm:
 
     async def run(self) -> Pool_Song:
         """Run the genetic algorithm and return the best song"""
+        with span("genetic.run", generations=self.generations):
+            return await self._run()
+
+    async def _run(self) -> Pool_Song:
         await self.initialize_population()
         for _ in range(self.generations):
             await self._evaluate_population()
-            print(f"Generation {_} evaluated")
+            logger.debug("Generation %d evaluated", _)
             self.print_population()
-            print("--------------------------------")
             survivors = await self._select_survivors()
             await self._create_next_generation(survivors)
         
-        print("Final population:")
+        logger.debug("Final population:")
         self.print_population()
-        print("--------------------------------")
-        print(f"Fitness cache size: {len(self.fitness_cache)}")
+        logger.debug("Fitness cache size: %d", len(self.fitness_cache))
         # Find most frequent song in final population
         song_counts = Counter(self.current_population)
         song = song_counts.most_common(1)
         if song[0][1] > 1:
             return song[0][0]
         else:
-            print("No clear winner, Getting best fitness song")
+            logger.info("No clear winner, Getting best fitness song")
             await self._evaluate_population()
             return self.get_best_song()
 
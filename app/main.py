@@ -1,11 +1,90 @@
 import os
-from fastapi import FastAPI
+import json
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.logging_config import setup_logging, request_id_var
+from app.core.metrics import REGISTRY
+from app.core.tracing import start_trace, export_trace, get_exporter
+from app.core.media_pool import media_pool
+from app.core.http_transport import http_transport
+from app.core.prompt_registry import prompt_registry
+from app.rec_service.rating_store import close_rating_store
+
+setup_logging()
+
 from app.api.routes import recommendation, spotify
 
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on a broken prompt, and keep prompt file reads off the request path
+    prompt_registry.load()
+    # Spawn and warm the media workers before the first upload arrives
+    await media_pool.start()
+    # Connect to the external APIs now rather than on the first request
+    await http_transport.start()
+    try:
+        yield
+    finally:
+        media_pool.shutdown()
+        await close_rating_store()
+        await http_transport.close()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+
+# Keeps references to background trace exports so they are not garbage collected
+_export_tasks = set()
+
+def _trace_requested(request: Request) -> bool:
+    flag = request.headers.get("X-Trace") or request.query_params.get("trace")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+@app.middleware("http")
+async def tracing_middleware(request: Request, call_next):
+    """
+    Record a span tree for the request when the client opts in or an exporter is configured.
+    Opted-in JSON responses are wrapped as {"response": ..., "trace": ...}.
+    """
+    requested = _trace_requested(request)
+    if not requested and get_exporter() is None:
+        return await call_next(request)
+
+    with start_trace(f"{request.method} {request.url.path}", request_id=request_id_var.get()) as trace:
+        response = await call_next(request)
+        trace.root.set_attribute("status_code", response.status_code)
+
+    if get_exporter() is not None:
+        # Export off the request path
+        task = asyncio.create_task(asyncio.to_thread(export_trace, trace))
+        _export_tasks.add(task)
+        task.add_done_callback(_export_tasks.discard)
+
+    if not requested or not response.headers.get("content-type", "").startswith("application/json"):
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")}
+    return JSONResponse(
+        {"response": json.loads(body) if body else None, "trace": trace.to_dict()},
+        status_code=response.status_code,
+        headers=headers,
+    )
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag every log line of a request with its id and echo the id back to the client"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
 # Configure CORS
 app.add_middleware(
@@ -30,6 +109,11 @@ app.include_router(
     tags=["spotify"]
 )
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
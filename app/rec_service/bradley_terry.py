@@ -0,0 +1,119 @@
+import logging
+from dataclasses import dataclass
+from typing import Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Above this many players the standard errors ignore the covariance between strengths
+# (the full Fisher information matrix would be players x players)
+MAX_EXACT_ERRORS = 1000
+
+
+@dataclass
+class Ratings:
+    """Bradley-Terry log-strengths and their standard errors, indexed like the players"""
+    strengths: np.ndarray
+    std_errors: np.ndarray
+    iterations: int
+    comparisons: int
+
+    def top_k(self, k: int) -> np.ndarray:
+        """Indices of the k strongest players, strongest first"""
+        return np.argsort(-self.strengths, kind="stable")[:k]
+
+    def separated(self, k: int, z: float) -> bool:
+        """
+        Whether the top k are settled: the weakest of them still beats the
+        strongest of the rest with z standard errors of slack on both sides
+        """
+        if k <= 0 or k >= len(self.strengths):
+            return True
+        order = np.argsort(-self.strengths, kind="stable")
+        top, rest = order[:k], order[k:]
+        lower = self.strengths[top] - z * self.std_errors[top]
+        upper = self.strengths[rest] + z * self.std_errors[rest]
+        return bool(lower.min() > upper.max())
+
+
+def fit_bradley_terry(
+    players: int,
+    winners: Sequence[int],
+    losers: Sequence[int],
+    prior_games: float = 1.0,
+    tol: float = 1e-6,
+    max_iter: int = 500,
+) -> Ratings:
+    """
+    Fit Bradley-Terry strengths, P(i beats j) = p_i / (p_i + p_j), to the
+    outcomes winners[g] beat losers[g] with Hunter's MM iterations.
+
+    Every player also plays prior_games virtual games, half won and half lost,
+    against a fixed player of strength 1. This keeps unbeaten and winless
+    players finite and pulls players with few games towards the middle.
+    Strengths are returned as log-strengths centred on the pool mean, and
+    their standard errors are those of the centred values, so the uncertainty
+    of the pool's overall level against the virtual player does not count.
+    """
+    winners = np.asarray(winners, dtype=np.int64)
+    losers = np.asarray(losers, dtype=np.int64)
+    wins = np.bincount(winners, minlength=players) + prior_games / 2
+    strengths = np.ones(players)
+
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        # Sum over each player's games of 1 / (p_i + p_j), the virtual games included
+        inverse_totals = 1.0 / (strengths[winners] + strengths[losers])
+        denominator = (
+            np.bincount(winners, weights=inverse_totals, minlength=players)
+            + np.bincount(losers, weights=inverse_totals, minlength=players)
+            + prior_games / (strengths + 1.0)
+        )
+        updated = wins / denominator
+        change = np.max(np.abs(np.log(updated) - np.log(strengths))) if players else 0.0
+        strengths = updated
+        if change < tol:
+            break
+    else:
+        logger.debug("Bradley-Terry fit stopped after %d iterations without converging", max_iter)
+
+    log_strengths = np.log(strengths)
+    if players:
+        log_strengths -= log_strengths.mean()
+    return Ratings(
+        strengths=log_strengths,
+        std_errors=_standard_errors(strengths, winners, losers, prior_games),
+        iterations=iterations,
+        comparisons=len(winners),
+    )
+
+
+def _standard_errors(strengths: np.ndarray, winners: np.ndarray, losers: np.ndarray, prior_games: float) -> np.ndarray:
+    """Standard errors of the centred log-strengths from the inverse Fisher information"""
+    players = len(strengths)
+    if players == 0:
+        return np.zeros(0)
+    # Each game contributes p(1 - p) of information, where p is either side's win probability
+    p = strengths[winners] / (strengths[winners] + strengths[losers])
+    game_info = p * (1 - p)
+    prior_p = strengths / (strengths + 1.0)
+    diagonal = (
+        np.bincount(winners, weights=game_info, minlength=players)
+        + np.bincount(losers, weights=game_info, minlength=players)
+        + prior_games * prior_p * (1 - prior_p)
+    )
+    if players > MAX_EXACT_ERRORS:
+        return 1.0 / np.sqrt(diagonal)
+
+    information = np.diag(diagonal)
+    np.add.at(information, (winners, losers), -game_info)
+    np.add.at(information, (losers, winners), -game_info)
+    try:
+        covariance = np.linalg.inv(information)
+    except np.linalg.LinAlgError:
+        return 1.0 / np.sqrt(diagonal)
+    # Covariance of the strengths minus their mean
+    centred = (
+        covariance - covariance.mean(axis=0, keepdims=True) - covariance.mean(axis=1, keepdims=True) + covariance.mean()
+    )
+    return np.sqrt(np.clip(np.diag(centred), 0.0, None))
@@ -1,5 +1,7 @@
+import math
 import random
-from typing import List
+import logging
+from typing import AsyncIterator, Dict, List, Optional
 from app.models.song import Pool_Song
 from app.services.service_instances import (
     genius_service,
@@ -8,28 +10,65 @@ from app.services.service_instances import (
 )
 from app.models.song import ShazamSong
 from app.services.spotify_service import SpotifyService
+from app.core.logging_config import sampled
+from app.core.tracing import span, traced
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 class CandidatePool:
     def __init__(self, genres: list[str], session_id: str, spotify_service: SpotifyService):
         self.pool: List[Pool_Song] = []
         self.set_pool = set()
+        self.song_sources: Dict[Pool_Song, str] = {}  # Which source added each song
         self.genres = genres
         self.shazam = shazam_service
         self.spotify = spotify_service
         self.genius = genius_service
         self.session_id = session_id
         self.lock = asyncio.Lock()  # Add a lock for thread safety
-        print(f"Initialized CandidatePool for session {session_id} with genres: {genres}")
+        # Shares the pool lock so consumers can wait for new songs while streaming
+        self.pool_updated = asyncio.Condition(self.lock)
+        self.finished = False
+        logger.debug("Initialized CandidatePool with genres: %s", genres)
 
     def get_pool(self):
         return self.pool 
     
+    async def stream(self, start: int = 0) -> AsyncIterator[Pool_Song]:
+        """
+        Yield songs as they are added to the pool, starting at index `start`.
+        Songs already in the pool are replayed first; the stream ends once
+        add_songs_parallel has finished and every song has been yielded.
+        """
+        index = start
+        while True:
+            async with self.pool_updated:
+                await self.pool_updated.wait_for(lambda: index < len(self.pool) or self.finished)
+                new_songs = self.pool[index:]
+                done = self.finished
+            for song in new_songs:
+                yield song
+            index += len(new_songs)
+            if done and index >= len(self.pool):
+                return
+
+    async def wait_for_size(self, min_size: int) -> int:
+        """
+        Wait until the pool holds at least min_size songs or every source has finished.
+        Returns the pool size at that point.
+        """
+        async with self.pool_updated:
+            await self.pool_updated.wait_for(lambda: len(self.pool) >= min_size or self.finished)
+            return len(self.pool)
+
     def print_pool(self): #FOR DEBUGGING
-        print(f"Number of Songs in Pool: {len(self.pool)}")
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("Number of Songs in Pool: %d", len(self.pool))
         for index, song in enumerate(self.pool):
             filtered_genre = "0 Genre Found" if song.genre == "" else song.genre
-            print(f"Song {index} in pool: {song.title} {song.artist} {filtered_genre}")
+            logger.debug("Song %d in pool: %s %s %s", index, song.title, song.artist, filtered_genre)
 
     async def _add_tracks_to_pool(self, tracks: List[Pool_Song], comes_from: str):
         """
@@ -55,20 +94,25 @@ class CandidatePool:
                 if track.duration_ms < 600000 and track_key not in self.set_pool: #TODO Maybe add popularity > 20
                     self.pool.append(track)
                     self.set_pool.add(track_key)
-                    print(f"Added new song to pool: {track.title} by {track.artist} from {comes_from}")
+                    self.song_sources[track] = comes_from
+                    logger.debug(
+                        "Added new song to pool: %s by %s from %s", track.title, track.artist, comes_from,
+                        extra=sampled("candidate_pool.add"),
+                    )
+            self.pool_updated.notify_all()
 
     async def _process_artist_tracks(self, artist):
         """Process tracks for a single artist in parallel"""
         # if self.check_genre_match(artist.genres, False):
-        print(f"Processing artist: {artist.name} - genre matched")
+        logger.debug("Processing artist: %s", artist.name)
         top_tracks = await self.spotify.get_artist_top_tracks(self.session_id, artist.artist_id, limit=5)
         if top_tracks:
             await self._add_tracks_to_pool(top_tracks, "top_artists")
         # else:
-        #     print(f"Artist {artist.name} genre didn't match. Artist genres: {artist.genres}, Pool genres: {self.genres}")
+        #     logger.debug(f"Artist {artist.name} genre didn't match. Artist genres: {artist.genres}, Pool genres: {self.genres}")
 
     async def add_top_user_artists_tracks(self, time_range: str = "medium_term", limit: int = 20):
-        print("Fetching top user artists tracks")
+        logger.debug("Fetching top user artists tracks")
         top_artists = await self.spotify.get_user_top_artists(self.session_id, time_range, limit)
         
         # Process all artists in parallel
@@ -76,60 +120,116 @@ class CandidatePool:
         await asyncio.gather(*tasks)
 
     async def add_top_user_tracks(self, time_range: str = "medium_term", album_mode: bool = False, limit: int = 50, num_albums: int = 2):
-        print("Fetching top user tracks")
+        logger.debug("Fetching top user tracks")
         top_tracks = await self.spotify.get_user_top_tracks(self.session_id, time_range=time_range, album_mode=album_mode, limit=limit, num_albums=num_albums)
         if top_tracks:
             await self._add_tracks_to_pool(top_tracks, "top_tracks")
             
             
     async def add_saved_tracks(self, num_sections: int = 3, top_tracks_mode: bool = False, num_top_track_artists: int = 10):
-        print("Fetching saved tracks")
+        logger.debug("Fetching saved tracks")
         saved_tracks = await self.spotify.get_user_saved_tracks(self.session_id, num_sections, top_tracks_mode, num_top_track_artists)
         if saved_tracks:
             await self._add_tracks_to_pool(saved_tracks, "saved_tracks")
 
-    async def add_songs_parallel(self):
+    def _source_fetch_kwargs(self, source_targets: Optional[Dict[str, int]]) -> Dict[str, dict]:
+        """
+        Translate the number of tracks wanted from each source into arguments for its fetch call.
+        Without targets every source fetches its default amount (~350 songs in total).
+        """
+        if not source_targets:
+            return {
+                "top_artists": dict(time_range="medium_term", limit=20), # 20 artists * 5 songs each = 100
+                "top_tracks": dict(time_range="medium_term", album_mode=True, limit=50, num_albums=2), # 50 songs + ~25 ish songs from 2 albums = ~75 
+                "saved_tracks": dict(num_sections=3, top_tracks_mode=True, num_top_track_artists=5),
+                # 150  + 25 = ~175
+                # Each section max 50 songs
+                # Sample 5 songs from 5 random artists
+                #Total 350ish
+            }
+
+        fetch_kwargs = {}
+        if "top_artists" in source_targets:
+            # 5 songs per artist
+            num_artists = min(50, math.ceil(source_targets["top_artists"] / 5))
+            fetch_kwargs["top_artists"] = dict(time_range="medium_term", limit=num_artists)
+        if "top_tracks" in source_targets:
+            target = source_targets["top_tracks"]
+            if target <= 50:
+                fetch_kwargs["top_tracks"] = dict(time_range="medium_term", album_mode=False, limit=target)
+            else:
+                # Albums add ~12 songs each on top of the 50 top tracks
+                num_albums = min(2, math.ceil((target - 50) / 12))
+                fetch_kwargs["top_tracks"] = dict(time_range="medium_term", album_mode=True, limit=50, num_albums=num_albums)
+        if "saved_tracks" in source_targets:
+            target = source_targets["saved_tracks"]
+            # ~1/7 of saved-track songs come from 5 top tracks of random saved artists
+            num_artists = min(5, round(target / 7 / 5))
+            num_sections = max(1, math.ceil((target - num_artists * 5) / 50))
+            fetch_kwargs["saved_tracks"] = dict(
+                num_sections=num_sections,
+                top_tracks_mode=num_artists > 0,
+                num_top_track_artists=num_artists,
+            )
+        return fetch_kwargs
+
+    async def add_songs_parallel(self, source_targets: Optional[Dict[str, int]] = None):
         """
         Calls all song-adding functions in parallel and joins their results.
         This is more efficient than calling them sequentially.
+
+        Args:
+            source_targets: Optional number of tracks to fetch per source (see PoolPlanner);
+                            sources missing from it are skipped
         """
-        print("Starting parallel song addition process")
+        fetch_kwargs = self._source_fetch_kwargs(source_targets)
+        logger.info("Starting parallel song addition process with %s", fetch_kwargs)
+        source_fetchers = {
+            "top_artists": self.add_top_user_artists_tracks,
+            "top_tracks": self.add_top_user_tracks,
+            "saved_tracks": self.add_saved_tracks,
+        }
         tasks = [
-            self.add_top_user_artists_tracks(time_range="medium_term", limit=20), # 20 artists * 5 songs each = 100
-            self.add_top_user_tracks(time_range="medium_term", album_mode=True, limit=50, num_albums=2), # 50 songs + ~25 ish songs from 2 albums = ~75 
-            self.add_saved_tracks(num_sections=3, top_tracks_mode=True, num_top_track_artists=5),  
-            # 150  + 25 = ~175
-            # Each section max 50 songs
-            # Sample 5 songs from 5 random artists
-            #Total 350ish
+            traced(f"candidate_pool.{source}", fetcher(**fetch_kwargs[source]))
+            for source, fetcher in source_fetchers.items()
+            if source in fetch_kwargs
         ]
         
-        # Use asyncio.gather with return_exceptions=True to handle errors gracefully
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Log any errors that occurred
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                print(f"Error in task {i}: {str(result)}")
-                
-        print("Completed parallel song addition process")
+        try:
+            # Use asyncio.gather with return_exceptions=True to handle errors gracefully
+            with span("candidate_pool.fill") as fill_span:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                if fill_span is not None:
+                    fill_span.set_attribute("songs", len(self.pool))
+
+            # Log any errors that occurred
+            for i, result in enumerate(results):
+                if isinstance(result, Exception):
+                    logger.error("Error in task %d: %s", i, result)
+        finally:
+            # Wake up any streaming consumers so they can finish
+            async with self.pool_updated:
+                self.finished = True
+                self.pool_updated.notify_all()
+
+        logger.info("Completed parallel song addition process with %d songs", len(self.pool))
 
     def check_genre_match(self, genres: list[str], isSong: bool):
         #TODO NEED TO FIX THIS
         if len(self.genres) == 0:
             return True
         if not isSong and (len(genres) == 0 or genres[0]==""):
-            print("No genres found for Artist")
+            logger.debug("No genres found for Artist")
             return True
         elif len(genres) == 0 or genres[0]=="":
-            print("No genres found for Song")
+            logger.debug("No genres found for Song")
             return True
         for genre in genres:
             for pool_genre in self.genres:
                 if genre.lower() in pool_genre.lower() or pool_genre.lower() in genre.lower():
-                    print(f"Genre match found: {genre} matches {pool_genre}")
+                    logger.debug("Genre match found: %s matches %s", genre, pool_genre)
                     return True
-        print(f"No genre match found for genres: {genres}")
+        logger.debug("No genre match found for genres: %s", genres)
         return False
     
     #TODO ADD MORE SONGS FROM SHAZAM 
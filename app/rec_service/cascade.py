@@ -0,0 +1,101 @@
+import logging
+from collections import defaultdict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from app.models.song import Pool_Song
+from app.rec_service.local_judge import LocalJudge
+
+logger = logging.getLogger(__name__)
+
+
+def _primary_artist(song: Pool_Song) -> str:
+    return song.artist.split(", ")[0].lower()
+
+
+def affinity_scores(songs: Sequence[Pool_Song], artist_weights: Mapping[str, float]) -> np.ndarray:
+    """How much the user listens to each song's artists, scaled to [0, 1]"""
+    if not songs or not artist_weights:
+        return np.zeros(len(songs))
+    top = max(artist_weights.values())
+    return np.array([
+        max((artist_weights.get(artist.strip().lower(), 0.0) for artist in song.artist.split(",")), default=0.0) / top
+        for song in songs
+    ])
+
+
+def prerank(
+    songs: Sequence[Pool_Song],
+    judge: LocalJudge,
+    artist_weights: Optional[Mapping[str, float]] = None,
+    affinity_weight: float = 0.0,
+) -> np.ndarray:
+    """Cheap score in [0, 1] for every song: local judge features blended with artist affinity"""
+    scores = judge.scores(songs)
+    if artist_weights and affinity_weight > 0:
+        scores = (1 - affinity_weight) * scores + affinity_weight * affinity_scores(songs, artist_weights)
+    return scores
+
+
+def shortlist(
+    songs: Sequence[Pool_Song],
+    scores: np.ndarray,
+    size: int,
+    max_per_artist: Optional[int] = None,
+) -> List[Pool_Song]:
+    """The size best-scored songs, at most max_per_artist per artist while others are left"""
+    order = np.argsort(-scores, kind="stable")
+    kept: List[Pool_Song] = []
+    kept_set = set()
+    artist_counts: Dict[str, int] = defaultdict(int)
+    # First pass honours the per-artist cap, the second fills any remaining slots
+    for cap in (max_per_artist, None):
+        for index in order:
+            if len(kept) >= size:
+                return kept
+            song = songs[index]
+            if song in kept_set:
+                continue
+            artist = _primary_artist(song)
+            if cap is not None and artist_counts[artist] >= cap:
+                continue
+            kept.append(song)
+            kept_set.add(song)
+            artist_counts[artist] += 1
+    return kept
+
+
+def blend(
+    engine_scores: Mapping[Pool_Song, float],
+    local_scores: Mapping[Pool_Song, float],
+    weight: float,
+) -> Dict[Pool_Song, float]:
+    """
+    Mix weight of the (min-max normalised) local score into the engine's scores.
+    The result stays on the engine's scale, so its softmax/percentages still apply.
+    """
+    if not engine_scores or weight <= 0:
+        return dict(engine_scores)
+    top = max(engine_scores.values()) or 1.0
+    local = np.array([local_scores.get(song, 0.0) for song in engine_scores])
+    spread = local.max() - local.min()
+    local = (local - local.min()) / spread if spread > 0 else np.zeros_like(local)
+    return {
+        song: top * ((1 - weight) * score / top + weight * local_score)
+        for (song, score), local_score in zip(engine_scores.items(), local)
+    }
+
+
+def cascade_shortlist(
+    songs: Sequence[Pool_Song],
+    judge: LocalJudge,
+    size: int,
+    max_per_artist: Optional[int] = None,
+    artist_weights: Optional[Mapping[str, float]] = None,
+    affinity_weight: float = 0.0,
+) -> Tuple[List[Pool_Song], Dict[Pool_Song, float]]:
+    """Pre-rank every song locally; returns the shortlist for the LLM engine and every song's local score"""
+    songs = list(songs)
+    scores = prerank(songs, judge, artist_weights, affinity_weight)
+    kept = shortlist(songs, scores, size, max_per_artist)
+    logger.info("Cascade kept %d of %d songs for LLM ranking", len(kept), len(songs))
+    return kept, {song: float(score) for song, score in zip(songs, scores)}
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.models.song import Pool_Song
+
+logger = logging.getLogger(__name__)
+
+SongKey = Tuple[str, str]
+
+
+def song_key(song: Pool_Song) -> SongKey:
+    """Identity of a song for the cache, the same fields Pool_Song hashes"""
+    return (song.title, song.artist)
+
+
+def context_fingerprint(prompt_template: Any) -> str:
+    """
+    Fingerprint of the judging context. The judge prompt template already has
+    the weather, user context and image analysis filled in, so two requests
+    share judgements only when their prompts would be the same.
+    """
+    segments = getattr(prompt_template, "segments", None)
+    text = repr(segments) if segments is not None else str(prompt_template)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ComparisonCache:
+    """
+    Outcomes of LLM judgements, keyed by context fingerprint and the unordered
+    pair of songs. A repeat matchup under the same context (in another bracket,
+    during top-k replay or in a later request with the same photo and weather)
+    is answered without an LLM call. Least recently used entries are dropped
+    beyond max_entries and entries expire after ttl_s.
+    """
+    def __init__(
+        self,
+        ttl_s: float = settings.COMPARISON_CACHE_TTL_S,
+        max_entries: int = settings.COMPARISON_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        # (fingerprint, first song, second song) -> (winner, expires_at), songs in sorted order
+        self.entries: "OrderedDict[Tuple[str, SongKey, SongKey], Tuple[SongKey, float]]" = OrderedDict()
+        # (fingerprint, song) -> songs it has a cached outcome against, for pairing
+        self.opponents: Dict[Tuple[str, SongKey], Set[SongKey]] = defaultdict(set)
+
+    @staticmethod
+    def _key(fingerprint: str, song_1: Pool_Song, song_2: Pool_Song) -> Tuple[str, SongKey, SongKey]:
+        first, second = sorted((song_key(song_1), song_key(song_2)))
+        return (fingerprint, first, second)
+
+    def get(self, fingerprint: str, song_1: Pool_Song, song_2: Pool_Song) -> Optional[Pool_Song]:
+        """The cached winner of song_1 vs song_2 under this context, if known"""
+        key = self._key(fingerprint, song_1, song_2)
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        record_cache_lookup("comparison", entry is not None)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return song_1 if entry[0] == song_key(song_1) else song_2
+
+    def put(self, fingerprint: str, winner: Pool_Song, loser: Pool_Song) -> None:
+        key = self._key(fingerprint, winner, loser)
+        self.entries[key] = (song_key(winner), time.monotonic() + self.ttl_s)
+        self.entries.move_to_end(key)
+        _fingerprint, first, second = key
+        self.opponents[(fingerprint, first)].add(second)
+        self.opponents[(fingerprint, second)].add(first)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: Tuple[str, SongKey, SongKey]) -> None:
+        del self.entries[key]
+        fingerprint, first, second = key
+        for song, opponent in ((first, second), (second, first)):
+            opponents = self.opponents.get((fingerprint, song))
+            if opponents is not None:
+                opponents.discard(opponent)
+                if not opponents:
+                    del self.opponents[(fingerprint, song)]
+
+    def known_opponents(self, fingerprint: str, song: Pool_Song) -> Set[SongKey]:
+        """Songs with a cached outcome against song under this context (expired entries included until looked up)"""
+        return self.opponents.get((fingerprint, song_key(song)), set())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def cache_aware_order(
+    songs: Sequence[Pool_Song],
+    cache: ComparisonCache,
+    fingerprint: str,
+    rng: random.Random = random,
+) -> List[Pool_Song]:
+    """
+    Order songs for a bracket so that first-round pairs (positions 0-1, 2-3, ...)
+    are, where possible, pairs whose outcome the cache already knows. Songs are
+    visited in random order and each takes a random unpaired song it has a
+    known outcome against; the rest are paired at random and the pairs shuffled.
+    """
+    remaining = list(songs)
+    rng.shuffle(remaining)
+    index_of = {song_key(song): index for index, song in enumerate(remaining)}
+    unpaired = set(range(len(remaining)))
+    pairs: List[Tuple[Pool_Song, ...]] = []
+    for index, song in enumerate(remaining):
+        if index not in unpaired:
+            continue
+        known = sorted(
+            index_of[opponent] for opponent in cache.known_opponents(fingerprint, song)
+            if index_of.get(opponent, index) != index and index_of[opponent] in unpaired
+        )
+        if known:
+            opponent = rng.choice(known)
+            unpaired -= {index, opponent}
+            pairs.append((song, remaining[opponent]))
+    known_pairs = len(pairs)
+    rest = [song for index, song in enumerate(remaining) if index in unpaired]
+    pairs.extend(tuple(rest[i:i + 2]) for i in range(0, len(rest), 2))
+    # An odd song out keeps its bye at the end of the bracket
+    bye = list(pairs.pop()) if pairs and len(pairs[-1]) == 1 else []
+    rng.shuffle(pairs)
+    if known_pairs:
+        logger.debug("Cache-aware pairing: %d of %d first-round pairs already judged", known_pairs, len(pairs))
+    return [song for pair in pairs for song in pair] + bye
@@ -0,0 +1,69 @@
+import time
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+from cachetools import TTLCache
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.utils.image_processing import hamming_distance
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    dhash: int
+    analysis: dict
+    expires_at: float
+
+
+class ImageAnalysisCache:
+    """
+    Reuses image analyses for photos that look the same, by Hamming distance
+    between perceptual hashes. Entries are scoped per user (the Spotify user
+    id, or the session when it is unknown) because the vision prompt includes
+    the user's top songs and artists. At most max_users users
+    are kept, least recently used first out, and a user's entries go once
+    none has been added for ttl_s, whether or not that user comes back.
+    """
+    def __init__(
+        self,
+        ttl_s: float = settings.IMAGE_CACHE_TTL_S,
+        max_distance: int = settings.IMAGE_CACHE_MAX_DISTANCE,
+        max_entries_per_user: int = settings.IMAGE_CACHE_MAX_ENTRIES_PER_USER,
+        max_users: int = settings.IMAGE_CACHE_MAX_USERS,
+    ):
+        self.ttl_s = ttl_s
+        self.max_distance = max_distance
+        self.max_entries_per_user = max_entries_per_user
+        # Entries of a user are refreshed together on every put, and each entry keeps its own expiry
+        self.entries: TTLCache = TTLCache(maxsize=max_users, ttl=ttl_s, timer=time.monotonic)
+
+    def _evict_expired(self, user_key: str, now: float) -> List[_Entry]:
+        entries = [entry for entry in self.entries.get(user_key, []) if entry.expires_at > now]
+        if entries:
+            self.entries[user_key] = entries
+        else:
+            self.entries.pop(user_key, None)
+        return entries
+
+    def get(self, user_key: str, dhash: Optional[int]) -> Optional[dict]:
+        """Return the analysis of the closest cached photo within max_distance, if any"""
+        if dhash is None:
+            return None
+        entries = self._evict_expired(user_key, time.monotonic())
+        best = min(entries, key=lambda entry: hamming_distance(entry.dhash, dhash), default=None)
+        hit = best is not None and hamming_distance(best.dhash, dhash) <= self.max_distance
+        record_cache_lookup("image_analysis", hit)
+        if not hit:
+            return None
+        logger.debug("Image analysis cache hit at distance %d", hamming_distance(best.dhash, dhash))
+        return best.analysis
+
+    def put(self, user_key: str, dhash: Optional[int], analysis: dict) -> None:
+        if dhash is None or not analysis:
+            return
+        entries = self._evict_expired(user_key, time.monotonic())
+        entries.append(_Entry(dhash, analysis, time.monotonic() + self.ttl_s))
+        # Oldest entries expire first, so drop from the front when over the limit
+        self.entries[user_key] = entries[-self.max_entries_per_user:]
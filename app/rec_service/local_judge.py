@@ -0,0 +1,173 @@
+import datetime
+import json
+import logging
+from typing import Any, Dict, FrozenSet, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+from app.models.song import Pool_Song
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ("popularity", "recency", "duration", "genre", "energy")
+
+# Rough energy of a genre on a 0-1 scale, matched as substrings of genre names
+GENRE_ENERGY = {
+    "metal": 0.95, "punk": 0.9, "edm": 0.9, "drum and bass": 0.9, "techno": 0.85, "house": 0.8,
+    "dance": 0.8, "rock": 0.75, "hip hop": 0.7, "rap": 0.7, "trap": 0.7, "pop": 0.65, "funk": 0.65,
+    "reggaeton": 0.7, "latin": 0.65, "disco": 0.75, "r&b": 0.5, "soul": 0.45, "country": 0.5,
+    "indie": 0.5, "jazz": 0.35, "blues": 0.4, "folk": 0.3, "acoustic": 0.25, "lo-fi": 0.2,
+    "ambient": 0.1, "classical": 0.2, "chill": 0.25,
+}
+ENERGY_LEVELS = {"low": 0.2, "medium": 0.5, "high": 0.85}
+MOOD_ENERGY = {
+    "calm": 0.2, "peaceful": 0.2, "relaxed": 0.25, "melancholic": 0.25, "sad": 0.2, "dreamy": 0.3,
+    "romantic": 0.35, "nostalgic": 0.35, "happy": 0.7, "upbeat": 0.8, "energetic": 0.9, "excited": 0.85,
+    "intense": 0.85, "angry": 0.9,
+}
+TYPICAL_DURATION_S = 210.0
+DURATION_SPREAD_S = 90.0
+OLDEST_YEAR = 1960
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    """Parse "popularity=0.3,genre=0.2" into feature weights"""
+    weights = {}
+    for item in value.split(","):
+        if "=" in item:
+            feature, weight = item.split("=", 1)
+            weights[feature.strip()] = float(weight)
+    return weights
+
+
+def _as_dict(value: Any) -> dict:
+    """Context may arrive as a dict or as compacted JSON (see prompt_compaction)"""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
+
+def _genre_energy(genres: Sequence[str]) -> Optional[float]:
+    levels = [energy for genre in genres for name, energy in GENRE_ENERGY.items() if name in genre]
+    return float(np.mean(levels)) if levels else None
+
+
+def _split_genres(genre: Optional[str]) -> Tuple[str, ...]:
+    if not genre:
+        return ()
+    return tuple(part.strip().lower() for part in genre.replace(";", ",").split(",") if part.strip())
+
+
+class LocalJudge:
+    """
+    Weighted feature model that answers the same questions as the LLM judge
+    (get_recommendation) and fitness function (generate_fitness_scores) in
+    microseconds, from what Pool_Song and the request context already carry:
+    popularity, release year, duration, genre overlap with the context genres
+    and how well the genre's energy fits the energy the context asks for.
+    Like the judge prompt, it puts the context first and prefers the less
+    popular of otherwise equal tracks, so the popularity feature is higher
+    the less popular a track is. Song genres come from the artists' genres
+    (SpotifyService fills them in). Deterministic, so it doubles as a judge
+    for tests and benchmarks.
+    """
+    name = "local"
+
+    def __init__(
+        self,
+        weather_data: Any = None,
+        user_context: Any = None,
+        image_analysis: Any = None,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        configured = {**_parse_weights(settings.LOCAL_JUDGE_WEIGHTS), **(weights or {})}
+        self.weights = np.array([configured.get(feature, 0.0) for feature in FEATURES], dtype=np.float64)
+        total = self.weights.sum()
+        if total <= 0:
+            raise ValueError("LOCAL_JUDGE_WEIGHTS must give at least one feature a positive weight")
+        self.weights /= total
+        self._context_key: Optional[Tuple[str, ...]] = None
+        self.set_context(weather_data, user_context, image_analysis)
+
+    def set_context(self, weather_data: Any, user_context: Any, image_analysis: Any) -> None:
+        key = tuple(value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+                    for value in (weather_data, user_context, image_analysis))
+        if key == self._context_key:
+            return
+        self._context_key = key
+        weather, user, image = _as_dict(weather_data), _as_dict(user_context), _as_dict(image_analysis)
+
+        genres = [str(genre).lower() for source in (image, user) for genre in source.get("genres", []) or []]
+        self.context_genres: FrozenSet[str] = frozenset(genres)
+
+        # Target energy: the image's energy level, else its mood, nudged down at night
+        target = ENERGY_LEVELS.get(str(image.get("energy_level", "")).lower())
+        if target is None:
+            mood = str(image.get("mood", "")).lower()
+            moods = [energy for word, energy in MOOD_ENERGY.items() if word in mood]
+            target = float(np.mean(moods)) if moods else _genre_energy(genres)
+        if target is None:
+            target = 0.5
+        if weather.get("isDaytime") is False:
+            target -= 0.1
+        self.target_energy = float(np.clip(target, 0.0, 1.0))
+
+    def features(self, songs: Sequence[Pool_Song]) -> np.ndarray:
+        """One row of FEATURES per song, each in [0, 1]; unknown values are neutral (0.5)"""
+        count = len(songs)
+        popularity = 1.0 - np.array([song.popularity_score if song.popularity_score is not None else 50 for song in songs],
+                                    dtype=np.float64) / 100.0
+        years = np.array([self._year(song) for song in songs], dtype=np.float64)
+        current_year = datetime.date.today().year
+        recency = np.where(np.isnan(years), 0.5, np.clip((years - OLDEST_YEAR) / (current_year - OLDEST_YEAR), 0, 1))
+        durations = np.array([song.duration_ms / 1000.0 if song.duration_ms else np.nan for song in songs], dtype=np.float64)
+        duration = np.where(
+            np.isnan(durations), 0.5, np.exp(-(((durations - TYPICAL_DURATION_S) / DURATION_SPREAD_S) ** 2))
+        )
+
+        genre = np.full(count, 0.5)
+        energy = np.full(count, 0.5)
+        for index, song in enumerate(songs):
+            song_genres = _split_genres(song.genre)
+            if not song_genres:
+                continue
+            if self.context_genres:
+                matches = sum(1 for g in song_genres if any(g in c or c in g for c in self.context_genres))
+                genre[index] = matches / len(song_genres)
+            song_energy = _genre_energy(song_genres)
+            if song_energy is not None:
+                energy[index] = 1.0 - abs(song_energy - self.target_energy)
+        return np.column_stack((popularity, recency, duration, genre, energy))
+
+    @staticmethod
+    def _year(song: Pool_Song) -> float:
+        try:
+            return float(song.release_date[:4])
+        except (TypeError, ValueError):
+            return np.nan
+
+    def scores(self, songs: Sequence[Pool_Song]) -> np.ndarray:
+        """Score in [0, 1] for every song, computed in one matrix product"""
+        if not songs:
+            return np.zeros(0)
+        return self.features(songs) @ self.weights
+
+    def margin(self, song_1: Pool_Song, song_2: Pool_Song) -> float:
+        """Score of song_1 minus score of song_2"""
+        score_1, score_2 = self.scores([song_1, song_2])
+        return float(score_1 - score_2)
+
+    async def get_recommendation(self, song_1: Pool_Song, song_2: Pool_Song, prompt_template: Any = None) -> int:
+        """0 if song_1 fits better, 1 otherwise; ties go to song_1 like the LLM parser's default"""
+        return 0 if self.margin(song_1, song_2) >= 0 else 1
+
+    async def generate_fitness_scores(self, song: Pool_Song, weather_data: Any = None, user_context: Any = None, image_analysis: Any = None) -> int:
+        """0-100 fitness on the LLM fitness scale, for the given context (or the current one)"""
+        if weather_data is not None or user_context is not None or image_analysis is not None:
+            self.set_context(weather_data, user_context, image_analysis)
+        return int(round(float(self.scores([song])[0]) * 100))
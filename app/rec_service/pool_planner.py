@@ -0,0 +1,227 @@
+import math
+import random
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.models.song import Pool_Song
+from app.rec_service.topk_selection import tree_comparisons
+
+logger = logging.getLogger(__name__)
+
+# Share of the fetched songs each CandidatePool source contributes today
+# (~100 from top artists, ~75 from top tracks + albums, ~175 from saved tracks)
+SOURCE_WEIGHTS = {
+    "top_artists": 100,
+    "top_tracks": 75,
+    "saved_tracks": 175,
+}
+MAX_FETCHED_SONGS = sum(SOURCE_WEIGHTS.values())
+
+
+@dataclass
+class PoolPlan:
+    """How many songs to fetch, keep and rank for one request"""
+    engine: str
+    pool_size: int
+    min_pool_size: int
+    source_targets: Dict[str, int] = field(default_factory=dict)
+    max_per_artist: int = 3
+    num_tournaments: int = 3
+    ga_runs: int = 5
+    ga_population_size: int = 30
+    ga_generations: int = 12
+    estimated_llm_calls: int = 0
+    estimated_latency_s: float = 0.0
+    # Cascade: fetch every source in full, pre-rank locally and keep pool_size songs
+    cascade: bool = False
+
+
+class PoolPlanner:
+    """
+    Derives the candidate pool size from a latency or LLM-call budget for the
+    chosen ranking engine, and tells each CandidatePool source how much to fetch.
+    """
+    def __init__(
+        self,
+        judge_latency_s: float = settings.LLM_JUDGE_LATENCY_S,
+        fitness_latency_s: float = settings.LLM_FITNESS_LATENCY_S,
+        overfetch_factor: float = settings.CANDIDATE_POOL_OVERFETCH_FACTOR,
+        max_per_artist: int = settings.CANDIDATE_POOL_MAX_PER_ARTIST,
+        num_tournaments: int = 3,
+        ga_runs: int = 5,
+        ga_population_size: int = 30,
+        ga_generations: int = 12,
+        ga_mutation_rate: float = 0.15,
+    ):
+        self.judge_latency_s = judge_latency_s
+        self.fitness_latency_s = fitness_latency_s
+        self.overfetch_factor = overfetch_factor
+        self.max_per_artist = max_per_artist
+        self.num_tournaments = num_tournaments
+        self.ga_runs = ga_runs
+        self.ga_population_size = ga_population_size
+        self.ga_generations = ga_generations
+        self.ga_mutation_rate = ga_mutation_rate
+
+    def plan(
+        self,
+        engine: str = "tourney",
+        latency_budget_s: Optional[float] = None,
+        llm_call_budget: Optional[int] = None,
+        cascade: bool = False,
+    ) -> PoolPlan:
+        """
+        Build a plan for the given engine ("tourney" or "genetic").
+        Without a budget the plan keeps the default pool size. With cascade the
+        sources fetch everything they can and pool_size is the shortlist size.
+        """
+        if engine == "tourney":
+            plan = self._plan_tourney(latency_budget_s, llm_call_budget)
+        elif engine == "genetic":
+            plan = self._plan_genetic(latency_budget_s, llm_call_budget)
+        else:
+            raise ValueError(f"Unknown ranking engine: {engine}")
+        plan.cascade = cascade
+        plan.source_targets = self.source_targets(MAX_FETCHED_SONGS if cascade else plan.pool_size)
+        logger.info(
+            "Pool plan for %s%s: keep %d songs, fetch %s, ~%d LLM calls, ~%.1fs",
+            engine, " (cascade)" if cascade else "", plan.pool_size, plan.source_targets,
+            plan.estimated_llm_calls, plan.estimated_latency_s,
+        )
+        return plan
+
+    def _plan_tourney(self, latency_budget_s: Optional[float], llm_call_budget: Optional[int]) -> PoolPlan:
+        if settings.TOURNEY_SELECTION == "tree":
+            return self._plan_tree(latency_budget_s, llm_call_budget)
+        pool_size = settings.CANDIDATE_POOL_MAX_SIZE
+        if latency_budget_s is not None:
+            # Matchups within a round run concurrently, so latency grows with the number of rounds
+            max_rounds = max(1, int(latency_budget_s // self.judge_latency_s))
+            pool_size = min(pool_size, 2 ** max_rounds)
+        if llm_call_budget is not None:
+            # Each bracket of n songs needs n - 1 comparisons
+            pool_size = min(pool_size, llm_call_budget // self.num_tournaments + 1)
+        pool_size = max(2, min(pool_size, MAX_FETCHED_SONGS))
+
+        return PoolPlan(
+            engine="tourney",
+            pool_size=pool_size,
+            min_pool_size=min(settings.CANDIDATE_POOL_MIN_SIZE, pool_size),
+            max_per_artist=self.max_per_artist,
+            num_tournaments=self.num_tournaments,
+            estimated_llm_calls=self.num_tournaments * (pool_size - 1),
+            estimated_latency_s=math.ceil(math.log2(pool_size)) * self.judge_latency_s,
+        )
+
+    def _plan_tree(self, latency_budget_s: Optional[float], llm_call_budget: Optional[int], k: int = 5) -> PoolPlan:
+        # Building the tree takes one judgement per level; each of the k - 1 replays walks the levels again
+        def latency(size: int) -> float:
+            return k * math.ceil(math.log2(size)) * self.judge_latency_s
+
+        pool_size = max(2, min(settings.CANDIDATE_POOL_MAX_SIZE, MAX_FETCHED_SONGS))
+        while pool_size > 2 and (
+            (latency_budget_s is not None and latency(pool_size) > latency_budget_s)
+            or (llm_call_budget is not None and tree_comparisons(pool_size, k) > llm_call_budget)
+        ):
+            pool_size -= 1
+
+        return PoolPlan(
+            engine="tourney",
+            pool_size=pool_size,
+            min_pool_size=min(settings.CANDIDATE_POOL_MIN_SIZE, pool_size),
+            max_per_artist=self.max_per_artist,
+            num_tournaments=1,
+            estimated_llm_calls=tree_comparisons(pool_size, k),
+            estimated_latency_s=latency(pool_size),
+        )
+
+    def _plan_genetic(self, latency_budget_s: Optional[float], llm_call_budget: Optional[int]) -> PoolPlan:
+        generations = self.ga_generations
+        if latency_budget_s is not None:
+            # Each generation waits for one round of fitness calls, plus a final tie-break evaluation
+            generations = min(generations, max(1, int(latency_budget_s // self.fitness_latency_s) - 1))
+        calls_per_run = self._ga_calls_per_run(generations)
+        if llm_call_budget is not None:
+            while generations > 1 and self.ga_runs * calls_per_run > llm_call_budget:
+                generations -= 1
+                calls_per_run = self._ga_calls_per_run(generations)
+
+        # A larger pool than the songs the runs can ever evaluate is paid for but never ranked
+        pool_size = max(self.ga_population_size, min(self.ga_runs * calls_per_run, MAX_FETCHED_SONGS))
+
+        return PoolPlan(
+            engine="genetic",
+            pool_size=pool_size,
+            min_pool_size=max(self.ga_population_size, min(settings.CANDIDATE_POOL_MIN_SIZE, pool_size)),
+            max_per_artist=self.max_per_artist,
+            ga_runs=self.ga_runs,
+            ga_population_size=self.ga_population_size,
+            ga_generations=generations,
+            estimated_llm_calls=self.ga_runs * calls_per_run,
+            estimated_latency_s=(generations + 1) * self.fitness_latency_s,
+        )
+
+    def _ga_calls_per_run(self, generations: int) -> int:
+        """Distinct songs one GA run evaluates: the initial population plus mutated children"""
+        mutated = generations * self.ga_population_size * self.ga_mutation_rate
+        return math.ceil(self.ga_population_size + mutated)
+
+    def source_targets(self, pool_size: int) -> Dict[str, int]:
+        """Number of tracks each source should fetch to fill a pool of pool_size"""
+        wanted = min(MAX_FETCHED_SONGS, math.ceil(pool_size * self.overfetch_factor))
+        return {
+            source: max(1, math.ceil(wanted * weight / MAX_FETCHED_SONGS))
+            for source, weight in SOURCE_WEIGHTS.items()
+        }
+
+    def stratify(
+        self,
+        songs: List[Pool_Song],
+        song_sources: Dict[Pool_Song, str],
+        pool_size: int,
+        max_per_artist: Optional[int] = None,
+    ) -> List[Pool_Song]:
+        """
+        Keep pool_size songs, drawing round-robin across sources and limiting
+        how many songs any one artist contributes.
+        """
+        if len(songs) <= pool_size:
+            return list(songs)
+        max_per_artist = max_per_artist or self.max_per_artist
+
+        by_source: Dict[str, List[Pool_Song]] = defaultdict(list)
+        for song in songs:
+            by_source[song_sources.get(song, "unknown")].append(song)
+        for source_songs in by_source.values():
+            random.shuffle(source_songs)
+
+        kept: List[Pool_Song] = []
+        kept_set = set()
+        artist_counts: Dict[str, int] = defaultdict(int)
+        # First pass honours the per-artist cap, the second fills any remaining slots
+        for cap in (max_per_artist, None):
+            queues = [list(source_songs) for source_songs in by_source.values()]
+            while len(kept) < pool_size and any(queues):
+                for queue in queues:
+                    while queue:
+                        song = queue.pop()
+                        if song in kept_set:
+                            continue
+                        artist = _primary_artist(song)
+                        if cap is not None and artist_counts[artist] >= cap:
+                            continue
+                        kept.append(song)
+                        kept_set.add(song)
+                        artist_counts[artist] += 1
+                        break
+                    if len(kept) >= pool_size:
+                        break
+            if len(kept) >= pool_size:
+                break
+        return kept
+
+
+def _primary_artist(song: Pool_Song) -> str:
+    return song.artist.split(", ")[0].lower()
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+from app.core.config import settings
+from app.models.song import Pool_Song
+from app.rec_service.local_judge import LocalJudge
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATING = 1500.0
+# rating, games played
+Rating = Tuple[float, int]
+
+
+def track_key(song: Pool_Song) -> str:
+    return song.spotify_link or f"{song.title} - {song.artist}"
+
+
+def context_bucket(weather_data: Any, image_analysis: Any) -> str:
+    """
+    Coarse context a rating holds for: the energy the photo asks for (low, mid
+    or high, as the local judge reads it) and day or night. Coarse enough that
+    a user's requests keep landing in the same few buckets.
+    """
+    judge = LocalJudge(weather_data, None, image_analysis)
+    energy = "low" if judge.target_energy < 0.4 else "mid" if judge.target_energy < 0.7 else "high"
+    daytime = weather_data.get("isDaytime") if isinstance(weather_data, dict) else None
+    return f"{energy}:{'any' if daytime is None else 'day' if daytime else 'night'}"
+
+
+def elo_update(
+    ratings: Dict[str, Rating],
+    comparisons: Iterable[Tuple[str, str]],
+    k_factor: float = settings.RATING_ELO_K,
+) -> Dict[str, Rating]:
+    """Apply (winner, loser) outcomes in order; unknown tracks start at DEFAULT_RATING"""
+    ratings = dict(ratings)
+    for winner, loser in comparisons:
+        winner_rating, winner_games = ratings.get(winner, (DEFAULT_RATING, 0))
+        loser_rating, loser_games = ratings.get(loser, (DEFAULT_RATING, 0))
+        expected = 1.0 / (1.0 + 10 ** ((loser_rating - winner_rating) / 400.0))
+        change = k_factor * (1.0 - expected)
+        ratings[winner] = (winner_rating + change, winner_games + 1)
+        ratings[loser] = (loser_rating - change, loser_games + 1)
+    return ratings
+
+
+class RatingStore(ABC):
+    """
+    Per-user Elo ratings of tracks, per context bucket. Ratings of earlier
+    requests seed and blend into the ranking of later ones; the judgements of
+    each request update them.
+    """
+    @abstractmethod
+    async def get(self, user_id: str, bucket: str, tracks: Sequence[str]) -> Dict[str, Rating]:
+        """Stored ratings of the given tracks; tracks never rated are left out"""
+
+    @abstractmethod
+    async def put(self, user_id: str, bucket: str, ratings: Dict[str, Rating]) -> None:
+        """Store ratings, replacing earlier values"""
+
+    @abstractmethod
+    async def record(self, user_id: str, bucket: str, comparisons: Sequence[Tuple[str, str]]) -> Dict[str, Rating]:
+        """
+        Update the ratings of every track in comparisons with their outcomes.
+        Reading and writing back is atomic, so concurrent requests of the same
+        user cannot overwrite each other's updates.
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteRatingStore(RatingStore):
+    """Ratings in a local SQLite file; queries run in a worker thread"""
+    def __init__(self, path: str = settings.RATING_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ratings ("
+                " user_id TEXT NOT NULL, bucket TEXT NOT NULL, track TEXT NOT NULL,"
+                " rating REAL NOT NULL, games INTEGER NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (user_id, bucket, track))"
+            )
+
+    def _select(self, user_id: str, bucket: str, tracks: Sequence[str]) -> Dict[str, Rating]:
+        ratings: Dict[str, Rating] = {}
+        # Stay under SQLite's limit on query parameters
+        for start in range(0, len(tracks), 500):
+            chunk = list(tracks[start:start + 500])
+            rows = self._connection.execute(
+                f"SELECT track, rating, games FROM ratings WHERE user_id = ? AND bucket = ?"
+                f" AND track IN ({','.join('?' * len(chunk))})",
+                [user_id, bucket, *chunk],
+            ).fetchall()
+            ratings.update({track: (rating, games) for track, rating, games in rows})
+        return ratings
+
+    def _upsert(self, user_id: str, bucket: str, ratings: Dict[str, Rating]) -> None:
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO ratings (user_id, bucket, track, rating, games, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(user_id, bucket, track, rating, games, now) for track, (rating, games) in ratings.items()],
+        )
+
+    def _get(self, user_id: str, bucket: str, tracks: Sequence[str]) -> Dict[str, Rating]:
+        with self._lock:
+            return self._select(user_id, bucket, tracks)
+
+    def _put(self, user_id: str, bucket: str, ratings: Dict[str, Rating]) -> None:
+        with self._lock, self._connection:
+            self._upsert(user_id, bucket, ratings)
+
+    def _record(self, user_id: str, bucket: str, comparisons: Sequence[Tuple[str, str]]) -> Dict[str, Rating]:
+        tracks = sorted({track for comparison in comparisons for track in comparison})
+        with self._lock:
+            # Take the write lock before reading, so writers in other processes wait for this update
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                updated = elo_update(self._select(user_id, bucket, tracks), comparisons)
+                self._upsert(user_id, bucket, updated)
+                self._connection.commit()
+            except BaseException:
+                self._connection.rollback()
+                raise
+        return updated
+
+    async def get(self, user_id: str, bucket: str, tracks: Sequence[str]) -> Dict[str, Rating]:
+        return await asyncio.to_thread(self._get, user_id, bucket, list(tracks))
+
+    async def put(self, user_id: str, bucket: str, ratings: Dict[str, Rating]) -> None:
+        await asyncio.to_thread(self._put, user_id, bucket, ratings)
+
+    async def record(self, user_id: str, bucket: str, comparisons: Sequence[Tuple[str, str]]) -> Dict[str, Rating]:
+        if not comparisons:
+            return {}
+        return await asyncio.to_thread(self._record, user_id, bucket, list(comparisons))
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class RedisRatingStore(RatingStore):
+    """Ratings in one Redis hash per user and bucket ("rating,games" per track), expiring after ttl_s unused"""
+    def __init__(self, url: str = settings.RATING_STORE_REDIS_URL, ttl_s: int = settings.RATING_STORE_TTL_S):
+        self.client = redis.from_url(url, decode_responses=True)
+        self.ttl_s = ttl_s
+
+    @staticmethod
+    def _key(user_id: str, bucket: str) -> str:
+        return f"ratings:{user_id}:{bucket}"
+
+    @staticmethod
+    def _decode(tracks: Sequence[str], values: Sequence[Optional[str]]) -> Dict[str, Rating]:
+        ratings: Dict[str, Rating] = {}
+        for track, value in zip(tracks, values):
+            if value:
+                rating, games = value.split(",")
+                ratings[track] = (float(rating), int(games))
+        return ratings
+
+    @staticmethod
+    def _encode(ratings: Dict[str, Rating]) -> Dict[str, str]:
+        return {track: f"{rating:.3f},{games}" for track, (rating, games) in ratings.items()}
+
+    async def get(self, user_id: str, bucket: str, tracks: Sequence[str]) -> Dict[str, Rating]:
+        if not tracks:
+            return {}
+        return self._decode(tracks, await self.client.hmget(self._key(user_id, bucket), list(tracks)))
+
+    async def put(self, user_id: str, bucket: str, ratings: Dict[str, Rating]) -> None:
+        if not ratings:
+            return
+        key = self._key(user_id, bucket)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=self._encode(ratings))
+            pipe.expire(key, self.ttl_s)
+            await pipe.execute()
+
+    async def record(self, user_id: str, bucket: str, comparisons: Sequence[Tuple[str, str]]) -> Dict[str, Rating]:
+        if not comparisons:
+            return {}
+        tracks = sorted({track for comparison in comparisons for track in comparison})
+        key = self._key(user_id, bucket)
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: the write is dropped if the hash changed after WATCH
+                    await pipe.watch(key)
+                    updated = elo_update(self._decode(tracks, await pipe.hmget(key, tracks)), comparisons)
+                    pipe.multi()
+                    pipe.hset(key, mapping=self._encode(updated))
+                    pipe.expire(key, self.ttl_s)
+                    await pipe.execute()
+                    return updated
+                except WatchError:
+                    logger.debug("Ratings of %s changed during an update, retrying", key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_store: Optional[RatingStore] = None
+_store_loaded = False
+
+
+def get_rating_store() -> Optional[RatingStore]:
+    """The store configured by RATING_STORE ("sqlite" or "redis"), built on first use"""
+    global _store, _store_loaded
+    if not _store_loaded:
+        if settings.RATING_STORE == "sqlite":
+            _store = SQLiteRatingStore()
+        elif settings.RATING_STORE == "redis":
+            _store = RedisRatingStore()
+        elif settings.RATING_STORE:
+            logger.warning("Unknown RATING_STORE %r, ratings will not be kept", settings.RATING_STORE)
+        _store_loaded = True
+    return _store
+
+
+def set_rating_store(store: Optional[RatingStore]) -> None:
+    """Install a store (or None to disable ratings)"""
+    global _store, _store_loaded
+    _store = store
+    _store_loaded = True
+
+
+async def close_rating_store() -> None:
+    global _store, _store_loaded
+    if _store is not None:
+        await _store.close()
+    _store = None
+    _store_loaded = False
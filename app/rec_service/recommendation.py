@@ -1,105 +1,196 @@
 from app.rec_service.candidate_pool import CandidatePool
 from app.rec_service.tourney import Tourney
+from app.rec_service.topk_selection import TopKSelector
+from app.rec_service.comparison_cache import ComparisonCache
+from app.rec_service.pool_planner import PoolPlanner
+from app.rec_service.image_analysis_cache import ImageAnalysisCache
+from app.rec_service.local_judge import LocalJudge
+from app.rec_service.cascade import blend, cascade_shortlist
+from app.rec_service.rating_store import DEFAULT_RATING, context_bucket, get_rating_store, track_key
 from app.genetic_algo.genetic import GeneticAlgorithm
 from app.services.service_instances import (
     spotify_service,
     openai_service,
     weather_service,
 )
-import json
 import asyncio
-from typing import Tuple
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from app.models.song import Pool_Song
 from app.services.spotify_service import SpotifyService
+from app.core.config import settings
+from app.core.tracing import span, traced
+from app.core.prompt_registry import PromptTemplate, prompt_registry
+from app.core.prompt_compaction import compact_context
+from app.utils.image_processing import prepare_image
+from app.services.weather_service import parse_location
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestContext:
+    """
+    What prepare() learned about one request. RecommendationService is shared
+    by every request, so the ranking steps take this instead of reading
+    request state from the service.
+    """
+    session_id: Optional[str] = None
+    # Spotify user id, keys the stored ratings (session ids change at every login)
+    user_id: Optional[str] = None
+    location_weather_analysis: Any = field(default_factory=dict)
+    image_analysis: Any = field(default_factory=dict)
+    audio_analysis: Any = field(default_factory=dict)
+    user_context: Any = field(default_factory=dict)
+    # Listening weight per lower-cased artist name, used by cascade pre-ranking
+    artist_weights: Dict[str, float] = field(default_factory=dict)
+    # Judge prompt with this request's context filled in
+    prompt_template: Optional[PromptTemplate] = None
+
 
 class RecommendationService:
     def __init__(self):
-        print("Initializing RecommendationService")
-        self.user_context = {}
-        self.image_analysis = {}
-        self.audio_analysis = {}
-        self.location_weather_analysis = {}
-        self.prompt_template = None
-
+        logger.debug("Initializing RecommendationService")
         self.open_ai_service = openai_service
         self.weather_service = weather_service
+        self.pool_planner = PoolPlanner()
+        self.image_analysis_cache = ImageAnalysisCache()
+        self.comparison_cache = ComparisonCache()
+
+    def local_judge(self, context: RequestContext) -> LocalJudge:
+        """A local judge for the request context (judge modes and provider fallback)"""
+        return LocalJudge(context.location_weather_analysis, context.user_context, context.image_analysis)
+
+    async def load_ratings(self, context: RequestContext, songs: List[Pool_Song]) -> Dict[Pool_Song, float]:
+        """The user's stored ratings of songs under the request context; unrated songs are left out"""
+        store = get_rating_store()
+        if store is None or context.user_id is None or not songs:
+            return {}
+        bucket = context_bucket(context.location_weather_analysis, context.image_analysis)
+        try:
+            with span("ratings.load", bucket=bucket, songs=len(songs)):
+                stored = await store.get(context.user_id, bucket, [track_key(song) for song in songs])
+        except Exception as e:
+            logger.warning("Could not load stored ratings: %s", e)
+            return {}
+        logger.debug("Loaded stored ratings for %d of %d songs (%s)", len(stored), len(songs), bucket)
+        return {song: stored[track_key(song)][0] for song in songs if track_key(song) in stored}
+
+    async def save_ratings(self, context: RequestContext, comparisons: List[Tuple[Pool_Song, Pool_Song]]) -> None:
+        """Update the user's stored ratings with this request's (winner, loser) judgements"""
+        store = get_rating_store()
+        if store is None or context.user_id is None or not comparisons:
+            return
+        bucket = context_bucket(context.location_weather_analysis, context.image_analysis)
+        try:
+            with span("ratings.save", bucket=bucket, comparisons=len(comparisons)):
+                await store.record(
+                    context.user_id, bucket, [(track_key(winner), track_key(loser)) for winner, loser in comparisons]
+                )
+        except Exception as e:
+            logger.warning("Could not save ratings: %s", e)
+
+    def cascade_shortlist(
+        self, context: RequestContext, songs: List[Pool_Song], size: int, max_per_artist: Optional[int] = None
+    ) -> Tuple[List[Pool_Song], Dict[Pool_Song, float]]:
+        """Pre-rank the whole pool locally and keep the size best songs for the LLM engine"""
+        with span("cascade.prerank", pool_size=len(songs), shortlist_size=size):
+            return cascade_shortlist(
+                songs, self.local_judge(context), size, max_per_artist,
+                artist_weights=context.artist_weights, affinity_weight=settings.CASCADE_AFFINITY_WEIGHT,
+            )
 
-    def prepare_prompt_template(self) -> str:
+    def prepare_prompt_template(self, context: RequestContext) -> Optional[PromptTemplate]:
         """
-        Prepares the prompt template with all contextual data
+        Prepares the prompt template with the request's contextual data
         """
         try:
-            if self.prompt_template is not None:
-                print("Using cached prompt template")
-                return self.prompt_template
-
-            print("Preparing prompt template")
-            # Load the base prompt template
-            with open("app/prompts/song_recommendation.txt", "r") as f:
-                base_template = f.read()
-
-            # Format the contextual data
-            weather_data = json.dumps(self.location_weather_analysis, indent=2)
-            user_context = json.dumps(self.user_context, indent=2)
-            image_analysis = json.dumps(self.image_analysis, indent=2)
-            audio_analysis = json.dumps(self.audio_analysis, indent=2)
-
-            print(f"Context data prepared - Weather: {weather_data[:100]}...")
-            print(f"Image analysis: {image_analysis[:100]}...")
-
-            # Create the template with contextual data but leave song data blank
-            self.prompt_template = base_template.format(
-                weather_data=weather_data.replace("{", "{{").replace("}", "}}"),
-                user_context=user_context.replace("{", "{{").replace("}", "}}"),
-                image_analysis=image_analysis.replace("{", "{{").replace("}", "}}"),
-                audio_analysis=audio_analysis.replace("{", "{{").replace("}", "}}"),
-                song1_title="{song1_title}",
-                song1_artist="{song1_artist}",
-                song1_popularity="{song1_popularity}",
-                song1_release_date="{song1_release_date}",
-                song1_duration="{song1_duration}",
-                song2_title="{song2_title}",
-                song2_artist="{song2_artist}",
-                song2_popularity="{song2_popularity}",
-                song2_release_date="{song2_release_date}",
-                song2_duration="{song2_duration}",
+            logger.debug("Preparing prompt template")
+            base_template = prompt_registry.get("song_recommendation.txt")
+
+            # Compact the contextual data, it is repeated in every matchup prompt
+            weather_data = compact_context(context.location_weather_analysis)
+            user_context = compact_context(context.user_context)
+            image_analysis = compact_context(context.image_analysis)
+
+            logger.debug("Context data prepared - Weather: %.100s...", weather_data)
+            logger.debug("Image analysis: %.100s...", image_analysis)
+
+            # Fill in the contextual data, the song placeholders stay open for each matchup
+            prompt_template = base_template.partial(
+                weather_data=weather_data,
+                user_context=user_context,
+                image_analysis=image_analysis,
             )
-            print("Prompt template prepared and cached", self.prompt_template)
-            return self.prompt_template
+            logger.debug("Prompt template prepared: %s", prompt_template)
+            return prompt_template
         except Exception as e:
-            print("RITOM SEN ERROR")
-            print(f"Error preparing prompt template: {e}")
+            logger.exception("Error preparing prompt template: %s", e)
+            return None
+
+    async def get_user_id(self, session_id: str) -> Optional[str]:
+        """The Spotify user id of the session, or None when it cannot be looked up"""
+        try:
+            return await spotify_service.get_user_id(session_id)
+        except Exception as e:
+            logger.warning("Could not look up the Spotify user id: %s", e)
             return None
 
     async def get_image_analysis(self, image_data: bytes, session_id: str):
-        print("Getting image analysis")
-        top_20_songs, top_20_artists = await asyncio.gather(
+        """The vision model's analysis of the photo, reused for near-duplicate photos of the same user"""
+        logger.debug("Getting image analysis")
+        # The user's top songs are only needed for the vision prompt, fetch them
+        # while the upload is shrunk and drop them on a cache hit
+        top_task = asyncio.gather(
             spotify_service.get_user_top_tracks(session_id, time_range="long_term", limit=20, album_mode=False),
             spotify_service.get_user_top_artists(session_id, time_range="long_term", limit=20)
         )
-        print("Got Top 20 Songs and Artists")
+        try:
+            prepared_image, user_id = await asyncio.gather(
+                traced("prepare.image_preprocess", prepare_image(image_data)), self.get_user_id(session_id)
+            )
+            # Sessions change at every login, so cache by user where the user is known
+            user_key = user_id or session_id
+            cached_analysis = self.image_analysis_cache.get(user_key, prepared_image.dhash)
+            if cached_analysis is not None:
+                logger.debug("Reusing cached image analysis: %s", cached_analysis)
+                return cached_analysis
+            top_20_songs, top_20_artists = await top_task
+        finally:
+            # Stops the fetch on a cache hit and retrieves its outcome either way
+            top_task.cancel()
+            await asyncio.gather(top_task, return_exceptions=True)
         track_titles_and_artists = [f"{song.title} - {song.artist}" for song in top_20_songs]
         artist_names = [artist.name for artist in top_20_artists]
-        print("Got Track Titles and Artists")
-        self.image_analysis = await self.open_ai_service.analyze_image(image_data, track_titles_and_artists, artist_names)
-        print(f"Image analysis received: {self.image_analysis}")
+        image_analysis = await self.open_ai_service.analyze_image(
+            prepared_image.data, track_titles_and_artists, artist_names, mime_type=prepared_image.mime_type
+        )
+        self.image_analysis_cache.put(user_key, prepared_image.dhash, image_analysis)
+        logger.debug("Image analysis received: %s", image_analysis)
+        return image_analysis
 
     async def get_audio_analysis(self, audio_data: bytes):
         if not audio_data:
-            return
-        print("Getting audio analysis")
-        self.audio_analysis = await self.open_ai_service.analyze_audio(audio_data)
-        print(f"Audio analysis received: {self.audio_analysis}")
+            return {}
+        logger.debug("Getting audio analysis")
+        audio_analysis = await self.open_ai_service.analyze_audio(audio_data)
+        logger.debug("Audio analysis received: %s", audio_analysis)
+        return audio_analysis
 
     async def get_location_weather_analysis(self, location: str):
-        print(f"Getting weather analysis for location: {location}")
-        # Assuming location is in format "latitude,longitude"
-        lat, lon = map(float, location.split(','))
-        self.location_weather_analysis = await self.weather_service.get_current_weather(lat, lon)
-        print(f"Weather analysis received: {self.location_weather_analysis}")
-
-    async def get_user_context(self, session_id: str):
-        print("Getting user context")
+        logger.debug("Getting weather analysis for location: %s", location)
+        coordinates = parse_location(location)
+        if coordinates is None:
+            return {}
+        location_weather_analysis = await self.weather_service.get_current_weather(*coordinates)
+        logger.debug("Weather analysis received: %s", location_weather_analysis)
+        return location_weather_analysis
+
+    async def get_user_context(self, session_id: str) -> Tuple[Any, Dict[str, float]]:
+        """The LLM's summary of the user's listening, and a listening weight per lower-cased artist name"""
+        logger.debug("Getting user context")
         # Fetch all user data in parallel
         (
             top_songs_short,
@@ -125,6 +216,14 @@ class RecommendationService:
         def artist_list_to_str(artist_list):
             return [artist.name for artist in artist_list]
 
+        artist_weights: Dict[str, float] = defaultdict(float)
+        for artist_list in (top_artists_short, top_artists_medium, top_artists_long):
+            for rank, artist in enumerate(artist_list):
+                artist_weights[artist.name.lower()] += 1.0 - rank / (len(artist_list) + 1)
+        for song_list in (top_songs_short, top_songs_medium, top_songs_long, recently_played):
+            for song in song_list:
+                artist_weights[song.artist.split(", ")[0].lower()] += 0.5
+
         user_name = "User"  # Replace with actual user name if available
         user_context = await self.open_ai_service.generate_user_context(
             name=user_name,
@@ -136,79 +235,194 @@ class RecommendationService:
             top_artists_long=artist_list_to_str(top_artists_long),
             recently_played=song_list_to_str(recently_played)
         )
-        self.user_context = user_context
-        print("User context initialized", self.user_context)
+        logger.debug("User context initialized: %s", user_context)
+        return user_context, dict(artist_weights)
 
-    async def prepare(self, image_data: bytes, audio_data: bytes, location: str, session_id: str):
+    async def prepare(self, image_data: bytes, audio_data: bytes, location: str, session_id: str) -> RequestContext:
         """
-        Prepare all analysis data in parallel.
+        Prepare all analysis data in parallel and return it as the request's context.
         """
-        print("Starting parallel data preparation")
+        logger.debug("Starting parallel data preparation")
         # Create tasks for parallel execution
 
         tasks = [
-            self.get_location_weather_analysis(location),
-            self.get_image_analysis(image_data, session_id),
-            self.get_audio_analysis(audio_data),
-            self.get_user_context(session_id)
+            traced("prepare.weather", self.get_location_weather_analysis(location)),
+            traced("prepare.image_analysis", self.get_image_analysis(image_data, session_id)),
+            traced("prepare.audio_analysis", self.get_audio_analysis(audio_data)),
+            traced("prepare.user_context", self.get_user_context(session_id)),
+            traced("prepare.user_id", self.get_user_id(session_id)),
         ]
         
         # Run all tasks concurrently
-        await asyncio.gather(*tasks)
-        print("All analysis tasks completed")
+        weather, image_analysis, audio_analysis, (user_context, artist_weights), user_id = await asyncio.gather(*tasks)
+        logger.info("All analysis tasks completed")
 
+        context = RequestContext(
+            session_id=session_id,
+            user_id=user_id,
+            location_weather_analysis=weather,
+            image_analysis=image_analysis,
+            audio_analysis=audio_analysis,
+            user_context=user_context,
+            artist_weights=artist_weights,
+        )
         # After all analyses are complete, prepare the prompt template
-        self.prepare_prompt_template()
+        context.prompt_template = self.prepare_prompt_template(context)
+        return context
 
-    async def make_candidate_pool(self, session_id: str):
-        print("Creating candidate pool")
+    def create_candidate_pool(self, session_id: str) -> CandidatePool:
+        logger.debug("Creating candidate pool")
         # genres = self.image_analysis.get("genres", [])
         genres = []
-        print(f"Using genres from image analysis: {genres}")
-        candidate_pool = CandidatePool(genres, session_id, spotify_service)
+        logger.debug("Using genres from image analysis: %s", genres)
+        return CandidatePool(genres, session_id, spotify_service)
+
+    async def make_candidate_pool(self, session_id: str):
+        candidate_pool = self.create_candidate_pool(session_id)
         await candidate_pool.add_songs_parallel()
-        print(f"Candidate pool created with {len(candidate_pool.pool)} songs")
+        logger.info("Candidate pool created with %d songs", len(candidate_pool.pool))
         candidate_pool.print_pool()
         
         return candidate_pool.pool
 
-    async def find_recommendations(self, candidate_pool: list[Pool_Song]):
-        print("Finding recommendations")
-        # Use the cached prompt template
-        prompt_template = self.prepare_prompt_template()
-        tourney = Tourney(candidate_pool, prompt_template, num_tournaments=3, use_alternating_services=False)
-        recommendations = await tourney.run_tourney(num_recommendations=5)
-        print(f"Found {len(recommendations)} recommendations")
+    async def _admit_late_songs(
+        self,
+        late_songs: AsyncIterator[Pool_Song],
+        admit: Callable[[Pool_Song], bool],
+        max_admitted: Optional[int] = None,
+    ):
+        """Feed songs that arrive after ranking started into the running ranking engine"""
+        admitted = 0
+        try:
+            async for song in late_songs:
+                if max_admitted is not None and admitted >= max_admitted:
+                    break
+                if admit(song):
+                    admitted += 1
+        finally:
+            await late_songs.aclose()
+            logger.info("Admitted %d late songs into ranking", admitted)
+
+    async def _run_with_late_songs(self, ranking, late_songs, admit, max_admitted=None):
+        """Await a ranking coroutine while admitting late songs into it"""
+        if late_songs is None:
+            return await ranking
+        admit_task = asyncio.create_task(self._admit_late_songs(late_songs, admit, max_admitted))
+        try:
+            return await ranking
+        finally:
+            admit_task.cancel()
+            await asyncio.gather(admit_task, return_exceptions=True)
+
+    async def find_recommendations(
+        self,
+        context: RequestContext,
+        candidate_pool: list[Pool_Song],
+        late_songs: Optional[AsyncIterator[Pool_Song]] = None,
+        max_late_songs: Optional[int] = None,
+        num_tournaments: int = 3,
+        local_scores: Optional[Dict[Pool_Song, float]] = None,
+    ):
+        """
+        Find recommendations using the LLM tournament.
+
+        Args:
+            context: The request context returned by prepare()
+            candidate_pool: Songs available when ranking starts
+            late_songs: Optional stream of songs that are still arriving; they join later rounds
+            max_late_songs: Maximum number of late songs to admit
+            num_tournaments: Number of brackets to average scores over
+            local_scores: Cascade pre-rank scores to blend into the tournament scores
+        """
+        logger.debug("Finding recommendations")
+        # The request's own prompt, which also fingerprints its comparison cache entries
+        prompt_template = context.prompt_template
+        if prompt_template is None:
+            prompt_template = context.prompt_template = self.prepare_prompt_template(context)
+        comparison_cache = self.comparison_cache if settings.COMPARISON_CACHE_ENABLED else None
+        # Ratings from the user's earlier requests seed the brackets
+        ratings = await self.load_ratings(context, candidate_pool)
+        local_judge = self.local_judge(context)
+        if settings.TOURNEY_SELECTION == "tree":
+            tourney = TopKSelector(
+                candidate_pool, prompt_template, use_alternating_services=False,
+                local_judge=local_judge, comparison_cache=comparison_cache, seed_ratings=ratings,
+            )
+        else:
+            tourney = Tourney(
+                candidate_pool, prompt_template, num_tournaments=num_tournaments, use_alternating_services=False,
+                local_judge=local_judge, comparison_cache=comparison_cache, seed_ratings=ratings,
+            )
+        recommendations = await self._run_with_late_songs(
+            tourney.run_tourney(num_recommendations=5), late_songs, tourney.admit, max_late_songs
+        )
+        if local_scores and recommendations:
+            tourney.final_rankings = blend(tourney.final_rankings, local_scores, settings.CASCADE_BLEND_WEIGHT)
+            recommendations = tourney.get_top_recommendations(5)
+        if ratings and recommendations:
+            # Songs that won in earlier requests need not win every round again to surface
+            prior = {song: ratings.get(song, DEFAULT_RATING) for song in tourney.final_rankings}
+            tourney.final_rankings = blend(tourney.final_rankings, prior, settings.RATING_BLEND_WEIGHT)
+            recommendations = tourney.get_top_recommendations(5)
+        await self.save_ratings(context, tourney.comparisons)
+        logger.info("Found %d recommendations", len(recommendations))
         return recommendations
 
-    async def find_recommendations_genetic(self, candidate_pool: list[Pool_Song]):
+    async def find_recommendations_genetic(
+        self,
+        context: RequestContext,
+        candidate_pool: list[Pool_Song],
+        late_songs: Optional[AsyncIterator[Pool_Song]] = None,
+        max_late_songs: Optional[int] = None,
+        generations: int = 12,
+        num_runs: int = 5,
+        local_scores: Optional[Dict[Pool_Song, float]] = None,
+    ):
         """
         Find recommendations using genetic algorithm approach.
         
         Args:
+            context: The request context returned by prepare()
             candidate_pool: List of Pool_Song objects to choose from
+            late_songs: Optional stream of songs that are still arriving; they become available to mutations
+            max_late_songs: Maximum number of late songs to admit
+            generations: Number of generations per run
+            num_runs: Number of independent runs whose winners are counted
+            local_scores: Cascade pre-rank scores to blend into the winners' scores
             
         Returns:
             List of recommended Pool_Song objects
         """
-        print("Finding recommendations using genetic algorithm")
+        logger.debug("Finding recommendations using genetic algorithm")
+
+        # All runs share one list so admitted songs reach every population
+        candidate_pool = list(candidate_pool)
+        seen_songs = set(candidate_pool)
+
+        def admit(song: Pool_Song) -> bool:
+            if song in seen_songs:
+                return False
+            seen_songs.add(song)
+            candidate_pool.append(song)
+            return True
         
         # Initialize genetic algorithm with current context
         base_kwargs = dict(
             candidate_pool=candidate_pool,
             population_size=30,
             mutation_rate=0.15,
-            generations=12,
-            weather_data=self.location_weather_analysis,
-            user_context=self.user_context,
-            image_analysis=self.image_analysis,
+            generations=generations,
+            # Compacted once here instead of in every fitness call
+            weather_data=compact_context(context.location_weather_analysis),
+            user_context=compact_context(context.user_context),
+            image_analysis=compact_context(context.image_analysis),
             use_openai=False,
         )
+        local_judge = self.local_judge(context)
 
-        # Run 5 genetic algorithm instances in parallel and collect the winners
-        num_runs = 5
-        tasks = [GeneticAlgorithm(**base_kwargs).run() for _ in range(num_runs)]
-        winners = await asyncio.gather(*tasks)
+        # Run num_runs genetic algorithm instances in parallel and collect the winners
+        tasks = [GeneticAlgorithm(**base_kwargs, local_judge=local_judge).run() for _ in range(num_runs)]
+        winners = await self._run_with_late_songs(asyncio.gather(*tasks), late_songs, admit, max_late_songs)
         #TODO should have unified cache across algos, then can increase popoulation size
 
         # Count frequency of each winner and calculate percentage scores
@@ -222,7 +436,14 @@ class RecommendationService:
             if song is not None:
                 percentage = (count / total_wins) * 100
                 recommendations.append((song, percentage))
+
+        if local_scores and recommendations:
+            blended = blend(dict(recommendations), local_scores, settings.CASCADE_BLEND_WEIGHT)
+            total = sum(blended.values()) or 1.0
+            recommendations = sorted(
+                ((song, score / total * 100) for song, score in blended.items()), key=lambda item: item[1], reverse=True
+            )
         
-        print(f"Found {len(recommendations)} recommendations using genetic algorithm")
+        logger.info("Found %d recommendations using genetic algorithm", len(recommendations))
         return recommendations
     
@@ -3,22 +3,112 @@ import random
 import asyncio
 import concurrent.futures
 import math
-from typing import List, Dict, Callable, Any, Tuple
+import logging
+from typing import List, Dict, Callable, Any, Optional, Tuple
 from app.models.song import Pool_Song
 from app.services.service_instances import openai_service, gemini_service
+from app.services.llm_routing import route_call
+from app.rec_service.local_judge import LocalJudge
+from app.rec_service.bradley_terry import Ratings, fit_bradley_terry
+from app.rec_service.comparison_cache import ComparisonCache, cache_aware_order, context_fingerprint
+from app.rec_service.rating_store import DEFAULT_RATING
+from app.core.config import settings
+from app.core.metrics import LOCAL_JUDGE_CALLS, TOURNEY_CACHED_MATCHUPS, TOURNEY_EARLY_STOPS
+from app.core.logging_config import sampled
+from app.core.tracing import traced
+from app.core.prompt_registry import PromptTemplate
+
+logger = logging.getLogger(__name__)
 
 #TODO CHECK CODE because I think there are small optimizations that can be made
 
 class Tourney:
-    def __init__(self, pool: List[Pool_Song], prompt_template: str, num_tournaments: int = 3, use_alternating_services: bool = True):
+    def __init__(
+        self,
+        pool: List[Pool_Song],
+        prompt_template: PromptTemplate,
+        num_tournaments: int = 3,
+        use_alternating_services: bool = True,
+        local_judge: Optional[LocalJudge] = None,
+        judge_mode: Optional[str] = None,
+        aggregation: Optional[str] = None,
+        comparison_cache: Optional[ComparisonCache] = None,
+        seed_ratings: Optional[Dict[Pool_Song, float]] = None,
+    ):
         self.pool = pool
         self.song_scores: Dict[Pool_Song, List[float]] = {song: [] for song in pool}
         self.final_rankings: Dict[Pool_Song, float] = {}
         self.prompt_template = prompt_template
         self.num_tournaments = num_tournaments
         self.use_alternating_services = use_alternating_services
-        print(f"Initialized tournament with {len(pool)} songs")
+        # "llm", "local" or "hybrid"; local and hybrid need a local_judge
+        self.local_judge = local_judge
+        self.judge_mode = (judge_mode or settings.JUDGE_MODE) if local_judge is not None else "llm"
+        # Late-arriving songs waiting to join each running bracket, keyed by tourney_id
+        self.pending_songs: Dict[int, List[Pool_Song]] = {}
+        # "rounds" or "bradley_terry" (see _aggregate_bradley_terry)
+        self.aggregation = aggregation or settings.TOURNEY_AGGREGATION
+        # Every (winner, loser) judgement of all brackets
+        self.comparisons: List[Tuple[Pool_Song, Pool_Song]] = []
+        self.ratings: Optional[Ratings] = None
+        self.rating_errors: Dict[Pool_Song, float] = {}
+        self.num_recommendations = 5
+        # Set once the Bradley-Terry top recommendations are settled; brackets then stop
+        self.separated = False
+        # LLM judgements already made under the same prompt context are reused
+        self.comparison_cache = comparison_cache
+        self.context_fingerprint = context_fingerprint(prompt_template) if comparison_cache is not None else ""
+        self.matchups = 0
+        self.cached_matchups = 0
+        # Stored ratings of the user's songs (see rating_store); they seed the brackets
+        self.seed_ratings = seed_ratings
+        # Softmax temperature of get_top_recommendations
+        self.temperature = 1.0 if self.aggregation == "bradley_terry" else 5.0
+        logger.debug("Initialized tournament with %d songs", len(pool))
+
+    def admit(self, song: Pool_Song) -> bool:
+        """
+        Admit a late-arriving song into every bracket that is still running.
+        The song joins each bracket at the lowest level still being filled, so
+        it is credited with the levels it skipped in the same way as a bye.
+        Returns True if the song was admitted.
+        """
+        if song in self.song_scores or not self.pending_songs:
+            return False
+        self.pool.append(song)
+        self.song_scores[song] = []
+        for pending in self.pending_songs.values():
+            pending.append(song)
+        return True
+
+    def _take_pending_songs(
+        self,
+        tourney_id: int,
+        reach: Callable[[Pool_Song, int], None],
+        waiting: Dict[int, Pool_Song],
+        matchups: Dict[asyncio.Task, Tuple[int, Pool_Song, Pool_Song]],
+    ) -> None:
+        """Send songs admitted since the last matchup to the lowest level the bracket still fills"""
+        pending = self.pending_songs.get(tourney_id)
+        if not pending or not (waiting or matchups):
+            return
+        level = min([matchup_level + 1 for matchup_level, _s1, _s2 in matchups.values()] + list(waiting))
+        random.shuffle(pending)
+        for song in pending:
+            reach(song, level)
+        logger.info("Tournament %d Level %d: admitted %d late songs", tourney_id, level, len(pending))
+        pending.clear()
         
+    def _judged_locally(self, song1: Pool_Song, song2: Pool_Song) -> bool:
+        """Whether the local judge decides this matchup instead of an LLM"""
+        if self.judge_mode == "local":
+            LOCAL_JUDGE_CALLS.inc(call="judge", reason="mode")
+            return True
+        if self.judge_mode == "hybrid" and abs(self.local_judge.margin(song1, song2)) >= settings.LOCAL_JUDGE_HYBRID_MARGIN:
+            LOCAL_JUDGE_CALLS.inc(call="judge", reason="confident")
+            return True
+        return False
+
     async def _blackbox_compare(self, song1: Pool_Song, song2: Pool_Song, use_openai: bool) -> Pool_Song:
         """
         Use AI service to compare two songs and return the winner
@@ -27,83 +117,204 @@ class Tourney:
             song2: Second song to compare
             use_openai: True to use OpenAI, False to use Gemini
         """
-        print(f"Comparing songs: {song1.title} vs {song2.title}")
-        service = openai_service if use_openai else gemini_service
-        print(f"Using {'OpenAI' if use_openai else 'Gemini'} service for comparison")
-            
-        result = await service.get_recommendation(song1, song2, self.prompt_template)
+        self.matchups += 1
+        if self._judged_locally(song1, song2):
+            result = await self.local_judge.get_recommendation(song1, song2)
+            return song1 if result == 0 else song2
+
+        if self.comparison_cache is not None:
+            cached = self.comparison_cache.get(self.context_fingerprint, song1, song2)
+            if cached is not None:
+                self.cached_matchups += 1
+                return cached
+
+        answered_by = []
+
+        def judge(provider):
+            answered_by.append(provider)
+            return provider.get_recommendation(song1, song2, self.prompt_template)
+
+        service, backup = (openai_service, gemini_service) if use_openai else (gemini_service, openai_service)
+        # Falls back to the other provider when this one's breaker is open or the call fails,
+        # and hedges slow judgements when LLM_HEDGE_AFTER_S sets a judge threshold
+        result = await route_call(
+            "judge", service, backup, judge,
+            fallback=self.local_judge if settings.LOCAL_JUDGE_FALLBACK else None,
+        )
         winner = song1 if result == 0 else song2
-        print(f"Winner: {winner.title}")
+        # Fallback answers from the local judge are not worth keeping
+        if self.comparison_cache is not None and (self.local_judge is None or self.local_judge not in answered_by):
+            self.comparison_cache.put(self.context_fingerprint, winner, song2 if winner == song1 else song1)
         return winner
     
     async def _run_single_tourney(self, songs: List[Pool_Song], tourney_id: int) -> Dict[Pool_Song, int]:
-        """Run a single tournament and return the placement of each song"""
+        """
+        Run a single tournament and return the placement of each song.
+
+        The bracket runs as a dataflow instead of round by round: each level
+        has one waiting slot, and a song reaching a level (by winning, a bye or
+        late admission) is paired with the song waiting there, starting that
+        matchup at once. Fast branches move up while slow judgements are still
+        pending, so the bracket takes as long as its slowest root-to-leaf path
+        rather than the sum of every round's slowest call. A waiting song gets
+        a bye once no lower-level matchup is left to send it an opponent.
+
+        A song knocked out at level k is placed 2k - 1 and the winner of a
+        K-level bracket 2K + 1, as in the round-by-round bracket.
+        """
         if not songs:
-            print(f"Tournament {tourney_id}: Empty song list provided")
+            logger.warning("Tournament %d: Empty song list provided", tourney_id)
             return {}
-            
-        print(f"Starting tournament {tourney_id} with {len(songs)} songs")
+
+        logger.debug("Starting tournament %d with %d songs", tourney_id, len(songs))
         results = {}
-        remaining_songs = songs.copy()
-        
-        # Track the round number (used for scoring)
-        round_num = 0
-        eliminated_this_round = []
-        
-        while len(remaining_songs) > 1:
-            round_num += 1
-            next_round_songs = []
-            matchups = []
-            
-            # Create matchups for this round
-            for i in range(0, len(remaining_songs), 2):
-                if i + 1 < len(remaining_songs):
-                    matchups.append((remaining_songs[i], remaining_songs[i+1]))
-                else:
-                    # If odd number of songs, one gets a bye to next round
-                    next_round_songs.append(remaining_songs[i])
-                    print(f"Tournament {tourney_id} Round {round_num}: {remaining_songs[i].title} gets a bye")
-            
-            print(f"Tournament {tourney_id} Round {round_num}: {len(matchups)} matchups")
-            
-            # Run matchups concurrently using asyncio
-            if self.use_alternating_services:
-                # Alternate between services for each comparison
-                tasks = [
-                    self._blackbox_compare(s1, s2, (i % 2 == 0)) 
-                    for i, (s1, s2) in enumerate(matchups)
-                ]
-            else:
-                # Use Gemini 
-                tasks = [
-                    self._blackbox_compare(s1, s2, use_openai=False) 
-                    for s1, s2 in matchups
-                ]
-            
-            winners = await asyncio.gather(*tasks)
-            
-            #TODO I think there is a more optimal way to do this
-            for (s1, s2), winner in zip(matchups, winners):
-                next_round_songs.append(winner)
-                loser = s2 if winner == s1 else s1
-                eliminated_this_round.append(loser)
-                print(f"Tournament {tourney_id} Round {round_num}: {winner.title} defeats {loser.title}")
-            
-            # Assign rounds reached to songs eliminated this round
-            for song in eliminated_this_round:
-                results[song] = round_num
-            
-            remaining_songs = next_round_songs
-            eliminated_this_round = []
-            round_num += 1
-        
-        # The last remaining song is the winner - it reached one round further
-        if remaining_songs:
-            results[remaining_songs[0]] = round_num + 1
-            print(f"Tournament {tourney_id} completed. Winner: {remaining_songs[0].title}")
-            
+        # Level -> the song waiting there for an opponent
+        waiting: Dict[int, Pool_Song] = {}
+        # Running matchup -> (level, song1, song2)
+        matchups: Dict[asyncio.Task, Tuple[int, Pool_Song, Pool_Song]] = {}
+        matchups_started = 0
+
+        def reach(song: Pool_Song, level: int) -> None:
+            nonlocal matchups_started
+            opponent = waiting.pop(level, None)
+            if opponent is None:
+                waiting[level] = song
+                return
+            # Alternate between services for each comparison, or use Gemini
+            use_openai = self.use_alternating_services and matchups_started % 2 == 0
+            matchups_started += 1
+            task = asyncio.create_task(self._blackbox_compare(opponent, song, use_openai))
+            matchups[task] = (level, opponent, song)
+
+        def give_byes() -> None:
+            # Only a matchup below a waiting song's level can still send it an opponent
+            while waiting and (matchups or len(waiting) > 1):
+                level = min(waiting)
+                if any(matchup_level < level for matchup_level, _s1, _s2 in matchups.values()):
+                    return
+                song = waiting.pop(level)
+                logger.debug("Tournament %d Level %d: %s gets a bye", tourney_id, level, song.title)
+                reach(song, level + 1)
+
+        for song in songs:
+            reach(song, 1)
+        try:
+            while True:
+                self._take_pending_songs(tourney_id, reach, waiting, matchups)
+                give_byes()
+                if not matchups or self.separated:
+                    break
+                done, _ = await asyncio.wait(matchups, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    level, s1, s2 = matchups.pop(task)
+                    winner = task.result()
+                    loser = s2 if winner == s1 else s1
+                    results[loser] = 2 * level - 1
+                    self._record(winner, loser)
+                    logger.debug(
+                        "Tournament %d Level %d: %s defeats %s", tourney_id, level, winner.title, loser.title,
+                        extra=sampled("tourney.matchup"),
+                    )
+                    reach(winner, level + 1)
+        finally:
+            # Bracket is over (or failed), stop accepting late songs
+            self.pending_songs.pop(tourney_id, None)
+            for task in matchups:
+                task.cancel()
+            await asyncio.gather(*matchups, return_exceptions=True)
+
+        # The last remaining song is the winner - it reached one level further
+        if len(waiting) == 1 and not self.separated:
+            level, champion = waiting.popitem()
+            results[champion] = 2 * level - 1
+            logger.info("Tournament %d completed. Winner: %s", tourney_id, champion.title)
+
         return results
     
+    @property
+    def cached_fraction(self) -> float:
+        """Share of this tournament's matchups answered by the comparison cache"""
+        return self.cached_matchups / self.matchups if self.matchups else 0.0
+
+    def _bracket_order(self, songs: List[Pool_Song]) -> List[Pool_Song]:
+        """Shuffle songs into first-round pairs, seeded by stored ratings or preferring pairs with a cached outcome"""
+        if self.seed_ratings:
+            return self._seeded_order(songs)
+        if self.comparison_cache is not None and settings.COMPARISON_CACHE_AWARE_PAIRING:
+            return cache_aware_order(songs, self.comparison_cache, self.context_fingerprint)
+        songs = list(songs)
+        random.shuffle(songs)
+        return songs
+
+    def _seeded_order(self, songs: List[Pool_Song]) -> List[Pool_Song]:
+        """
+        First-round pairs of strongest against weakest by stored rating, so
+        highly rated songs do not knock each other out early. Ratings get
+        RATING_SEED_NOISE of noise, so each bracket is seeded a little differently.
+        """
+        ranked = sorted(
+            songs,
+            key=lambda song: self.seed_ratings.get(song, DEFAULT_RATING) + random.gauss(0, settings.RATING_SEED_NOISE),
+            reverse=True,
+        )
+        pairs = [(ranked[i], ranked[-1 - i]) for i in range(len(ranked) // 2)]
+        random.shuffle(pairs)
+        order = [song for pair in pairs for song in pair]
+        if len(ranked) % 2:
+            order.append(ranked[len(ranked) // 2])
+        return order
+
+    def _report_cache_use(self) -> None:
+        if self.comparison_cache is None:
+            return
+        TOURNEY_CACHED_MATCHUPS.observe(self.cached_fraction)
+        logger.info(
+            "%d of %d matchups (%.0f%%) answered from the comparison cache",
+            self.cached_matchups, self.matchups, 100 * self.cached_fraction,
+        )
+
+    def _record(self, winner: Pool_Song, loser: Pool_Song) -> None:
+        """Keep a judgement and, every TOURNEY_SEPARATION_CHECK_EVERY of them, check whether the top is settled"""
+        self.comparisons.append((winner, loser))
+        if (
+            self.aggregation != "bradley_terry"
+            or self.separated
+            or len(self.comparisons) % settings.TOURNEY_SEPARATION_CHECK_EVERY
+        ):
+            return
+        ratings, _songs = self._fit_ratings()
+        if ratings.separated(self.num_recommendations, settings.TOURNEY_SEPARATION_Z):
+            self.separated = True
+            TOURNEY_EARLY_STOPS.inc()
+            logger.info(
+                "Top %d separated after %d judgements, stopping the tournament",
+                self.num_recommendations, len(self.comparisons),
+            )
+
+    def _fit_ratings(self) -> Tuple[Ratings, List[Pool_Song]]:
+        """Bradley-Terry ratings of the pool over every judgement so far, and the songs they index"""
+        songs = list(self.song_scores)
+        index = {song: i for i, song in enumerate(songs)}
+        winners = [index[winner] for winner, _loser in self.comparisons]
+        losers = [index[loser] for _winner, loser in self.comparisons]
+        return fit_bradley_terry(len(songs), winners, losers, settings.BRADLEY_TERRY_PRIOR_GAMES), songs
+
+    def _aggregate_bradley_terry(self) -> None:
+        """
+        Rank by Bradley-Terry strength fitted to every judgement instead of by
+        rounds reached, so who beat whom counts, not only how far a song got.
+        Strengths are shifted to start at 0 (the softmax ignores the shift) and
+        their standard errors are kept in rating_errors.
+        """
+        self.ratings, songs = self._fit_ratings()
+        floor = float(self.ratings.strengths.min()) if songs else 0.0
+        for song, strength, error in zip(songs, self.ratings.strengths, self.ratings.std_errors):
+            self.final_rankings[song] = float(strength) - floor
+            self.rating_errors[song] = float(error)
+        logger.debug(
+            "Bradley-Terry fit over %d judgements in %d iterations", self.ratings.comparisons, self.ratings.iterations
+        )
+
     def _calculate_score(self, rounds_reached: int, total_rounds: int) -> float:
         """
         Calculate a score based on how many rounds a song survived
@@ -118,44 +329,49 @@ class Tourney:
     async def run_tourney(self, num_recommendations: int = 5) -> List[Tuple[Pool_Song, float]]:
         """Run tournaments in parallel and calculate the average score for each song"""
         if not self.pool:
-            print("Empty pool provided for tournament")
+            logger.warning("Empty pool provided for tournament")
             return []
             
         tournament_tasks = []
-        total_rounds = math.ceil(math.log2(len(self.pool)))
+        self.num_recommendations = num_recommendations
         number_of_tournaments = self.num_tournaments
-        print(f"Starting {number_of_tournaments} tournaments with {len(self.pool)} songs")
+        logger.info("Starting %d tournaments with %d songs", number_of_tournaments, len(self.pool))
         
         # Launch number_of_tournaments parallel tournaments with randomized song lists
         for i in range(number_of_tournaments):
             # Randomize the song list for this tournament for diff match-ups
-            randomized_songs = self.pool.copy()
-            random.shuffle(randomized_songs)
-            print(f"Tournament {i} starting with seed song: {randomized_songs[0].title} by {randomized_songs[0].artist}")
+            randomized_songs = self._bracket_order(self.pool)
+            self.pending_songs[i] = []
             # Submit the tournament task
-            task = asyncio.create_task(self._run_single_tourney(randomized_songs, i))
+            task = asyncio.create_task(traced("tourney.bracket", self._run_single_tourney(randomized_songs, i), tourney_id=i))
             tournament_tasks.append(task)
         
         # Wait for all tournaments to complete
         tournament_results = await asyncio.gather(*tournament_tasks)
-        print("All tournaments completed, processing results")
-        
-        # Process results from all tournaments
-        for results in tournament_results:
-            # Convert rounds reached to scores and store them
-            for song, rounds_reached in results.items():
-                score = self._calculate_score(rounds_reached, total_rounds)
-                self.song_scores[song].append(score)
+        logger.debug("All tournaments completed, processing results")
+        self._report_cache_use()
+        # Computed after the brackets finish since late songs may have grown the pool
+        total_rounds = math.ceil(math.log2(len(self.pool)))
         
-        # Calculate average scores for each song over tourneys
-        for song, scores in self.song_scores.items():
-            if scores:  # Ensure the song participated in at least one tournament
-                self.final_rankings[song] = sum(scores) / len(scores)
-            else:
-                self.final_rankings[song] = 0
+        if self.aggregation == "bradley_terry":
+            self._aggregate_bradley_terry()
+        else:
+            # Process results from all tournaments
+            for results in tournament_results:
+                # Convert rounds reached to scores and store them
+                for song, rounds_reached in results.items():
+                    score = self._calculate_score(rounds_reached, total_rounds)
+                    self.song_scores[song].append(score)
+
+            # Calculate average scores for each song over tourneys
+            for song, scores in self.song_scores.items():
+                if scores:  # Ensure the song participated in at least one tournament
+                    self.final_rankings[song] = sum(scores) / len(scores)
+                else:
+                    self.final_rankings[song] = 0
         
         output = self.get_top_recommendations(num_recommendations)
-        print(f"Tournament complete. Top {num_recommendations} recommendations generated")
+        logger.info("Tournament complete. Top %d recommendations generated", num_recommendations)
         
         return output
     
@@ -165,7 +381,7 @@ class Tourney:
         Returns a list of tuples (song, probability)
         """
         if not self.final_rankings:
-            print("Attempted to get recommendations before running tournament")
+            logger.error("Attempted to get recommendations before running tournament")
             raise RuntimeError("Must run tournament first")
             
         # Get the top n songs
@@ -174,14 +390,14 @@ class Tourney:
             key=lambda x: x[1],
             reverse=True
         )
-        print(f"Top song ALL SONGS: {top_songs}")
         top_songs = top_songs[:n]
         
         if not top_songs:
-            print("No songs found in final rankings")
+            logger.warning("No songs found in final rankings")
             return []
         
-        print("Top songs by score: " + ", ".join([f"{song.title} ({score:.2f})" for song, score in top_songs]))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Top songs by score: %s", ", ".join(f"{song.title} ({score:.2f})" for song, score in top_songs))
         
         # Apply softmax to convert scores to probabilities
         songs, scores = zip(*top_songs)
@@ -190,7 +406,7 @@ class Tourney:
         #TODO make this a parameter I can change/decide easier
         # Just need a number that makes the "probabilities" sound realistic
         # and not too one sided
-        temperature = 5.0
+        temperature = self.temperature
         
         # Apply softmax function with temperature and numerical stability
         max_score = max(scores)
@@ -199,8 +415,9 @@ class Tourney:
         softmax_probs = [100 * (exp_score / sum_exp_scores) for exp_score in exp_scores]
         
         # Log final probabilities
-        for song, prob in zip(songs, softmax_probs):
-            print(f"Final probability for {song.title}: {prob:.2f}%")
+        if logger.isEnabledFor(logging.DEBUG):
+            for song, prob in zip(songs, softmax_probs):
+                logger.debug("Final probability for %s: %.2f%%", song.title, prob)
         
         # Return songs with their probabilities
         return list(zip(songs, softmax_probs))
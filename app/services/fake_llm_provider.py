@@ -0,0 +1,61 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.services.llm_provider import ImageInput, LLMProvider
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Deterministic provider for tests and runs without API keys. Answers are
+    derived from a hash of the prompt, so the same prompt always gets the same
+    answer, and go through the same prompt building, parsing, timeouts and
+    retries as the real providers.
+    `responses` overrides the response text per call type and `failures` are
+    raised, in order, by the first requests.
+    """
+    name = "fake"
+
+    def __init__(
+        self,
+        responses: Optional[Dict[str, str]] = None,
+        failures: Sequence[BaseException] = (),
+        latency_s: float = 0.0,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.responses = dict(responses or {})
+        self.failures = list(failures)
+        self.latency_s = latency_s
+        # (call, prompt parts) of every request, including failed attempts
+        self.requests: List[Tuple[str, List[str]]] = []
+
+    async def _generate(self, call: str, parts: List[str], image: Optional[ImageInput], max_tokens: int) -> Tuple[str, Any]:
+        self.requests.append((call, list(parts)))
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if self.failures:
+            raise self.failures.pop(0)
+        if call in self.responses:
+            return self.responses[call], None
+        return json.dumps(self._answer(call, "\n".join(parts))), None
+
+    @staticmethod
+    def _answer(call: str, prompt: str) -> dict:
+        digest = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+        if call == "judge":
+            return {"winner": "1" if digest % 2 == 0 else "2", "reason": "Deterministic fake judgement"}
+        if call == "fitness":
+            return {"fitness_score": digest % 101, "reasoning": "Deterministic fake score"}
+        if call == "vision":
+            return {
+                "mood": "calm",
+                "genres": ["indie"],
+                "energy_level": "medium",
+                "musical_characteristics": {"tempo": "moderate", "instrumentation": ["guitar"], "style": "acoustic"},
+            }
+        if call == "user_context":
+            return {"description": "Listens to a bit of everything.", "genres": ["indie", "pop"]}
+        if call == "audio_analysis":
+            return {"text": "fake transcription analysis"}
+        return {}
@@ -1,302 +1,48 @@
-from typing import List, Optional, Dict
-import os
-import json
-from pathlib import Path
+import logging
+from typing import Any, List, Optional, Tuple
+import httpx
 from google import genai
 from google.genai import types
-
-from app.models.song import Pool_Song
 from app.core.config import settings
-import base64
-import io
-
-#TODO Make an virtual class that gemini and open ai inherit from 
-class GeminiService():
-    def __init__(self):
-        print("Initializing GeminiService")
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        self.model = 'gemini-2.5-flash-preview-05-20'
-        self.vision_model = 'gemini-2.5-flash-preview-05-20'
-        self.prompts_dir = Path(__file__).parent.parent / "prompts"
-        
-    def _load_prompt(self, prompt_file: str) -> str:
-        """Load prompt template from file"""
-        print(f"Loading prompt from file: {prompt_file}")
-        with open(self.prompts_dir / prompt_file, "r") as f:
-            return f.read().strip()
-
-    async def analyze_image(self, image_data: bytes, track_titles_and_artists: list[str], artist_names: list[str]) -> dict:
-        """
-        Analyze image using Gemini Vision API
-        """
-        print("Starting image analysis")
-        prompt = self._load_prompt("image_analysis.txt")
-        prompt = prompt.format(top_songs=track_titles_and_artists, top_artists=artist_names)
-        
-        # Encode image data as base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        print("Image encoded to base64")
-        print(prompt)
+from app.core.http_transport import http_transport
+from app.services.llm_provider import ImageInput, LLMProvider
 
-        response = await self.client.models.generate_content([
-            prompt,
-            """ Please provide your analysis in JSON format with the following structure:
-            {
-                "mood": "description of mood",
-                "genres": ["list of genres"], // Consider niche genres as well as well known ones
-                "energy_level": "low/medium/high",
-                "musical_characteristics": {
-                    "tempo": "suggested_tempo",
-                    "instrumentation": ["list of instruments"],
-                    "style": "musical_style"
-                }
-            }
-
-            Focus on how these visual elements translate into specific musical characteristics and provide concrete musical suggestions. """,
-            {"mime_type": "image/jpeg", "data": image_data}],
-            model=self.vision_model,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False,
-                    thinkingBudget=0
-                )
-            )
-        )
-        
-        print("Received response from Gemini Vision API")
-        
-        try:
-            analysis = json.loads(response.text)
-            print(f"Successfully parsed image analysis: {analysis}")
-            return {
-                "mood": analysis.get("mood", "neutral"),
-                "genres": analysis.get("genres", []),
-                "energy_level": analysis.get("energy_level", "medium"),
-                "musical_characteristics": analysis.get("musical_characteristics", {})
-            }
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse image analysis JSON: {e}")
-            # Fallback to simple parsing if JSON parsing fails
-            content = response.text
-            print(f"Using fallback parsing for content: {content}")
-            return {
-                "mood": "happy" if "happy" in content.lower() else "sad",
-                "genre": "rock" if "rock" in content.lower() else "pop",
-                "energy_level": "medium",
-                "musical_characteristics": {}
-            }
-    #TODO Not finished
-    async def analyze_audio(self, audio_data: bytes) -> dict:
-        """
-        Analyze audio using Gemini API
-        Note: Since Gemini doesn't have direct audio analysis, we'll use text analysis
-        """
-        print("Starting audio analysis")
-        prompt = self._load_prompt("audio_analysis.txt")
-        
-        # Create a temporary file-like object from bytes
-        audio_file = io.BytesIO(audio_data)
-        audio_file.name = "audio.mp3"  # Add a filename
-        print("Created audio file object")
-        
-        # Since Gemini doesn't have direct audio analysis, we'll need to convert audio to text first
-        # This is a placeholder - you'll need to implement audio transcription separately
-        transcription = "Placeholder for audio transcription"
-        print(f"Audio transcription completed: {transcription[:100]}...")
-        
-        # Then analyze the transcription
-        print("Starting transcription analysis")
-        response = await self.client.aio.models.generate_content(
-            model=self.model,
-            contents=[
-                f"{prompt}\n\nTranscription: {transcription}"
-            ],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False, thinkingBudget=0
-                )
-            )
-        )
+logger = logging.getLogger(__name__)
 
-        print("Received response from Gemini for audio analysis")
-        
-        try:
-            analysis = json.loads(response.text)
-            print(f"Successfully parsed audio analysis: {analysis}")
-            return {
-                "text": analysis.get("text", ""),
-            }
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse audio analysis JSON: {e}")
-            # Fallback to simple parsing if JSON parsing fails
-            content = response.text
-            print(f"Using fallback parsing for content: {content}")
-            return {
-                "text": "text" if "text" in content.lower() else "text",
-            }
-    
-    async def get_recommendation(
-        self,
-        song_1: Pool_Song,
-        song_2: Pool_Song,
-        prompt_template: str,
-    ) -> int:
-        """
-        Get song recommendations based on analyzed features
-        """
-        print("Starting song recommendation analysis")
-        # print(f"Comparing songs: {song_1.title} vs {song_2.title}")
-        
-        # Format the prompt with song details
-        try:
-            prompt = prompt_template.format(
-                song1_title=song_1.title,
-                song1_artist=song_1.artist,
-                song1_popularity=song_1.popularity_score,
-                song1_duration=song_1.duration_ms,
-                song1_release_date=song_1.release_date,
-                song2_title=song_2.title,
-                song2_artist=song_2.artist,
-                song2_popularity=song_2.popularity_score,
-                song2_duration=song_2.duration_ms,
-                song2_release_date=song_2.release_date,
-            )
-            print("Prompt formatted with song details")
-        except Exception as e:
-            print(f"Error formatting prompt: {e}")
-            return 0
-        
-        response = await self.client.aio.models.generate_content(
-            model=self.model,
-            contents=[
-                prompt,
-                """ Provide your response in JSON with the following structure: 
-                { 
-                    "song_1_analysis": "One sentence analysis of song 1",
-                    "song_2_analysis": "One sentence analysis of song 2",
-                    "winner": "1" or "2",
-                    "reason": "One sentence explanation of why the winning song is better"
-                } """
-            ],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False, thinkingBudget=0
-                )
-            )
-        )
-        
-        print("Received response from Gemini for song recommendation")
-        print(f"GEMINI Raw response content for {song_1.title} vs {song_2.title}: {response.text}")
-        
-        try:
-            analysis = json.loads(response.text)
-            print(f"Successfully parsed recommendation analysis: {analysis}")
-            # Extract the final recommendation from the comparison
-            winner = analysis.get("winner", "")
-            print(f"Winner from analysis: {winner}")
 
-            return 0 if "1" in winner else 1
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse recommendation JSON: {e}")
-            print(f"Raw content that failed to parse: {response.text}")
-            # Fallback to simple parsing if JSON parsing fails
-            recommendation = response.text.strip()
-            print(f"Using fallback parsing for content: {recommendation}")
-            return 0 if "1" in recommendation.lower() else 1
+class GeminiService(LLMProvider):
+    name = "gemini"
+    # google-genai raises httpx errors for dropped connections; HTTP errors are retried by status code
+    retryable_errors = (httpx.TransportError,)
 
-    async def generate_user_context(
-        self,
-        name: str,
-        top_songs_short: list,
-        top_songs_medium: list,
-        top_songs_long: list,
-        top_artists_short: list,
-        top_artists_medium: list,
-        top_artists_long: list,
-        recently_played: list
-    ) -> dict:
-        """
-        Generate a user context summary using the LLM and the user_context prompt.
-        """
-        prompt = self._load_prompt("user_context.txt")
-        # Format the prompt with user data
-        prompt = prompt.format(
-            top_songs_short=top_songs_short,
-            top_songs_medium=top_songs_medium,
-            top_songs_long=top_songs_long,
-            top_artists_short=top_artists_short,
-            top_artists_medium=top_artists_medium,
-            top_artists_long=top_artists_long,
-            recently_played=recently_played
+    def __init__(self):
+        super().__init__()
+        logger.debug("Initializing GeminiService")
+        # A custom transport also keeps google-genai off its aiohttp path, which opens a session per call
+        self.client = genai.Client(
+            api_key=settings.GEMINI_API_KEY,
+            http_options=types.HttpOptions(async_client_args={
+                "transport": http_transport.httpx_transport("gemini", settings.HTTP_LLM_POOL_SIZE),
+            }),
         )
-        print("Prompt for user context", prompt)
-        response = await self.client.aio.models.generate_content(
-            model=self.model,
-            contents=[
-            prompt,
-            """
-            Respond ONLY with a valid JSON object in the following format:
-            {
-                "description": "<2-3 sentence summary of their music tastes and tendencies>",
-                "genres": ["<genre1>", "<genre2>", ...],
-            }"""
-            ],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False, thinkingBudget=0
-                )
+        http_transport.add_warm_url("gemini", "httpx", "https://generativelanguage.googleapis.com/")
+        self.model = 'gemini-2.5-flash-preview-05-20'
+        self.vision_model = 'gemini-2.5-flash-preview-05-20'
+        self.generation_config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            thinking_config=types.ThinkingConfig(
+                include_thoughts=False, thinkingBudget=0
             )
         )
-        try:
-            user_context = json.loads(response.text)
-            return user_context
-        except Exception as e:
-            print(f"Failed to parse user context JSON: {e}")
-            print(f"Raw content: {response.text}")
-            return {}
 
-    async def generate_fitness_scores(self, song: Pool_Song, weather_data: dict, user_context: dict, image_analysis: dict):
-        prompt = self._load_prompt("fit_func.txt")
-        prompt = prompt.format(
-            song_title=song.title,
-            song_artist=song.artist,
-            song_popularity=song.popularity_score,
-            song_duration=song.duration_ms,
-            song_release_date=song.release_date,
-            weather_data=weather_data,
-            user_context=user_context,
-            image_analysis=image_analysis
-        )
+    async def _generate(self, call: str, parts: List[str], image: Optional[ImageInput], max_tokens: int) -> Tuple[str, Any]:
+        contents: List[Any] = list(parts)
+        if image is not None:
+            contents.append(types.Part.from_bytes(data=image.data, mime_type=image.mime_type))
+        # Every call, vision included, goes through the async client
         response = await self.client.aio.models.generate_content(
-            model=self.model,
-            contents=[
-            prompt,
-            """
-            Provide your response in JSON with the following structure:
-            {
-                "contextual_relevance_score": <0-100>,
-                "musical_quality_score": <0-100>,
-                "fitness_score": <0-100>,
-                "reasoning": "<1 sentence summary on why the scores were assigned>"
-            }
-            """
-            ],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False, thinkingBudget=0
-                )
-            )
+            model=self.vision_model if image is not None else self.model,
+            contents=contents,
+            config=self.generation_config
         )
-        try:
-            json_data = json.loads(response.text)
-            fitness_score = json_data.get("fitness_score", 0)
-            return fitness_score
-        except Exception as e:
-            print(f"Failed to parse fitness scores JSON: {e}")
-            print(f"Raw content: {response.text}")
-            return 0 
\ No newline at end of file
+        return response.text, response
@@ -2,6 +2,7 @@ import asyncio
 import lyricsgenius
 from typing import Optional, Dict, Any
 from ..core.config import settings
+from ..core.http_transport import http_transport
 
 class GeniusService:
     def __init__(self):
@@ -11,6 +12,10 @@ class GeniusService:
         self.genius.remove_section_headers = False
         self.genius.skip_non_songs = True
         self.genius.timeout = 0.5
+        # Swap lyricsgenius' own session for the pooled one, keeping its headers
+        session = http_transport.requests_session("genius")
+        session.headers.update(self.genius._session.headers)
+        self.genius._session = session
 
     async def search_song(self, title: str, artist: str) -> Optional[Dict[str, Any]]:
         """
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_random_exponential
+from app.core.config import settings
+from app.core.metrics import EXTERNAL_CALL_RETRIES, track_call, record_llm_usage
+from app.core.prompt_compaction import compact_context, record_prompt_tokens
+from app.core.prompt_registry import PromptTemplate, prompt_registry
+from app.models.song import Pool_Song
+from app.utils.image_processing import is_heic, prepare_image
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+IMAGE_ANALYSIS_FORMAT = """ Please provide your analysis in JSON format with the following structure:
+{
+    "mood": "description of mood",
+    "genres": ["list of genres"], // Consider niche genres as well as well known ones
+    "energy_level": "low/medium/high",
+    "musical_characteristics": {
+        "tempo": "suggested_tempo",
+        "instrumentation": ["list of instruments"],
+        "style": "musical_style"
+    }
+}
+
+Focus on how these visual elements translate into specific musical characteristics and provide concrete musical suggestions. """
+
+JUDGE_FORMAT = """ Provide your response in JSON with the following structure:
+{
+    "song_1_analysis": "One sentence analysis of song 1",
+    "song_2_analysis": "One sentence analysis of song 2",
+    "winner": "1" or "2",
+    "reason": "One sentence explanation of why the winning song is better"
+} """
+
+USER_CONTEXT_FORMAT = """
+Respond ONLY with a valid JSON object in the following format:
+{
+    "description": "<2-3 sentence summary of their music tastes and tendencies>",
+    "genres": ["<genre1>", "<genre2>", ...],
+}"""
+
+FITNESS_FORMAT = """
+Provide your response in JSON with the following structure:
+{
+    "contextual_relevance_score": <0-100>,
+    "musical_quality_score": <0-100>,
+    "fitness_score": <0-100>,
+    "reasoning": "<1 sentence summary on why the scores were assigned>"
+}
+"""
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class ImageInput:
+    data: bytes
+    mime_type: str
+
+
+def parse_timeouts(value: str) -> Dict[str, float]:
+    """Parse "judge=10,vision=30" into per-call timeouts in seconds"""
+    timeouts = {}
+    for item in value.split(","):
+        if "=" in item:
+            call, seconds = item.split("=", 1)
+            timeouts[call.strip()] = float(seconds)
+    return timeouts
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, dropped connections and HTTP 408/429/5xx across the openai and google-genai error types"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    for attribute in ("status_code", "http_status", "status", "code"):
+        if getattr(error, attribute, None) in RETRYABLE_STATUSES:
+            return True
+    return False
+
+
+def parse_json_object(text: Optional[str]) -> Optional[dict]:
+    """The JSON object in a model response, or None when the response is not one"""
+    try:
+        value = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+class LLMProvider(ABC):
+    """
+    Prompt building, response parsing, timeouts and retries shared by every LLM
+    provider. A provider only implements _generate (one request to its API) and,
+    if it can, _transcribe.
+
+    Every attempt runs under the timeout of its call type and is tracked as one
+    external call; timeouts, 429s and 5xx are retried with jittered exponential
+    backoff, so a hung or throttled call no longer stalls a tournament round.
+    """
+    name = ""
+    # Provider-specific exception types that are always worth retrying
+    retryable_errors: Tuple[type, ...] = ()
+
+    def __init__(
+        self,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_attempts: int = settings.LLM_MAX_ATTEMPTS,
+        retry_base_wait_s: float = settings.LLM_RETRY_BASE_WAIT_S,
+        retry_max_wait_s: float = settings.LLM_RETRY_MAX_WAIT_S,
+    ):
+        self.timeouts = {**parse_timeouts(settings.LLM_CALL_TIMEOUTS_S), **(timeouts or {})}
+        self.max_attempts = max_attempts
+        self.retry_base_wait_s = retry_base_wait_s
+        self.retry_max_wait_s = retry_max_wait_s
+
+    @abstractmethod
+    async def _generate(self, call: str, parts: List[str], image: Optional[ImageInput], max_tokens: int) -> Tuple[str, Any]:
+        """Send one JSON-mode request; returns the response text and the raw response (for token usage)"""
+
+    async def _transcribe(self, audio_data: bytes) -> str:
+        # Providers without speech-to-text analyse a placeholder transcription
+        return "Placeholder for audio transcription"
+
+    def _load_prompt(self, prompt_file: str) -> PromptTemplate:
+        """Get a prompt template from the registry loaded at startup"""
+        return prompt_registry.get(prompt_file)
+
+    def timeout_for(self, call: str) -> float:
+        return self.timeouts.get(call, settings.LLM_DEFAULT_TIMEOUT_S)
+
+    def _should_retry(self, error: BaseException) -> bool:
+        return isinstance(error, self.retryable_errors) or is_retryable(error)
+
+    async def _with_retries(self, call: str, request: Callable[[], Awaitable[T]]) -> T:
+        """Run request() with the call's timeout, retrying transient failures"""
+        timeout_s = self.timeout_for(call)
+
+        def before_sleep(state: RetryCallState) -> None:
+            EXTERNAL_CALL_RETRIES.inc(service=self.name, call=call)
+            logger.warning(
+                "%s %s attempt %d failed (%r), retrying in %.2fs",
+                self.name, call, state.attempt_number, state.outcome.exception(), state.next_action.sleep,
+            )
+
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(multiplier=self.retry_base_wait_s, max=self.retry_max_wait_s),
+            retry=retry_if_exception(self._should_retry),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                with track_call(self.name, call):
+                    result = await asyncio.wait_for(request(), timeout_s)
+        return result
+
+    async def _complete(self, call: str, parts: List[str], image: Optional[ImageInput] = None, max_tokens: int = 1000) -> str:
+        """One JSON-mode completion with token accounting, timeout and retries"""
+        record_prompt_tokens(self.name, call, *parts)
+        text, response = await self._with_retries(call, lambda: self._generate(call, parts, image, max_tokens))
+        record_llm_usage(self.name, call, response)
+        return text or ""
+
+    async def analyze_image(self, image_data: bytes, track_titles_and_artists: list[str], artist_names: list[str], mime_type: str = "image/jpeg") -> dict:
+        """
+        Analyze an image with the provider's vision model.
+        image_data is expected to be preprocessed (see app.utils.image_processing);
+        raw HEIC uploads are still converted here.
+        """
+        logger.debug("Starting image analysis")
+        prompt = self._load_prompt("image_analysis.txt")
+        prompt = prompt.format(top_songs=track_titles_and_artists, top_artists=artist_names)
+
+        if is_heic(image_data):
+            logger.debug("Converting HEIC image to JPEG")
+            prepared = await prepare_image(image_data)
+            image_data, mime_type = prepared.data, prepared.mime_type
+
+        logger.debug("Image analysis prompt: %s", prompt)
+        content = await self._complete("vision", [prompt, IMAGE_ANALYSIS_FORMAT], ImageInput(image_data, mime_type))
+        logger.debug("Received image analysis from %s", self.name)
+
+        analysis = parse_json_object(content)
+        if analysis is None:
+            logger.warning("Failed to parse image analysis JSON")
+            # Fallback to simple parsing if JSON parsing fails
+            logger.debug("Using fallback parsing for content: %s", content)
+            return {
+                "mood": "happy" if "happy" in content.lower() else "sad",
+                "genre": "rock" if "rock" in content.lower() else "pop",
+                "energy_level": "medium",
+                "musical_characteristics": {}
+            }
+        logger.debug("Successfully parsed image analysis: %s", analysis)
+        return {
+            "mood": analysis.get("mood", "neutral"),
+            "genres": analysis.get("genres", []),
+            "energy_level": analysis.get("energy_level", "medium"),
+            "musical_characteristics": analysis.get("musical_characteristics", {})
+        }
+
+    #TODO Not finished
+    async def analyze_audio(self, audio_data: bytes) -> dict:
+        """
+        Transcribe audio and analyse the transcription
+        """
+        logger.debug("Starting audio analysis")
+        prompt = self._load_prompt("audio_analysis.txt").format()
+        transcription = await self._transcribe(audio_data)
+        logger.debug("Audio transcription completed: %.100s...", transcription)
+
+        content = await self._complete("audio_analysis", [f"{prompt}\n\nTranscription: {transcription}"])
+        analysis = parse_json_object(content)
+        if analysis is None:
+            logger.warning("Failed to parse audio analysis JSON")
+            logger.debug("Using fallback parsing for content: %s", content)
+            return {"text": "text"}
+        logger.debug("Successfully parsed audio analysis: %s", analysis)
+        return {"text": analysis.get("text", "")}
+
+    async def get_recommendation(
+        self,
+        song_1: Pool_Song,
+        song_2: Pool_Song,
+        prompt_template: PromptTemplate,
+    ) -> int:
+        """
+        Judge which of two songs fits the request better: 0 for song_1, 1 for song_2
+        """
+        try:
+            prompt = prompt_template.format(
+                song1_title=song_1.title,
+                song1_artist=song_1.artist,
+                song1_popularity=song_1.popularity_score,
+                song1_duration=song_1.duration_ms,
+                song1_release_date=song_1.release_date,
+                song2_title=song_2.title,
+                song2_artist=song_2.artist,
+                song2_popularity=song_2.popularity_score,
+                song2_duration=song_2.duration_ms,
+                song2_release_date=song_2.release_date,
+            )
+        except Exception as e:
+            logger.error("Error formatting prompt: %s", e)
+            return 0
+
+        content = await self._complete("judge", [prompt, JUDGE_FORMAT])
+        logger.debug("%s raw response content for %s vs %s: %s", self.name, song_1.title, song_2.title, content)
+
+        analysis = parse_json_object(content)
+        if analysis is None:
+            logger.warning("Failed to parse recommendation JSON")
+            # Fallback to simple parsing if JSON parsing fails
+            return 0 if "1" in content.strip().lower() else 1
+        logger.debug("Successfully parsed recommendation analysis: %s", analysis)
+        winner = str(analysis.get("winner", ""))
+        return 0 if "1" in winner else 1
+
+    async def generate_user_context(
+        self,
+        name: str,
+        top_songs_short: list,
+        top_songs_medium: list,
+        top_songs_long: list,
+        top_artists_short: list,
+        top_artists_medium: list,
+        top_artists_long: list,
+        recently_played: list
+    ) -> dict:
+        """
+        Generate a user context summary using the LLM and the user_context prompt.
+        """
+        prompt = self._load_prompt("user_context.txt")
+        prompt = prompt.format(
+            top_songs_short=top_songs_short,
+            top_songs_medium=top_songs_medium,
+            top_songs_long=top_songs_long,
+            top_artists_short=top_artists_short,
+            top_artists_medium=top_artists_medium,
+            top_artists_long=top_artists_long,
+            recently_played=recently_played
+        )
+        logger.debug("Prompt for user context: %s", prompt)
+        content = await self._complete("user_context", [prompt, USER_CONTEXT_FORMAT], max_tokens=500)
+        user_context = parse_json_object(content)
+        if user_context is None:
+            logger.warning("Failed to parse user context JSON")
+            logger.debug("Raw content: %s", content)
+            return {}
+        return user_context
+
+    async def generate_fitness_scores(self, song: Pool_Song, weather_data: dict, user_context: dict, image_analysis: dict):
+        prompt = self._load_prompt("fit_func.txt")
+        prompt = prompt.format(
+            song_title=song.title,
+            song_artist=song.artist,
+            song_popularity=song.popularity_score,
+            song_duration=song.duration_ms,
+            song_release_date=song.release_date,
+            weather_data=compact_context(weather_data),
+            user_context=compact_context(user_context),
+            image_analysis=compact_context(image_analysis)
+        )
+        content = await self._complete("fitness", [prompt, FITNESS_FORMAT])
+        json_data = parse_json_object(content)
+        if json_data is None:
+            logger.warning("Failed to parse fitness scores JSON")
+            logger.debug("Raw content: %s", content)
+            return 0
+        return json_data.get("fitness_score", 0)
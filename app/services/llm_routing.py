@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from app.core.config import settings
+from app.core.metrics import LLM_HEDGES, LLM_HEDGE_WINS, LLM_REROUTES, LOCAL_JUDGE_CALLS
+from app.services.llm_provider import parse_timeouts
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_THRESHOLDS = parse_timeouts(settings.LLM_HEDGE_AFTER_S)
+SLOW_CALL_THRESHOLDS = parse_timeouts(settings.LLM_BREAKER_SLOW_CALL_S)
+
+
+def provider_name(provider: Any) -> str:
+    return getattr(provider, "name", None) or type(provider).__name__
+
+
+def _breaker(provider: Any, call: str) -> Optional[CircuitBreaker]:
+    if not settings.LLM_BREAKER_ENABLED:
+        return None
+    return get_breaker(provider_name(provider), call, SLOW_CALL_THRESHOLDS.get(call))
+
+
+def _allow(provider: Any, call: str) -> bool:
+    breaker = _breaker(provider, call)
+    return breaker is None or breaker.allow()
+
+
+async def _guarded(call: str, provider: Any, request: Callable[[Any], Awaitable[T]]) -> T:
+    """Run request(provider) and record its outcome and latency in the provider's breaker"""
+    breaker = _breaker(provider, call)
+    start = time.perf_counter()
+    try:
+        result = await request(provider)
+    except asyncio.CancelledError:
+        if breaker is not None:
+            breaker.release()
+        raise
+    except Exception:
+        if breaker is not None:
+            breaker.record(False, time.perf_counter() - start)
+        raise
+    if breaker is not None:
+        breaker.record(True, time.perf_counter() - start)
+    return result
+
+
+async def route_call(
+    call: str,
+    primary: Any,
+    backup: Optional[Any],
+    request: Callable[[Any], Awaitable[T]],
+    hedge_after_s: Optional[float] = None,
+    fallback: Optional[Any] = None,
+) -> T:
+    """
+    Run request(primary) with backup, the other provider, as a fallback:
+    - a provider whose circuit breaker is open is skipped, and CircuitOpenError
+      is raised at once when both are open
+    - a failed call is sent to the backup
+    - with a hedge threshold for the call type (LLM_HEDGE_AFTER_S), a call still
+      pending after it is also sent to the backup; the first successful answer
+      wins and the other request is cancelled
+    When both providers fail or are open, request(fallback) answers instead if
+    a fallback (the local judge) is given.
+    """
+    try:
+        return await _route(call, primary, backup, request, hedge_after_s)
+    except Exception as e:
+        if fallback is None:
+            raise
+        reason = "breaker_open" if isinstance(e, CircuitOpenError) else "error"
+        logger.warning("No LLM provider answered the %s call (%r), using %s", call, e, provider_name(fallback))
+        LOCAL_JUDGE_CALLS.inc(call=call, reason=reason)
+        return await request(fallback)
+
+
+async def _route(
+    call: str,
+    primary: Any,
+    backup: Optional[Any],
+    request: Callable[[Any], Awaitable[T]],
+    hedge_after_s: Optional[float],
+) -> T:
+    if backup is primary:
+        backup = None
+    if not _allow(primary, call):
+        if backup is None or not _allow(backup, call):
+            retry_after_s = _breaker(primary, call).retry_after_s()
+            raise CircuitOpenError(f"No LLM provider is available for {call} calls", retry_after_s)
+        logger.debug("Breaker for %s %s calls is open, using %s", provider_name(primary), call, provider_name(backup))
+        LLM_REROUTES.inc(call=call, provider=provider_name(primary))
+        primary, backup = backup, None
+    if backup is None:
+        return await _guarded(call, primary, request)
+
+    if hedge_after_s is None:
+        hedge_after_s = HEDGE_THRESHOLDS.get(call)
+    primary_task = asyncio.create_task(_guarded(call, primary, request))
+    roles = {primary_task: "primary"}
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=hedge_after_s)
+        if done and primary_task.exception() is None:
+            return primary_task.result()
+        if not _allow(backup, call):
+            return await primary_task
+
+        hedged = not done
+        if hedged:
+            logger.debug("Hedging %s call from %s to %s", call, provider_name(primary), provider_name(backup))
+            LLM_HEDGES.inc(call=call, provider=provider_name(backup))
+        else:
+            logger.debug("%s %s call failed, retrying on %s", provider_name(primary), call, provider_name(backup))
+            LLM_REROUTES.inc(call=call, provider=provider_name(primary))
+        roles[asyncio.create_task(_guarded(call, backup, request))] = "hedge"
+        pending = set(roles)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if hedged:
+                        LLM_HEDGE_WINS.inc(call=call, winner=roles[task])
+                    return task.result()
+        # Both failed: report the primary provider's error
+        raise primary_task.exception()
+    finally:
+        losers = [task for task in roles if not task.done()]
+        for task in losers:
+            task.cancel()
+        await asyncio.gather(*losers, return_exceptions=True)
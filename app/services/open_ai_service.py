@@ -1,350 +1,57 @@
-import asyncio
-from typing import List, Optional, Dict
-import os
-import json
-from pathlib import Path
-import aiohttp
-from openai import AsyncOpenAI
-from app.models.song import Pool_Song
-from app.core.config import settings
 import base64
 import io
-from PIL import Image
-import pillow_heif
-import magic  # Add this import for better file type detection
+import logging
+from typing import Any, List, Optional, Tuple
+import openai
+from openai import AsyncOpenAI
+from app.core.config import settings
+from app.core.http_transport import http_transport
+from app.services.llm_provider import ImageInput, LLMProvider
 
-#TODO Make an virtual class that gemini and open ai inherit from 
-class OpenAIService():
-    def __init__(self):
-        print("Initializing OpenAIService")
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = "gpt-4.1-nano"  # Using the fastest advanced model
-        self.prompts_dir = Path(__file__).parent.parent / "prompts"
-        
-    def _is_heic(self, image_data: bytes) -> bool:
-        """Check if the image data is in HEIC format using magic numbers"""
-        try:
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_buffer(image_data)
-            return file_type in ['image/heic', 'image/heif']
-        except Exception as e:
-            print(f"Error detecting HEIC format: {e}")
-            # Fallback to checking magic numbers
-            return image_data.startswith(b'\x00\x00\x00\x20\x66\x74\x79\x70\x68\x65\x69\x63') or \
-                   image_data.startswith(b'\x00\x00\x00\x18\x66\x74\x79\x70\x68\x65\x69\x63')
+logger = logging.getLogger(__name__)
 
-    def _convert_heic_to_jpeg(self, image_data: bytes) -> bytes:
-        """Convert HEIC image data to JPEG format with proper error handling"""
-        try:
-            # Read HEIC file
-            heif_file = pillow_heif.read_heif(image_data)
-            
-            # Convert to PIL Image
-            image = Image.frombytes(
-                heif_file.mode, 
-                heif_file.size, 
-                heif_file.data,
-                "raw",
-            )
-            
-            # Convert to RGB if needed (handles RGBA and other color spaces)
-            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Save as JPEG with quality settings
-            jpeg_buffer = io.BytesIO()
-            image.save(jpeg_buffer, format="JPEG", quality=95, optimize=True)
-            return jpeg_buffer.getvalue()
-            
-        except Exception as e:
-            print(f"Error converting HEIC to JPEG: {e}")
-            raise ValueError(f"Failed to convert HEIC image: {str(e)}")
 
-    def _load_prompt(self, prompt_file: str) -> str:
-        """Load prompt template from file"""
-        print(f"Loading prompt from file: {prompt_file}")
-        with open(self.prompts_dir / prompt_file, "r") as f:
-            return f.read().strip()
+class OpenAIService(LLMProvider):
+    name = "openai"
+    # APITimeoutError is a subclass; HTTP errors are retried by status code
+    retryable_errors = (openai.APIConnectionError,)
 
-    async def analyze_image(self, image_data: bytes, track_titles_and_artists: list[str], artist_names: list[str]) -> dict:
-        """
-        Analyze image using OpenAI Vision API
-        """
-        print("Starting image analysis")
-        prompt = self._load_prompt("image_analysis.txt")
-        prompt = prompt.format(top_songs=track_titles_and_artists, top_artists=artist_names)
-        
-        # Check if image is HEIC and convert if needed
-        if self._is_heic(image_data):
-            print("Converting HEIC image to JPEG")
-            image_data = await asyncio.to_thread(self._convert_heic_to_jpeg, image_data)
-        
-        # Encode image data as base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        print("Image encoded to base64")
-        print(prompt)
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "text", "text": """ Please provide your analysis in JSON format with the following structure:
-                        {
-                            "mood": "description of mood",
-                            "genres": ["list of genres"], // Consider niche genres as well as well known ones
-                            "energy_level": "low/medium/high",
-                            "musical_characteristics": {
-                                "tempo": "suggested_tempo",
-                                "instrumentation": ["list of instruments"],
-                                "style": "musical_style"
-                            }
-                        }
-
-                            Focus on how these visual elements translate into specific musical characteristics and provide concrete musical suggestions. """},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            response_format={ "type": "json_object" },
-            max_tokens=1000
-        )
-        print("Received response from OpenAI Vision API")
-        
-        try:
-            analysis = json.loads(response.choices[0].message.content)
-            print(f"Successfully parsed image analysis: {analysis}")
-            return {
-                "mood": analysis.get("mood", "neutral"),
-                "genres": analysis.get("genres", []),
-                "energy_level": analysis.get("energy_level", "medium"),
-                "musical_characteristics": analysis.get("musical_characteristics", {})
-            }
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse image analysis JSON: {e}")
-            # Fallback to simple parsing if JSON parsing fails
-            content = response.choices[0].message.content
-            print(f"Using fallback parsing for content: {content}")
-            return {
-                "mood": "happy" if "happy" in content.lower() else "sad",
-                "genre": "rock" if "rock" in content.lower() else "pop",
-                "energy_level": "medium",
-                "musical_characteristics": {}
-            }
-    #TODO Not finished
-    async def analyze_audio(self, audio_data: bytes) -> dict:
-        """
-        Analyze audio using OpenAI Whisper API
-        """
-        print("Starting audio analysis")
-        prompt = self._load_prompt("audio_analysis.txt")
-        
-        # Create a temporary file-like object from bytes
-        audio_file = io.BytesIO(audio_data)
-        audio_file.name = "audio.mp3"  # Add a filename
-        print("Created audio file object")
-        
-        # First transcribe the audio
-        print("Starting audio transcription")
-        transcription = await self.client.audio.transcriptions.create(
-            file=audio_file,
-            model="whisper-1"
-        )
-        print(f"Audio transcription completed: {transcription.text[:100]}...")
-        
-        # Then analyze the transcription
-        print("Starting transcription analysis")
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"{prompt}\n\nTranscription: {transcription.text}"
-                }
-            ],
-            response_format={ "type": "json_object" },
-            max_tokens=1000
-        )
-        print("Received response from OpenAI for audio analysis")
-        
-        try:
-            analysis = json.loads(response.choices[0].message.content)
-            print(f"Successfully parsed audio analysis: {analysis}")
-            return {
-                "text": analysis.get("text", "medium"),
-            }
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse audio analysis JSON: {e}")
-            # Fallback to simple parsing if JSON parsing fails
-            content = response.choices[0].message.content
-            print(f"Using fallback parsing for content: {content}")
-            return {
-                "text": "text" if "text" in content.lower() else "text",
-            }
-    
-    async def get_recommendation(
-        self,
-        song_1: Pool_Song,
-        song_2: Pool_Song,
-        prompt_template: str,
-    ) -> int:
-        """
-        Get song recommendations based on analyzed features
-        """
-        print("Starting song recommendation analysis")
-        # print(f"Comparing songs: {song_1.title} vs {song_2.title}")
-        
-        # Format the prompt with song details
-        try:
-            prompt = prompt_template.format(
-                song1_title=song_1.title,
-                song1_artist=song_1.artist,
-                song1_popularity=song_1.popularity_score,
-                song1_duration=song_1.duration_ms,
-                song1_release_date=song_1.release_date,
-                song2_title=song_2.title,
-                song2_artist=song_2.artist,
-                song2_popularity=song_2.popularity_score,
-                song2_duration=song_2.duration_ms,
-                song2_release_date=song_2.release_date,
-            )
-            print("Prompt formatted with song details")
-        except Exception as e:
-            print(f"Error formatting prompt: {e}")
-            return 0
-        
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt 
-                },
-                {
-                    "role": "user",
-                    "content": 
-                    """ Provide your response in JSON with the following structure: 
-                    { 
-                        "song_1_analysis": "One sentence analysis of song 1",
-                        "song_2_analysis": "One sentence analysis of song 2",
-                        "winner": "1" or "2",
-                        "reason": "One sentence explanation of why the winning song is better"
-                    } """
-                }
-            ],
-            response_format={ "type": "json_object" },
-            max_tokens=1000
-        )
-        print("Received response from OpenAI for song recommendation")
-        print(f"Raw response content for {song_1.title} vs {song_2.title}: {response.choices[0].message.content}")
-        
-        try:
-            analysis = json.loads(response.choices[0].message.content)
-            print(f"Successfully parsed recommendation analysis: {analysis}")
-            # Extract the final recommendation from the comparison
-            winner = analysis.get("winner", "")
-            print(f"Winner from analysis: {winner}")
+    def __init__(self):
+        super().__init__()
+        logger.debug("Initializing OpenAIService")
+        # Retries are handled by LLMProvider so the SDK's own retries are turned off
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(
+                transport=http_transport.httpx_transport("openai", settings.HTTP_LLM_POOL_SIZE)
+            ),
+        )
+        http_transport.add_warm_url("openai", "httpx", str(self.client.base_url))
+        self.model = "gpt-4.1-nano"  # Using the fastest advanced model
 
-            return 0 if "1" in winner else 1
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse recommendation JSON: {e}")
-            print(f"Raw content that failed to parse: {response.choices[0].message.content}")
-            # Fallback to simple parsing if JSON parsing fails
-            recommendation = response.choices[0].message.content.strip()
-            print(f"Using fallback parsing for content: {recommendation}")
-            return 0 if "1" in recommendation.lower() else 1
-    
-    async def generate_user_context(
-        self,
-        name: str,
-        top_songs_short: list,
-        top_songs_medium: list,
-        top_songs_long: list,
-        top_artists_short: list,
-        top_artists_medium: list,
-        top_artists_long: list,
-        recently_played: list
-    ) -> dict:
-        """
-        Generate a user context summary using the LLM and the user_context prompt.
-        """
-        prompt = self._load_prompt("user_context.txt")
-        # Format the prompt with user data (convert lists to comma-separated strings or JSON as needed)
-        prompt = prompt.format(
-            top_songs_short=top_songs_short,
-            top_songs_medium=top_songs_medium,
-            top_songs_long=top_songs_long,
-            top_artists_short=top_artists_short,
-            top_artists_medium=top_artists_medium,
-            top_artists_long=top_artists_long,
-            recently_played=recently_played
-        )
-        print("Prompt for user context", prompt)
+    async def _generate(self, call: str, parts: List[str], image: Optional[ImageInput], max_tokens: int) -> Tuple[str, Any]:
+        if image is None:
+            messages = [{"role": "user", "content": part} for part in parts]
+        else:
+            base64_image = base64.b64encode(image.data).decode('utf-8')
+            content = [{"type": "text", "text": part} for part in parts]
+            content.append({"type": "image_url", "image_url": {"url": f"data:{image.mime_type};base64,{base64_image}"}})
+            messages = [{"role": "user", "content": content}]
         response = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "user", "content": prompt},
-                {"role": "user", "content": """
-                Respond ONLY with a valid JSON object in the following format:
-                {
-                    "description": "<2-3 sentence summary of their music tastes and tendencies>",
-                    "genres": ["<genre1>", "<genre2>", ...],
-                }"""}
-            ],
+            messages=messages,
             response_format={"type": "json_object"},
-            max_tokens=500
+            max_tokens=max_tokens
         )
-        try:
-            user_context = json.loads(response.choices[0].message.content)
-            return user_context
-        except Exception as e:
-            print(f"Failed to parse user context JSON: {e}")
-            print(f"Raw content: {response.choices[0].message.content}")
-            return {}
+        return response.choices[0].message.content, response
 
+    async def _transcribe(self, audio_data: bytes) -> str:
+        async def request():
+            # A fresh file object per attempt, a failed upload may have consumed the last one
+            audio_file = io.BytesIO(audio_data)
+            audio_file.name = "audio.mp3"
+            return await self.client.audio.transcriptions.create(file=audio_file, model="whisper-1")
 
-    async def generate_fitness_scores(self, song: Pool_Song, weather_data: dict, user_context: dict, image_analysis: dict):
-        prompt = self._load_prompt("fit_func.txt")
-        prompt = prompt.format(
-            song_title=song.title,
-            song_artist=song.artist,
-            song_popularity=song.popularity_score,
-            song_duration=song.duration_ms,
-            song_release_date=song.release_date,
-            weather_data=weather_data,
-            user_context=user_context,
-            image_analysis=image_analysis
-        )
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt},
-                      {"role": "user", "content": """
-                      Provide your response in JSON with the following structure:
-                      {
-                        "contextual_relevance_score": <0-100>,
-                        "musical_quality_score": <0-100>,
-                        "fitness_score": <0-100>,
-                        "reasoning": "<1 sentence summary on why the scores were assigned>"
-                      }
-                      """}],
-            response_format={"type": "json_object"},
-            max_tokens=1000
-        )
-        try:
-            json_data = json.loads(response.choices[0].message.content)
-            fitness_score = json_data.get("fitness_score", 0)
-            return fitness_score
-        except Exception as e:
-            print(f"Failed to parse fitness scores JSON: {e}")
-            print(f"Raw content: {response.choices[0].message.content}")
-            return 0
+        transcription = await self._with_retries("transcription", request)
+        return transcription.text
@@ -1,17 +1,45 @@
 import rapidfuzz
+from aiohttp_retry import ExponentialRetry, RetryClient
 from shazamio import Shazam
-from typing import Optional, Dict, Any
+from shazamio.exceptions import BadMethod
+from shazamio.interfaces.client import HTTPClientInterface
+from shazamio.utils import validate_json
+from typing import Optional, Dict, Any, List, Union
+from app.core.http_transport import http_transport
 from app.models.song import ShazamSong, Pool_Song
 import asyncio
 import json
 import re
+import logging
 
+logger = logging.getLogger(__name__)
 
 
+class PooledShazamClient(HTTPClientInterface):
+    """
+    shazamio's HTTP client opens a new aiohttp session (and connection) per
+    request; this one sends them through the shared pooled session with the
+    same retry policy
+    """
+    def __init__(self):
+        self.retry_options = ExponentialRetry(attempts=20, max_timeout=60, statuses={500, 502, 503, 504, 429})
+
+    async def request(self, method: str, url: str, *args, **kwargs) -> Union[List[Any], Dict[str, Any]]:
+        if method.upper() not in ("GET", "POST"):
+            raise BadMethod("Accept only GET/POST")
+        # Given a session, RetryClient neither owns nor closes it
+        client = RetryClient(
+            client_session=http_transport.aiohttp_session(), retry_options=self.retry_options, raise_for_status=False
+        )
+        async with client.request(method.upper(), url, **kwargs) as resp:
+            return await validate_json(resp, *args)
+
 
 class ShazamService:
     def __init__(self):
-        self.shazam = Shazam()
+        self.shazam = Shazam(http_client=PooledShazamClient())
+        http_transport.add_warm_url("shazam", "aiohttp", "https://www.shazam.com/")
+        http_transport.add_warm_url("shazam", "aiohttp", "https://cdn.shazam.com/")
 
     
     async def search_song(self, track_name: str, artist_name: str) -> Optional[Dict[str, Any]]:
@@ -33,7 +61,7 @@ class ShazamService:
             search_results = await self.shazam.search_track(track_name + " " + artist_name)
             # print(json.dumps(search_results, indent=2))
             if not search_results or not search_results.get('tracks', {}).get('hits'):
-                print("Shazam Search: No Search Results", track_name, artist_name)
+                logger.debug("Shazam Search: No Search Results %s %s", track_name, artist_name)
                 return None
             
             hits = search_results['tracks']['hits']
@@ -51,12 +79,14 @@ class ShazamService:
                     max_ind = ind
 
             if max_ind == -1:
-                print("Shazam Search: No Search Results Above Threshold", track_name, artist_name, titles_and_subtitles)
-                print(json.dumps(search_results, indent=2))
+                logger.debug("Shazam Search: No Search Results Above Threshold %s %s %s", track_name, artist_name, titles_and_subtitles)
                 return None
             result = hits[max_ind]
             
-            print("Shazam Search Result:", track_name + " " + artist_name, "Result ->",titles_and_subtitles[max_ind], max_score, "list", titles_and_subtitles)
+            logger.debug(
+                "Shazam Search Result: %s %s Result -> %s %s list %s",
+                track_name, artist_name, titles_and_subtitles[max_ind], max_score, titles_and_subtitles,
+            )
 
             # Extract relevant information
             song_details = {
@@ -66,8 +96,7 @@ class ShazamService:
             return song_details
             
         except Exception as e:
-            print(f"Error searching for song: {str(e)}")
-            print(f"Searched for {track_name} by {artist_name}")
+            logger.error("Error searching for song %s by %s: %s", track_name, artist_name, e)
             # print(json.dumps(search_results, indent=2))
             return None
 
@@ -122,7 +151,7 @@ class ShazamService:
             return shazam_song
             
         except Exception as e:
-            print(f"Error getting song details: {str(e)} {json.dumps(song_info, indent=2)}")
+            logger.error("Error getting song details: %s %s", e, song_info)
             return ShazamSong(
                 title="",
                 artist="",
@@ -144,7 +173,7 @@ class ShazamService:
             # Search for the song
             search_results = await self.search_song(track_name, artist_name)
             if search_results == None:
-                print("Shazam Search: (Search and get) No Search Results", track_name, artist_name)
+                logger.debug("Shazam Search: (Search and get) No Search Results %s %s", track_name, artist_name)
                 return ShazamSong(
                     title = track_name,
                     artist = artist_name,
@@ -157,13 +186,13 @@ class ShazamService:
             song_data = await self.get_song_details(search_results['key'])
             return song_data
         except Exception as e:
-            print(f"Error searching and getting song details: {str(e)}")
+            logger.error("Error searching and getting song details: %s", e)
             return None
 
     async def get_related_tracks(self, key: str) -> Optional[Dict[str, Any]]:
         try:
             related_tracks = await self.shazam.related_tracks(key)
-            print(f"Related Tracks: {json.dumps(related_tracks, indent=2)}")
+            logger.debug("Related Tracks: %s", related_tracks)
             songs = []
             for track in related_tracks['tracks']:
                 album = ""
@@ -191,7 +220,7 @@ class ShazamService:
                 songs.append(shazam_song)
             return songs
         except Exception as e:
-            print(f"Error getting related tracks: {str(e)}")
+            logger.error("Error getting related tracks: %s", e)
             return None
     
     async def search_and_get_related_tracks(self, track_name: str, artist_name: str) -> Optional[Dict[str, Any]]:
@@ -205,10 +234,10 @@ class ShazamService:
         try:
             search_results = await self.search_song(track_name, artist_name)
             if search_results == None:
-                print("Shazam Search: (Search and get related) No Search Results", track_name, artist_name)
+                logger.debug("Shazam Search: (Search and get related) No Search Results %s %s", track_name, artist_name)
                 return []
             related_tracks = await self.get_related_tracks(search_results['key'])
             return related_tracks
         except Exception as e:
-            print(f"Error searching and getting related tracks: {str(e)}")
+            logger.error("Error searching and getting related tracks: %s", e)
             return []
@@ -1,19 +1,26 @@
 from typing import List, Dict, Optional
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from urllib3.util.retry import Retry
 from app.core.config import settings
+from app.core.http_transport import http_transport
 import json
 import os
 import uuid
 import random
 import math
 import asyncio
+import logging
+from cachetools import TTLCache
 
 from app.models.song import SpotifyArtist, Pool_Song
+from app.core.metrics import track_call
 from urllib.parse import urlparse
 
+logger = logging.getLogger(__name__)
 
 MAX_LIMIT = 50
+MAX_ARTISTS_PER_CALL = 50
 class SpotifyService:
     def __init__(self):
         self.client_id = settings.SPOTIFY_CLIENT_ID
@@ -22,6 +29,55 @@ class SpotifyService:
         self.scope = "user-read-private user-read-email user-top-read user-read-recently-played user-library-read user-modify-playback-state"
         self.cache_path = "spotify_cache"
         self.user_tokens = {}  # Store tokens for multiple users
+        # One pooled session for every client and auth manager, with spotipy's own retry policy;
+        # sized for the worker threads the blocking calls run in
+        self.requests_session = http_transport.requests_session(
+            "spotify",
+            max_retries=Retry(
+                total=spotipy.Spotify.max_retries,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+                status=spotipy.Spotify.max_retries,
+                backoff_factor=0.3,
+                status_forcelist=spotipy.Spotify.default_retry_codes,
+            ),
+            pool_size=max(settings.HTTP_POOL_SIZE_PER_HOST, min(32, (os.cpu_count() or 1) + 4)),
+        )
+        http_transport.add_warm_url("spotify", "requests", "https://api.spotify.com/")
+        http_transport.add_warm_url("spotify", "requests", "https://accounts.spotify.com/")
+        # artist id -> genres, shared by every user
+        self.artist_genres = TTLCache(
+            maxsize=settings.SPOTIFY_ARTIST_GENRES_MAX_ENTRIES, ttl=settings.SPOTIFY_ARTIST_GENRES_TTL_S
+        )
+
+    async def _call(self, fn, *args, **kwargs):
+        """Run a blocking spotipy call in a thread, recording its latency per endpoint"""
+        with track_call("spotify", fn.__name__):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _with_artist_genres(self, spotify: spotipy.Spotify, songs: List[Pool_Song], artist_ids: List[List[str]]) -> List[Pool_Song]:
+        """Fill each song's genre with its artists' genres (artist_ids[i] belongs to songs[i]); songs are returned unchanged on failure"""
+        if not settings.SPOTIFY_ARTIST_GENRES or not songs:
+            return songs
+        missing = sorted({a for ids in artist_ids for a in ids if a not in self.artist_genres})
+        try:
+            responses = await asyncio.gather(*(
+                self._call(spotify.artists, missing[i:i + MAX_ARTISTS_PER_CALL])
+                for i in range(0, len(missing), MAX_ARTISTS_PER_CALL)
+            ))
+        except Exception as e:
+            logger.warning("Could not fetch artist genres: %s", e)
+            return songs
+        for response in responses:
+            for artist in response['artists']:
+                if artist:
+                    self.artist_genres[artist['id']] = tuple(artist.get('genres') or ())
+        results = []
+        for song, ids in zip(songs, artist_ids):
+            genres = list(dict.fromkeys(g for a in ids for g in self.artist_genres.get(a, ())))
+            results.append(song.model_copy(update={"genre": ", ".join(genres)}) if genres else song)
+        return results
 
     def _get_auth_manager(self, state=None):
         """Create a SpotifyOAuth auth manager with the given state"""
@@ -31,7 +87,8 @@ class SpotifyService:
             redirect_uri=self.redirect_uri,
             scope=self.scope,
             state=state,
-            cache_path=None  # We'll manage our own token storage
+            cache_path=None,  # We'll manage our own token storage
+            requests_session=self.requests_session,
         )
 
     def get_auth_url(self) -> Dict[str, str]:
@@ -66,15 +123,36 @@ class SpotifyService:
         
         # Let spotipy handle token validation and refresh
         if not self.validate_token(session_id):
-            print("Token is invalid, refreshing")
+            logger.info("Token is invalid, refreshing")
             if "refresh_token" in token_info:
                 token_info = auth_manager.refresh_access_token(token_info["refresh_token"])
                 self.user_tokens[session_id]["token_info"] = token_info
             else:
-                print("ERROR: No refresh token found")
+                logger.error("No refresh token found")
                 return None
         # Create a client with the user's access token
-        return spotipy.Spotify(auth=token_info["access_token"])
+        return spotipy.Spotify(auth=token_info["access_token"], requests_session=self.requests_session)
+
+    async def get_user_id(self, session_id: str) -> Optional[str]:
+        """The Spotify user id behind a session, looked up once per session"""
+        session = self.user_tokens.get(session_id)
+        if session is None:
+            return None
+        lookup = session.get("user_id")
+        if lookup is None:
+            spotify = self.get_user_spotify_client(session_id)
+            if not spotify:
+                return None
+            # Concurrent callers of one session share the lookup
+            lookup = session["user_id"] = asyncio.ensure_future(self._call(spotify.current_user))
+        try:
+            profile = await asyncio.shield(lookup)
+        except Exception:
+            # Let a later call try again
+            if session.get("user_id") is lookup:
+                del session["user_id"]
+            raise
+        return profile["id"]
 
     def clear_user_token(self, session_id: str) -> bool:
         """Remove a user's token from storage"""
@@ -96,15 +174,14 @@ class SpotifyService:
 
     async def get_user_top_tracks(self, session_id: str, time_range: str = "medium_term", limit: int = 50, album_mode: bool = False, num_albums: int = 2) -> List[Dict]:
         """Get a user's top tracks"""
-        print("Getting user top tracks")
+        logger.debug("Getting user top tracks")
         spotify = self.get_user_spotify_client(session_id)
         if not spotify:
-            print("No spotify client found")
+            logger.warning("No spotify client found")
             return []
-        print("Got Spotify Client")
         
-        # Use asyncio.to_thread for the blocking API call
-        track_results = await asyncio.to_thread(
+        # Use a thread for the blocking API call
+        track_results = await self._call(
             spotify.current_user_top_tracks,
             time_range=time_range,
             limit=MAX_LIMIT
@@ -116,6 +193,7 @@ class SpotifyService:
         
         # print("Got Top Tracks", json.dumps(track_results['items'], indent=4), len(sampled_tracks))
         results = []
+        artist_ids = []
         for track in sampled_tracks:
             # Default image if none available
             img_url = "https://via.placeholder.com/300"
@@ -141,15 +219,16 @@ class SpotifyService:
                 lyrics=""
             )
             results.append(song)
+            artist_ids.append([a['id'] for a in track['artists'] if a.get('id')])
+        results = await self._with_artist_genres(spotify, results, artist_ids)
         # print("Top Tracks without albums", results)
         if album_mode:
-            print("Getting Albums from sampled tracks Album Mode On")
+            logger.debug("Getting Albums from sampled tracks Album Mode On")
             album_ids = set()
             sampled_album_ids = track_results['items'] #HYPERPARAMETER
             random.shuffle(sampled_album_ids)
             ## GETTING Album of sampled tracks
             ## MAKE SURE I AM NOT ADDING DUPLICATE TRACKS
-            print("Getting Albums from sampled tracks")
             for album_id in sampled_album_ids:
                 if album_id['album']['album_type'] == "album":
                     album_ids.add(album_id['album']['id'])
@@ -159,8 +238,8 @@ class SpotifyService:
                 tracks = await self.get_albums(session_id, list(album_ids))
                 results.extend(tracks)
             else:
-                print("No albums found from sampled tracks of top tracks")
-            print("Got Results", results)
+                logger.debug("No albums found from sampled tracks of top tracks")
+            logger.debug("Got %d results", len(results))
         return results
 
     def _build_track_uri_from_link(self, spotify_link: str) -> str:
@@ -193,22 +272,21 @@ class SpotifyService:
             try:
                 uri = self._build_track_uri_from_link(song.spotify_link)
                 # Use a thread to avoid blocking
-                await asyncio.to_thread(spotify.add_to_queue, uri)
+                await self._call(spotify.add_to_queue, uri)
             except Exception as e:
-                print(f"Failed to queue track {song.spotify_link}: {e}")
+                logger.warning("Failed to queue track %s: %s", song.spotify_link, e)
                 all_ok = False
         return all_ok
 
     async def get_user_top_artists(self, session_id: str, time_range: str = "medium_term", limit: int = 20) -> List[Dict]:
         """Get a user's top artists"""
-        print("Getting user top artists")
+        logger.debug("Getting user top artists")
         spotify = self.get_user_spotify_client(session_id)
         if not spotify:
             return []
-        print("Got Spotify Client")
         
-        # Use asyncio.to_thread for the blocking API call
-        top_artists = await asyncio.to_thread(
+        # Use a thread for the blocking API call
+        top_artists = await self._call(
             spotify.current_user_top_artists,
             limit=MAX_LIMIT,
             time_range=time_range
@@ -218,7 +296,6 @@ class SpotifyService:
         else:
             sampled_artists = top_artists['items']
         
-        print("Got Top Artists")
         results = []
         for artist in sampled_artists:
             artist = SpotifyArtist(
@@ -228,7 +305,7 @@ class SpotifyService:
                 artist_id=artist['id']
             )
             results.append(artist)
-        print("Got Results", results)
+        logger.debug("Got %d results", len(results))
         return results
     
     async def get_artist_top_tracks(self, session_id: str, artist_id: str, limit: int = 10) -> List[Dict]:
@@ -237,13 +314,14 @@ class SpotifyService:
         if not spotify:
             return []
             
-        # Use asyncio.to_thread for the blocking API call
-        top_tracks = await asyncio.to_thread(
+        # Use a thread for the blocking API call
+        top_tracks = await self._call(
             spotify.artist_top_tracks,
             artist_id
         )
         sampled_tracks = random.sample(top_tracks['tracks'], limit)
         results = []
+        artist_ids = []
         for track in sampled_tracks:
             # Default image if none available
             img_url = "https://via.placeholder.com/300"
@@ -268,7 +346,8 @@ class SpotifyService:
                 lyrics=""
             )
             results.append(song)
-        return results
+            artist_ids.append([a['id'] for a in track['artists'] if a.get('id')])
+        return await self._with_artist_genres(spotify, results, artist_ids)
 
     async def get_user_recently_played(self, session_id: str, limit: int = 30) -> List[Dict]:
         """Get a user's recently played tracks, but gets the last limit tracks first
@@ -278,13 +357,14 @@ class SpotifyService:
             return []
         
 
-        # Use asyncio.to_thread for the blocking API call
-        recently_played = await asyncio.to_thread(
+        # Use a thread for the blocking API call
+        recently_played = await self._call(
             spotify.current_user_recently_played,
             limit=MAX_LIMIT
         )
         
         results = []
+        artist_ids = []
         if len(recently_played['items']) >(MAX_LIMIT-limit):
             for item in recently_played['items'][MAX_LIMIT-limit:]:
                 # Default image if none available
@@ -310,7 +390,8 @@ class SpotifyService:
                     lyrics=""
                 )
                 results.append(song)
-        return results
+                artist_ids.append([a['id'] for a in item['track']['artists'] if a.get('id')])
+        return await self._with_artist_genres(spotify, results, artist_ids)
     
     async def get_user_saved_tracks(self, session_id: str, num_sections: int = 3, top_tracks_mode: bool = False, num_top_track_artists: int = 10) -> List[Dict]:
         """Get a user's saved tracks using efficient section-based sampling"""
@@ -319,7 +400,7 @@ class SpotifyService:
             return []
             
         # Get initial batch to determine total count
-        saved_tracks = await asyncio.to_thread(
+        saved_tracks = await self._call(
             spotify.current_user_saved_tracks,
             limit=1
         )
@@ -343,7 +424,7 @@ class SpotifyService:
         for section in selected_sections:
             offset = section * section_size
             # Get tracks for this section
-            section_tracks = await asyncio.to_thread(
+            section_tracks = await self._call(
                 spotify.current_user_saved_tracks,
                 limit=section_size,
                 offset=offset
@@ -352,6 +433,7 @@ class SpotifyService:
         
         # Convert to Pool_Song objects
         results = []
+        artist_ids = []
         for track in all_sampled_tracks:
             # Default image if none available
             img_url = ""
@@ -375,6 +457,8 @@ class SpotifyService:
                 lyrics=""
             )
             results.append(song)
+            artist_ids.append([a['id'] for a in track['track']['artists'] if a.get('id')])
+        results = await self._with_artist_genres(spotify, results, artist_ids)
         
         # ADDING TOP TRACKS FROM RANDOM ARTISTS
         # Get artist ids from results
@@ -400,12 +484,13 @@ class SpotifyService:
         if not spotify:
             return []
         
-        # Use asyncio.to_thread for the blocking API call
-        albums = await asyncio.to_thread(
+        # Use a thread for the blocking API call
+        albums = await self._call(
             spotify.albums,
             album_ids
         )
         results = []
+        artist_ids = []
         for album in albums['albums']:
             img_url = ""
             if album['images'] and len(album['images']) > 0:
@@ -431,4 +516,5 @@ class SpotifyService:
                     lyrics=""
                 )
                 results.append(song)
-        return results
\ No newline at end of file
+                artist_ids.append([a['id'] for a in track['artists'] if a.get('id')])
+        return await self._with_artist_genres(spotify, results, artist_ids)
\ No newline at end of file
@@ -1,55 +1,145 @@
-from typing import Dict, Optional
-import os
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 import aiohttp
+from cachetools import TTLCache
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.http_transport import http_transport
+from app.core.metrics import record_cache_lookup, record_coalesced_lookup, track_call
+
+logger = logging.getLogger(__name__)
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int = 5) -> str:
+    """
+    Standard geohash of a point: a cell id whose length sets the cell size
+    (5 characters is about 4.9 x 4.9 km, 6 about 1.2 x 0.6 km)
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            bounds[0] = middle
+        else:
+            bits <<= 1
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+@lru_cache(maxsize=1024)
+def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse a "latitude,longitude" string once; None when it is missing or malformed"""
+    if not location:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in location.split(","))
+    except ValueError:
+        logger.warning("Invalid location %r, expected \"latitude,longitude\"", location)
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        logger.warning("Location %r is out of range", location)
+        return None
+    return latitude, longitude
+
 
 class WeatherService:
+    """
+    Current conditions from the Google Weather API. Answers are cached per
+    geohash cell (WEATHER_CACHE_GEOHASH_PRECISION) for WEATHER_CACHE_TTL_S, so
+    nearby users within the same few minutes share one lookup, and concurrent
+    lookups for a cell share one request. Requests go through the shared
+    pooled session of app.core.http_transport.
+    """
     def __init__(self):
         self.api_key = settings.GOOGLE_MAPS_KEY
         self.base_url = "https://weather.googleapis.com/v1/currentConditions:lookup"
+        self.cache: TTLCache = TTLCache(maxsize=settings.WEATHER_CACHE_MAX_ENTRIES, ttl=settings.WEATHER_CACHE_TTL_S)
+        # Lookups in flight per geohash cell
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.timeout = aiohttp.ClientTimeout(total=settings.WEATHER_HTTP_TIMEOUT_S)
+        http_transport.add_warm_url("weather", "aiohttp", "https://weather.googleapis.com/")
 
     async def get_current_weather(self, latitude: float, longitude: float) -> Dict:
         """
         Fetch current weather conditions for a given location.
-        
+
         Args:
             latitude (float): The latitude of the location
             longitude (float): The longitude of the location
-            
+
         Returns:
             Dict: Current weather conditions
-            
+
         Raises:
             HTTPException: If the API request fails
         """
+        cell = geohash(latitude, longitude, settings.WEATHER_CACHE_GEOHASH_PRECISION)
+        cached = self.cache.get(cell)
+        if cached is not None:
+            record_cache_lookup("weather", True)
+            return cached
+
+        in_flight = self._in_flight.get(cell)
+        if in_flight is not None:
+            # Someone nearby is already fetching this cell
+            record_coalesced_lookup("weather")
+            return await asyncio.shield(in_flight)
+
+        record_cache_lookup("weather", False)
+        task = asyncio.ensure_future(self._fetch_cell(cell, latitude, longitude))
+        self._in_flight[cell] = task
+        # Shielded so a cancelled caller does not cancel the lookup others joined
+        return await asyncio.shield(task)
+
+    async def _fetch_cell(self, cell: str, latitude: float, longitude: float) -> Dict:
+        try:
+            output = await self._fetch_current_weather(latitude, longitude)
+            self.cache[cell] = output
+            return output
+        finally:
+            self._in_flight.pop(cell, None)
+
+    async def _fetch_current_weather(self, latitude: float, longitude: float) -> Dict:
         try:
             params = {
                 "key": self.api_key,
                 "location.latitude": latitude,
                 "location.longitude": longitude
             }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.base_url, params=params) as response:
+
+            with track_call("weather", "current_conditions"):
+                async with http_transport.aiohttp_session().get(self.base_url, params=params, timeout=self.timeout) as response:
                     response.raise_for_status()
                     response = await response.json()
-                    output = {
-                        "isDaytime": response.get('isDaytime'),
-                        "currentConditions": str(response.get('weatherCondition').get('description').get("text",'')),
-                        "currentTemperature": str(response.get('feelsLikeTemperature').get('degrees','')) + " " + str(response.get('feelsLikeTemperature').get('unit','')) ,
-                        "uvIndex": str(response.get('uvIndex', '')),
-                        "relativeHumidity": str(response.get('relativeHumidity', '')),
-                        "precipitationProbability": str(response.get('precipitation').get('probability').get('percent')) + " of " + str(response.get('precipitation').get('probability').get('type')),
-                        "qpf": str(response.get('precipitation').get('qpf').get('quantity')) + " " + str(response.get('precipitation').get('qpf').get('unit')),
-                        "thunderstormProbability": str(response.get('thunderstormProbability')),
-                        "windGusts": str(response.get("wind").get("gust").get("value")) + " " + str(response.get("wind").get("gust").get("unit")),
-                        "visibility": str(response.get("visibility").get("distance")) + " " + str(response.get("visibility").get("unit")),
-                        "cloudCover": str(response.get("cloudCover", "")),
-                    }
-                    return output
-            
-        except aiohttp.ClientError as e:
+            output = {
+                "isDaytime": response.get('isDaytime'),
+                "currentConditions": str(response.get('weatherCondition').get('description').get("text",'')),
+                "currentTemperature": str(response.get('feelsLikeTemperature').get('degrees','')) + " " + str(response.get('feelsLikeTemperature').get('unit','')) ,
+                "uvIndex": str(response.get('uvIndex', '')),
+                "relativeHumidity": str(response.get('relativeHumidity', '')),
+                "precipitationProbability": str(response.get('precipitation').get('probability').get('percent')) + " of " + str(response.get('precipitation').get('probability').get('type')),
+                "qpf": str(response.get('precipitation').get('qpf').get('quantity')) + " " + str(response.get('precipitation').get('qpf').get('unit')),
+                "thunderstormProbability": str(response.get('thunderstormProbability')),
+                "windGusts": str(response.get("wind").get("gust").get("value")) + " " + str(response.get("wind").get("gust").get("unit")),
+                "visibility": str(response.get("visibility").get("distance")) + " " + str(response.get("visibility").get("unit")),
+                "cloudCover": str(response.get("cloudCover", "")),
+            }
+            return output
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to fetch weather data: {str(e)}"
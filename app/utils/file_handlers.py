@@ -1,32 +1,52 @@
-from fastapi import UploadFile
-import aiofiles
+from fastapi import UploadFile, HTTPException
 import os
-from typing import Tuple
+import re
+from typing import Optional
 
-async def save_upload_file(upload_file: UploadFile, save_path: str) -> str:
+# Characters kept when sanitising client-supplied filenames
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class UploadedFile:
+    """The bytes of one upload, read once"""
+    def __init__(self, filename: str, content_type: Optional[str], data: bytes):
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def sanitize_filename(filename: Optional[str], default: str = "upload") -> str:
     """
-    Save an uploaded file to the specified path
+    Reduce a client-supplied filename to a safe basename: no directories,
+    only [A-Za-z0-9._-], no leading dots and at most 100 characters
     """
-    try:
-        async with aiofiles.open(save_path, 'wb') as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
-        return save_path
-    except Exception as e:
-        raise Exception(f"Error saving file: {str(e)}")
-
-async def read_file_content(file_path: str) -> bytes:
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = _UNSAFE_FILENAME_CHARS.sub("_", name).lstrip(".")
+    return name[-100:] or default
+
+
+async def read_upload(upload: UploadFile, max_bytes: int) -> UploadedFile:
     """
-    Read file content as bytes
+    Read an upload exactly once, rejecting it with 413 if it is larger than max_bytes.
     """
-    try:
-        async with aiofiles.open(file_path, 'rb') as file:
-            return await file.read()
-    except Exception as e:
-        raise Exception(f"Error reading file: {str(e)}")
+    filename = sanitize_filename(upload.filename)
+    size = upload.size
+    if size is not None and size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{filename} is larger than {max_bytes} bytes")
+
+    # Read one byte past the limit to detect oversized bodies of unknown size
+    data = await upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{filename} is larger than {max_bytes} bytes")
+    return UploadedFile(filename, upload.content_type, data)
+
 
 def get_file_extension(filename: str) -> str:
     """
     Get file extension from filename
     """
-    return os.path.splitext(filename)[1].lower() 
\ No newline at end of file
+    return os.path.splitext(filename)[1].lower()
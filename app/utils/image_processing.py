@@ -0,0 +1,130 @@
+import io
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+import magic
+import numpy as np
+import pillow_heif
+from PIL import Image, ImageOps
+from app.core.config import settings
+from app.core.media_pool import MediaPoolSaturated, media_pool
+
+logger = logging.getLogger(__name__)
+
+# Lets PIL open HEIC/HEIF uploads from iPhones directly
+pillow_heif.register_heif_opener()
+
+HEIC_SIGNATURES = (
+    b'\x00\x00\x00\x20\x66\x74\x79\x70\x68\x65\x69\x63',
+    b'\x00\x00\x00\x18\x66\x74\x79\x70\x68\x65\x69\x63',
+)
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Opening a libmagic handle loads the magic database, so it is created once and shared
+_magic: Optional[magic.Magic] = None
+_magic_lock = threading.Lock()
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    # 64-bit difference hash, None when the upload could not be decoded
+    dhash: Optional[int] = None
+
+
+def detect_mime(data: bytes) -> str:
+    """Detect the mime type of image bytes with the shared libmagic handle"""
+    global _magic
+    try:
+        with _magic_lock:
+            if _magic is None:
+                _magic = magic.Magic(mime=True)
+            return _magic.from_buffer(data[:4096])
+    except Exception as e:
+        logger.warning("Error detecting file type: %s", e)
+        # Fallback to checking magic numbers
+        return "image/heic" if data.startswith(HEIC_SIGNATURES) else "application/octet-stream"
+
+
+def is_heic(data: bytes) -> bool:
+    return detect_mime(data) in ("image/heic", "image/heif")
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: shrink to (hash_size + 1) x hash_size grayscale and set one
+    bit per pixel that is brighter than its right-hand neighbour. Near-identical
+    photos differ in only a few bits.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def hamming_distance(hash_1: int, hash_2: int) -> int:
+    return (hash_1 ^ hash_2).bit_count()
+
+
+def preprocess_image(
+    data: bytes,
+    max_edge: int = settings.IMAGE_MAX_EDGE,
+    image_format: str = settings.IMAGE_FORMAT,
+    quality: int = settings.IMAGE_QUALITY,
+) -> PreparedImage:
+    """
+    Decode an upload once, apply its EXIF orientation, shrink it so the longest
+    edge is at most max_edge and re-encode it as JPEG or WebP, computing its
+    perceptual hash from the decoded image.
+    Pure function so it can run in any worker.
+    """
+    image_format = image_format.upper()
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG can decode straight at a reduced scale, far cheaper than a full decode + resize
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality, optimize=image_format == "JPEG")
+        return PreparedImage(
+            data=buffer.getvalue(),
+            mime_type=FORMAT_MIME_TYPES[image_format],
+            width=image.width,
+            height=image.height,
+            original_size=len(data),
+            dhash=dhash(image),
+        )
+
+
+async def prepare_image(data: bytes) -> PreparedImage:
+    """
+    Preprocess an upload in the media process pool. Images PIL cannot decode are
+    passed through unchanged so the vision provider can still try them.
+    Raises MediaPoolSaturated when the pool has no room for the work.
+    """
+    try:
+        prepared = await media_pool.run("image_preprocess", preprocess_image, data)
+    except MediaPoolSaturated:
+        raise
+    except Exception as e:
+        logger.warning("Image preprocessing failed, sending the original upload: %s", e)
+        return PreparedImage(data=data, mime_type=detect_mime(data), width=0, height=0, original_size=len(data))
+    logger.debug(
+        "Preprocessed image from %d to %d bytes (%dx%d %s)",
+        prepared.original_size, len(prepared.data), prepared.width, prepared.height, prepared.mime_type,
+    )
+    return prepared
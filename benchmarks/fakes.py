@@ -0,0 +1,241 @@
+"""
+In-process stand-ins for the external services used by the recommendation pipeline.
+
+Each fake has the same async interface as the real service, sleeps for a latency
+drawn from a configurable distribution, fails at a configurable rate and goes
+through track_call, so /metrics, traces and call counts look like production.
+"""
+import asyncio
+import random
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from unittest.mock import patch
+from app.core.metrics import track_call
+from app.models.song import Pool_Song, SpotifyArtist
+
+
+@dataclass
+class LatencyModel:
+    """Latency of one kind of call in seconds: "fixed", "uniform" or "lognormal" (median + sigma)"""
+    kind: str = "lognormal"
+    median_s: float = 0.1
+    sigma: float = 0.4
+    low_s: float = 0.0
+    high_s: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.median_s
+        if self.kind == "uniform":
+            return rng.uniform(self.low_s, self.high_s)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(0, self.sigma) * self.median_s
+        raise ValueError(f"Unknown latency model: {self.kind}")
+
+
+class FakeServiceError(Exception):
+    """Raised by a fake at its configured error rate; carries an HTTP status like the real clients"""
+    def __init__(self, service: str, call: str, status_code: int):
+        super().__init__(f"{service}.{call} failed with HTTP {status_code}")
+        self.status_code = status_code
+
+
+@dataclass
+class FakeProfile:
+    """Latency and error behaviour of one fake service"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    # Per-call overrides, e.g. {"judge": LatencyModel(median_s=0.8)}
+    call_latency: Dict[str, LatencyModel] = field(default_factory=dict)
+    error_rate: float = 0.0
+    rate_limited_share: float = 0.5  # share of errors reported as HTTP 429
+
+
+class _FakeService:
+    service = ""
+
+    def __init__(self, profile: Optional[FakeProfile] = None, seed: Optional[int] = None):
+        self.profile = profile or FakeProfile()
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+
+    async def _simulate(self, call: str) -> None:
+        self.calls[call] += 1
+        latency = self.profile.call_latency.get(call, self.profile.latency).sample(self.rng)
+        fails = self.rng.random() < self.profile.error_rate
+        status_code = 429 if self.rng.random() < self.profile.rate_limited_share else 500
+        with track_call(self.service, call):
+            await asyncio.sleep(latency)
+            if fails:
+                raise FakeServiceError(self.service, call, status_code)
+
+
+def synthetic_song(index: int) -> Pool_Song:
+    return Pool_Song(
+        title=f"Song {index}",
+        artist=f"Artist {index % 97}",
+        album=f"Album {index % 31}",
+        img_link="",
+        spotify_link=f"https://open.spotify.com/track/{index}",
+        popularity_score=(index * 37) % 100,
+        duration_ms=150000 + (index * 7919) % 150000,
+        release_date=f"{1980 + index % 45}-01-01",
+    )
+
+
+class FakeSpotifyService(_FakeService):
+    """Serves songs from a synthetic catalogue instead of the Spotify Web API"""
+    service = "spotify"
+
+    def __init__(self, profile: Optional[FakeProfile] = None, seed: Optional[int] = None, catalogue_size: int = 2000):
+        super().__init__(profile, seed)
+        self.catalogue_size = catalogue_size
+
+    def _sample_songs(self, count: int) -> List[Pool_Song]:
+        return [synthetic_song(self.rng.randrange(self.catalogue_size)) for _ in range(count)]
+
+    async def get_user_id(self, session_id: str) -> Optional[str]:
+        await self._simulate("current_user")
+        return f"user-{session_id}"
+
+    async def get_user_top_tracks(self, session_id: str, time_range: str = "medium_term", limit: int = 50, album_mode: bool = False, num_albums: int = 2) -> List[Pool_Song]:
+        await self._simulate("current_user_top_tracks")
+        songs = self._sample_songs(limit)
+        for _ in range(num_albums if album_mode else 0):
+            await self._simulate("albums")
+            songs.extend(self._sample_songs(12))
+        return songs
+
+    async def get_user_top_artists(self, session_id: str, time_range: str = "medium_term", limit: int = 20) -> List[SpotifyArtist]:
+        await self._simulate("current_user_top_artists")
+        return [
+            SpotifyArtist(name=f"Artist {i}", genres=[], popularity_score=50, artist_id=str(i))
+            for i in self.rng.sample(range(97), min(limit, 97))
+        ]
+
+    async def get_artist_top_tracks(self, session_id: str, artist_id: str, limit: int = 10) -> List[Pool_Song]:
+        await self._simulate("artist_top_tracks")
+        return self._sample_songs(limit)
+
+    async def get_user_recently_played(self, session_id: str, limit: int = 30) -> List[Pool_Song]:
+        await self._simulate("current_user_recently_played")
+        return self._sample_songs(limit)
+
+    async def get_user_saved_tracks(self, session_id: str, num_sections: int = 3, top_tracks_mode: bool = False, num_top_track_artists: int = 10) -> List[Pool_Song]:
+        songs = []
+        for _ in range(num_sections):
+            await self._simulate("current_user_saved_tracks")
+            songs.extend(self._sample_songs(50))
+        for _ in range(num_top_track_artists if top_tracks_mode else 0):
+            await self._simulate("artist_top_tracks")
+            songs.extend(self._sample_songs(5))
+        return songs
+
+    async def add_tracks_to_queue(self, session_id: str, songs: List[Pool_Song]) -> bool:
+        for _ in songs:
+            await self._simulate("add_to_queue")
+        return True
+
+
+class FakeLLMService(_FakeService):
+    """
+    Stand-in for OpenAIService and GeminiService. Judgements are deterministic
+    (the more popular song wins, fitness follows popularity) so runs are comparable.
+    """
+    def __init__(self, service: str, profile: Optional[FakeProfile] = None, seed: Optional[int] = None):
+        super().__init__(profile, seed)
+        self.service = self.name = service
+
+    async def analyze_image(self, image_data: bytes, track_titles_and_artists: list, artist_names: list, mime_type: str = "image/jpeg") -> dict:
+        await self._simulate("vision")
+        return {"mood": "calm", "genres": ["indie"], "energy": "medium"}
+
+    async def analyze_audio(self, audio_data: bytes) -> dict:
+        await self._simulate("audio_analysis")
+        return {"text": "text"}
+
+    async def get_recommendation(self, song_1: Pool_Song, song_2: Pool_Song, prompt_template: str) -> int:
+        await self._simulate("judge")
+        return 0 if (song_1.popularity_score or 0) >= (song_2.popularity_score or 0) else 1
+
+    async def generate_user_context(self, name: str, **kwargs) -> dict:
+        await self._simulate("user_context")
+        return {"description": "Listens to a bit of everything.", "genres": ["indie", "pop"]}
+
+    async def generate_fitness_scores(self, song: Pool_Song, weather_data: dict, user_context: dict, image_analysis: dict) -> int:
+        await self._simulate("fitness")
+        return song.popularity_score or 0
+
+
+class FakeWeatherService(_FakeService):
+    service = "weather"
+
+    async def get_current_weather(self, latitude: float, longitude: float) -> Dict:
+        await self._simulate("current_conditions")
+        return {"isDaytime": True, "weatherCondition": "CLEAR", "temperature": 21.0}
+
+
+@dataclass
+class FakeServices:
+    spotify: FakeSpotifyService
+    openai: FakeLLMService
+    gemini: FakeLLMService
+    weather: FakeWeatherService
+
+    def call_counts(self) -> Dict[str, int]:
+        """Total calls per service"""
+        return {
+            "spotify": sum(self.spotify.calls.values()),
+            "openai": sum(self.openai.calls.values()),
+            "gemini": sum(self.gemini.calls.values()),
+            "weather": sum(self.weather.calls.values()),
+        }
+
+
+# Every module that binds a service instance at import time
+_SERVICE_BINDINGS = {
+    "spotify_service": ["app.services.service_instances", "app.api.routes.recommendation", "app.rec_service.recommendation"],
+    "openai_service": ["app.services.service_instances", "app.api.routes.recommendation", "app.rec_service.recommendation",
+                       "app.rec_service.tourney", "app.genetic_algo.genetic"],
+    "gemini_service": ["app.services.service_instances", "app.rec_service.tourney", "app.genetic_algo.genetic"],
+    "weather_service": ["app.services.service_instances", "app.rec_service.recommendation"],
+}
+
+
+def install_fakes(patches: ExitStack, services: FakeServices) -> None:
+    """
+    Swap the shared service instances for fakes everywhere they were imported.
+    The swaps are undone when `patches` is closed.
+    """
+    import importlib
+    instances = {
+        "spotify_service": services.spotify,
+        "openai_service": services.openai,
+        "gemini_service": services.gemini,
+        "weather_service": services.weather,
+    }
+    for name, modules in _SERVICE_BINDINGS.items():
+        for module_name in modules:
+            patches.enter_context(patch.object(importlib.import_module(module_name), name, instances[name]))
+
+    # RecommendationService keeps its own references to the OpenAI and weather services
+    from app.api.routes.recommendation import recommendation_service
+    patches.enter_context(patch.object(recommendation_service, "open_ai_service", services.openai))
+    patches.enter_context(patch.object(recommendation_service, "weather_service", services.weather))
+
+
+def make_fake_services(
+    llm_latency: Optional[LatencyModel] = None,
+    spotify_latency: Optional[LatencyModel] = None,
+    error_rate: float = 0.0,
+    seed: Optional[int] = None,
+) -> FakeServices:
+    llm_latency = llm_latency or LatencyModel(median_s=0.6, sigma=0.5)
+    spotify_latency = spotify_latency or LatencyModel(median_s=0.15, sigma=0.3)
+    return FakeServices(
+        spotify=FakeSpotifyService(FakeProfile(spotify_latency, error_rate=error_rate), seed=seed),
+        openai=FakeLLMService("openai", FakeProfile(llm_latency, error_rate=error_rate), seed=seed),
+        gemini=FakeLLMService("gemini", FakeProfile(llm_latency, error_rate=error_rate), seed=seed),
+        weather=FakeWeatherService(FakeProfile(LatencyModel(median_s=0.1), error_rate=error_rate), seed=seed),
+    )
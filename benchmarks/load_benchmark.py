@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""
+End-to-end load benchmark for /recommend and /recommend-genetic.
+
+Drives the FastAPI app in process (httpx ASGI transport) with N concurrent
+users while Spotify, OpenAI, Gemini and the weather API are replaced by the
+fakes in benchmarks/fakes.py. Reports latency percentiles, throughput and
+external calls per request, and can write/compare a JSON baseline.
+
+    python benchmarks/load_benchmark.py --users 8 --requests 40 --output baseline.json
+    python benchmarks/load_benchmark.py --users 8 --requests 40 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import httpx
+from app.core.config import settings
+from app.services import llm_routing
+from app.services.llm_provider import parse_timeouts
+from benchmarks.fakes import LatencyModel, install_fakes, make_fake_services
+
+IMAGE_PATH = Path(project_root) / "tests" / "test.jpg"
+ENDPOINTS = {"tourney": "/api/v1/recommend", "genetic": "/api/v1/recommend-genetic"}
+# Metrics compared against a baseline, and whether lower is better
+COMPARED_METRICS = {
+    "p50_s": True,
+    "p95_s": True,
+    "p99_s": True,
+    "requests_per_s": False,
+    "llm_calls_per_request": True,
+    "spotify_calls_per_request": True,
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_load(args) -> Dict:
+    from app.main import app
+
+    random.seed(args.seed)
+    services = make_fake_services(
+        llm_latency=LatencyModel(median_s=args.llm_median_s, sigma=args.llm_sigma),
+        spotify_latency=LatencyModel(median_s=args.spotify_median_s, sigma=args.spotify_sigma),
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    patches = ExitStack()
+    install_fakes(patches, services)
+    # The fakes make no network calls, so there is nothing to warm
+    patches.enter_context(patch.object(settings, "HTTP_WARM_CONNECTIONS", False))
+    if args.judge_mode:
+        patches.enter_context(patch.object(settings, "JUDGE_MODE", args.judge_mode))
+    if args.selection:
+        patches.enter_context(patch.object(settings, "TOURNEY_SELECTION", args.selection))
+    if args.comparison_cache:
+        patches.enter_context(patch.object(settings, "COMPARISON_CACHE_ENABLED", True))
+    if args.aggregation:
+        patches.enter_context(patch.object(settings, "TOURNEY_AGGREGATION", args.aggregation))
+    if args.hedge_after_s:
+        patches.enter_context(patch.object(llm_routing, "HEDGE_THRESHOLDS", parse_timeouts(args.hedge_after_s)))
+
+    image_bytes = IMAGE_PATH.read_bytes()
+    form = {"session_id": "benchmark", "location": "40.7128,-74.0060"}
+    if args.latency_budget_s is not None:
+        form["latency_budget_s"] = str(args.latency_budget_s)
+    if args.llm_call_budget is not None:
+        form["llm_call_budget"] = str(args.llm_call_budget)
+    if args.cascade:
+        form["cascade"] = "true"
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(args.requests))
+
+    async def user(client: httpx.AsyncClient):
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.post(
+                ENDPOINTS[args.engine],
+                data=form,
+                files={"image": ("test.jpg", image_bytes, "image/jpeg")},
+            )
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                start = time.perf_counter()
+                await asyncio.gather(*(user(client) for _ in range(args.users)))
+                elapsed = time.perf_counter() - start
+    finally:
+        patches.close()
+
+    latencies.sort()
+    calls = services.call_counts()
+    completed = len(latencies)
+    return {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": {
+            "requests": completed,
+            "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+            "error_rate": 1 - statuses.get(200, 0) / completed if completed else 0.0,
+            "elapsed_s": elapsed,
+            "requests_per_s": completed / elapsed if elapsed else 0.0,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "p99_s": percentile(latencies, 99),
+            "max_s": latencies[-1] if latencies else 0.0,
+            "llm_calls_per_request": (calls["openai"] + calls["gemini"]) / completed if completed else 0.0,
+            "spotify_calls_per_request": calls["spotify"] / completed if completed else 0.0,
+            "calls": {
+                "spotify": dict(services.spotify.calls),
+                "openai": dict(services.openai.calls),
+                "gemini": dict(services.gemini.calls),
+                "weather": dict(services.weather.calls),
+            },
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    results = report["results"]
+    print(f"requests:            {results['requests']} ({results['status_codes']})")
+    print(f"throughput:          {results['requests_per_s']:.2f} req/s")
+    print(f"latency p50/p95/p99: {results['p50_s']:.3f}s / {results['p95_s']:.3f}s / {results['p99_s']:.3f}s")
+    print(f"LLM calls/request:   {results['llm_calls_per_request']:.1f}")
+    print(f"Spotify calls/req:   {results['spotify_calls_per_request']:.1f}")
+
+
+def print_comparison(report: Dict, baseline: Dict) -> None:
+    print(f"\nCompared with baseline {baseline.get('commit') or ''}:")
+    for metric, lower_is_better in COMPARED_METRICS.items():
+        old, new = baseline["results"].get(metric), report["results"][metric]
+        if not old:
+            continue
+        change = (new - old) / old * 100
+        better = (change < 0) == lower_is_better
+        print(f"  {metric:27s} {old:10.3f} -> {new:10.3f}  {change:+6.1f}% {'better' if better else 'worse'}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=sorted(ENDPOINTS), default="tourney")
+    parser.add_argument("--users", type=int, default=4, help="concurrent users")
+    parser.add_argument("--requests", type=int, default=20, help="total requests across all users")
+    parser.add_argument("--llm-median-s", type=float, default=0.6)
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="lognormal sigma of LLM latency")
+    parser.add_argument("--spotify-median-s", type=float, default=0.15)
+    parser.add_argument("--spotify-sigma", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="failure rate of every fake call")
+    parser.add_argument("--latency-budget-s", type=float, default=None)
+    parser.add_argument("--llm-call-budget", type=int, default=None)
+    parser.add_argument("--cascade", action="store_true", help="pre-rank the full pool locally, rank only the shortlist")
+    parser.add_argument("--judge-mode", choices=["llm", "local", "hybrid"], help="override JUDGE_MODE")
+    parser.add_argument("--selection", choices=["brackets", "tree"], help="override TOURNEY_SELECTION")
+    parser.add_argument("--comparison-cache", action="store_true", help="reuse judgements across brackets and requests")
+    parser.add_argument("--aggregation", choices=["rounds", "bradley_terry"], help="override TOURNEY_AGGREGATION")
+    parser.add_argument("--hedge-after-s", default="", help='hedge thresholds like LLM_HEDGE_AFTER_S, e.g. "judge=1.0"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="compare with a previously written baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Importing the app configures logging, so quieten it afterwards
+    import app.main  # noqa: F401
+    if not args.verbose:
+        logging.getLogger("app").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.compare:
+        print_comparison(report, json.loads(Path(args.compare).read_text()))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
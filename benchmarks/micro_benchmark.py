@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the ranking engines and the candidate pool on synthetic pools.
+
+The judge and fitness function answer instantly and deterministically and every
+RNG is seeded, so the numbers reflect the algorithms' own cost: CPU time, peak
+traced memory, retained allocations and the number of judge/fitness calls.
+
+    python benchmarks/micro_benchmark.py --sizes 100 1000 10000
+    python benchmarks/micro_benchmark.py --engines tourney --sizes 100000 --output micro.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from unittest.mock import patch
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from benchmarks.fakes import synthetic_song
+from app.models.song import Pool_Song
+from app.rec_service.tourney import Tourney
+from app.rec_service.candidate_pool import CandidatePool
+from app.genetic_algo.genetic import GeneticAlgorithm
+
+
+class ZeroLatencyJudge:
+    """Deterministic LLM stand-in that answers without awaiting and counts its calls"""
+    def __init__(self):
+        self.judge_calls = 0
+        self.fitness_calls = 0
+
+    async def get_recommendation(self, song_1: Pool_Song, song_2: Pool_Song, prompt_template: str) -> int:
+        self.judge_calls += 1
+        return 0 if (song_1.popularity_score, song_1.title) >= (song_2.popularity_score, song_2.title) else 1
+
+    async def generate_fitness_scores(self, song: Pool_Song, weather_data, user_context, image_analysis) -> int:
+        self.fitness_calls += 1
+        return song.popularity_score or 0
+
+
+def synthetic_pool(size: int) -> List[Pool_Song]:
+    return [synthetic_song(index) for index in range(size)]
+
+
+def fetched_songs(size: int) -> List[Pool_Song]:
+    """`size` fetched songs of which about a third are duplicates"""
+    return [synthetic_song(random.randrange(size * 2 // 3 + 1)) for _ in range(size)]
+
+
+async def bench_tourney(songs: List[Pool_Song]) -> None:
+    tourney = Tourney(list(songs), "", num_tournaments=3, use_alternating_services=False)
+    await tourney.run_tourney(num_recommendations=5)
+
+
+async def bench_genetic(songs: List[Pool_Song]) -> None:
+    algorithm = GeneticAlgorithm(
+        songs, population_size=min(30, len(songs)), mutation_rate=0.15, generations=12, use_openai=False
+    )
+    await algorithm.run()
+
+
+async def bench_candidate_pool(songs: List[Pool_Song]) -> None:
+    """Merge fetched songs into the pool in source-sized batches"""
+    pool = CandidatePool([], "benchmark", spotify_service=None)
+    sources = ["top_artists", "top_tracks", "saved_tracks"]
+    for start in range(0, len(songs), 50):
+        await pool._add_tracks_to_pool(songs[start:start + 50], sources[start // 50 % 3])
+
+
+# Engine name -> (input builder, benchmarked coroutine); inputs are built outside the measurement
+ENGINES: Dict[str, Tuple[Callable, Callable]] = {
+    "tourney": (synthetic_pool, bench_tourney),
+    "genetic": (synthetic_pool, bench_genetic),
+    "candidate_pool": (fetched_songs, bench_candidate_pool),
+}
+
+
+def _run(engine: str, size: int, seed: int, trace_memory: bool) -> Dict:
+    judge = ZeroLatencyJudge()
+    patches = ExitStack()
+    for module in ("app.rec_service.tourney", "app.genetic_algo.genetic"):
+        patches.enter_context(patch(f"{module}.gemini_service", judge))
+        patches.enter_context(patch(f"{module}.openai_service", judge))
+    random.seed(seed)
+    build_input, bench = ENGINES[engine]
+    songs = build_input(size)
+    try:
+        if trace_memory:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        asyncio.run(bench(songs))
+        cpu_s, wall_s = time.process_time() - cpu_start, time.perf_counter() - wall_start
+        result = {"cpu_s": cpu_s, "wall_s": wall_s, "judge_calls": judge.judge_calls, "fitness_calls": judge.fitness_calls}
+        if trace_memory:
+            _current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            result["peak_kib"] = peak / 1024
+            result["retained_blocks"] = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+            tracemalloc.stop()
+    finally:
+        patches.close()
+    return result
+
+
+def run_benchmark(engine: str, size: int, seed: int = 0, repeat: int = 3) -> Dict:
+    """
+    Best-of-`repeat` CPU time without tracing, then one run under tracemalloc for
+    memory, since tracing allocations slows the engines down several times.
+    """
+    timings = [_run(engine, size, seed, trace_memory=False) for _ in range(repeat)]
+    best = min(timings, key=lambda timing: timing["cpu_s"])
+    memory = _run(engine, size, seed, trace_memory=True)
+    return {
+        "engine": engine,
+        "size": size,
+        "cpu_s": best["cpu_s"],
+        "wall_s": best["wall_s"],
+        "judge_calls": best["judge_calls"],
+        "fitness_calls": best["fitness_calls"],
+        "peak_kib": memory["peak_kib"],
+        "retained_blocks": memory["retained_blocks"],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    results = []
+    print(f"{'engine':15s} {'songs':>8s} {'cpu s':>9s} {'peak KiB':>10s} {'retained':>9s} {'judge':>8s} {'fitness':>8s}")
+    for engine in args.engines:
+        for size in args.sizes:
+            result = run_benchmark(engine, size, args.seed, args.repeat)
+            results.append(result)
+            print(
+                f"{engine:15s} {size:8d} {result['cpu_s']:9.3f} {result['peak_kib']:10.0f} "
+                f"{result['retained_blocks']:9d} {result['judge_calls']:8d} {result['fitness_calls']:8d}"
+            )
+    if args.output:
+        Path(args.output).write_text(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
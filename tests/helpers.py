@@ -0,0 +1,27 @@
+"""Songs and judges shared by the ranking tests"""
+from typing import Optional
+from app.models.song import Pool_Song
+
+
+def make_song(index: int, popularity_score: Optional[int] = None) -> Pool_Song:
+    """Song {index} by Artist {index}; popularity_score defaults to index"""
+    return Pool_Song(
+        title=f"Song {index}",
+        artist=f"Artist {index}",
+        album="Album",
+        img_link="",
+        spotify_link=f"https://open.spotify.com/track/{index}",
+        popularity_score=index if popularity_score is None else popularity_score,
+        duration_ms=200000,
+        release_date="2020-01-01",
+    )
+
+
+class PopularityJudge:
+    """Picks the more popular song and counts its calls"""
+    def __init__(self):
+        self.calls = 0
+
+    async def get_recommendation(self, song_1, song_2, prompt_template):
+        self.calls += 1
+        return 0 if song_1.popularity_score >= song_2.popularity_score else 1
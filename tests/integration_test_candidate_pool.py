@@ -6,7 +6,7 @@ import json
 import time
 from datetime import datetime
 from app.services.service_instances import spotify_service
-from app.rec_service.recommendation import RecommendationService
+from app.rec_service.recommendation import RecommendationService, RequestContext
 
 
 # Add the parent directory to the Python path
@@ -124,13 +124,13 @@ async def test_candidate_pool_with_real_spotify():
     #     candidate_pool = candidate_pool[:max_size]
     
     # start = time.time()
-    # output = await recommendation_service.find_recommendations(candidate_pool)
+    # output = await recommendation_service.find_recommendations(RequestContext(session_id=session_id), candidate_pool)
     # end = time.time()
     # print(f"Time taken Tourney: {end - start} seconds")
     # print(output)
 
     start = time.time()
-    output = await recommendation_service.find_recommendations_genetic(candidate_pool)
+    output = await recommendation_service.find_recommendations_genetic(RequestContext(session_id=session_id), candidate_pool)
     end = time.time()
     print(f"Time taken Genetic: {end - start} seconds")
     print(output)
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.metrics import TOURNEY_EARLY_STOPS
+from app.rec_service.bradley_terry import fit_bradley_terry
+from app.rec_service.tourney import Tourney
+from tests.helpers import PopularityJudge, make_song
+
+
+def simulate(true_strengths, games, rng):
+    players = len(true_strengths)
+    first = rng.integers(0, players, games)
+    second = (first + rng.integers(1, players, games)) % players
+    p_first = np.exp(true_strengths[first]) / (np.exp(true_strengths[first]) + np.exp(true_strengths[second]))
+    first_wins = rng.random(games) < p_first
+    return np.where(first_wins, first, second), np.where(first_wins, second, first)
+
+
+def test_two_players_match_closed_form():
+    ratings = fit_bradley_terry(2, [0, 0, 0, 1], [1, 1, 1, 0], prior_games=0.0, tol=1e-10)
+    assert ratings.strengths[0] - ratings.strengths[1] == pytest.approx(np.log(3), abs=1e-6)
+
+
+def test_recovers_strength_order():
+    rng = np.random.default_rng(0)
+    true_strengths = np.linspace(-2, 2, 20)
+    winners, losers = simulate(true_strengths, 4000, rng)
+    ratings = fit_bradley_terry(20, winners, losers)
+
+    assert np.corrcoef(ratings.strengths, true_strengths)[0, 1] > 0.98
+    assert set(ratings.top_k(3)) == {17, 18, 19}
+    assert ratings.comparisons == 4000
+
+
+def test_prior_keeps_unbeaten_finite_and_errors_shrink_with_games():
+    few = fit_bradley_terry(3, [0, 0], [1, 2])
+    assert np.all(np.isfinite(few.strengths))
+    assert few.strengths[0] == few.strengths.max()
+
+    rng = np.random.default_rng(1)
+    true_strengths = np.array([1.0, 0.0, -1.0])
+    winners, losers = simulate(true_strengths, 600, rng)
+    many = fit_bradley_terry(3, winners, losers)
+    assert np.all(many.std_errors < few.std_errors)
+
+
+def test_separation():
+    rng = np.random.default_rng(2)
+    winners, losers = simulate(np.array([3.0, 3.0, -3.0, -3.0]), 400, rng)
+    ratings = fit_bradley_terry(4, winners, losers)
+    assert ratings.separated(2, z=1.64)
+    # The two strong players are a coin flip apart
+    assert not ratings.separated(1, z=1.64)
+    assert ratings.separated(4, z=1.64)
+
+
+@pytest.mark.asyncio
+async def test_tourney_ranks_by_bradley_terry(monkeypatch):
+    judge = PopularityJudge()
+    monkeypatch.setattr("app.rec_service.tourney.gemini_service", judge)
+    tourney = Tourney([make_song(i) for i in range(16)], "", use_alternating_services=False, aggregation="bradley_terry")
+
+    results = await tourney.run_tourney(num_recommendations=5)
+
+    assert results[0][0].title == "Song 15"
+    assert sum(probability for _song, probability in results) == pytest.approx(100)
+    assert len(tourney.comparisons) == judge.calls == 3 * 15
+    assert min(tourney.final_rankings.values()) == 0
+    assert all(error > 0 for error in tourney.rating_errors.values())
+
+
+@pytest.mark.asyncio
+async def test_tourney_stops_once_top_separates(monkeypatch):
+    judge = PopularityJudge()
+    monkeypatch.setattr("app.rec_service.tourney.gemini_service", judge)
+    monkeypatch.setattr("app.core.config.settings.TOURNEY_SEPARATION_Z", 0.0)
+    monkeypatch.setattr("app.core.config.settings.TOURNEY_SEPARATION_CHECK_EVERY", 4)
+    stops = TOURNEY_EARLY_STOPS.labels().value
+    tourney = Tourney(
+        [make_song(i) for i in range(32)], "", num_tournaments=3, use_alternating_services=False,
+        aggregation="bradley_terry",
+    )
+
+    results = await tourney.run_tourney(num_recommendations=1)
+
+    assert tourney.separated
+    assert judge.calls < 3 * 31
+    assert TOURNEY_EARLY_STOPS.labels().value == stops + 1
+    assert len(results) == 1
+    assert not tourney.pending_songs
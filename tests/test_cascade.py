@@ -0,0 +1,103 @@
+import asyncio
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+import numpy as np
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.models.song import Pool_Song
+from app.rec_service.cascade import affinity_scores, blend, cascade_shortlist, shortlist
+from app.rec_service.local_judge import LocalJudge
+from app.rec_service.pool_planner import MAX_FETCHED_SONGS, PoolPlanner
+from app.rec_service.recommendation import RecommendationService, RequestContext
+from benchmarks.fakes import LatencyModel, install_fakes, make_fake_services
+
+
+def make_song(index: int, artist: str = None, popularity: int = 50, genre: str = None) -> Pool_Song:
+    return Pool_Song(
+        title=f"Song {index}", artist=artist or f"Artist {index}", album="Album", img_link="",
+        spotify_link=f"https://open.spotify.com/track/{index}", popularity_score=popularity,
+        duration_ms=210000, release_date="2015-01-01", genre=genre,
+    )
+
+
+def test_shortlist_keeps_best_songs_with_artist_cap():
+    songs = [make_song(i, artist="Same" if i < 5 else None) for i in range(10)]
+    scores = np.array([1.0, 0.99, 0.98, 0.97, 0.96, 0.5, 0.4, 0.3, 0.2, 0.1])
+    kept = shortlist(songs, scores, size=4, max_per_artist=2)
+    assert kept == [songs[0], songs[1], songs[5], songs[6]]
+    # The cap is relaxed only when there are not enough other artists
+    assert len(shortlist(songs[:5], scores[:5], size=4, max_per_artist=2)) == 4
+
+
+def test_affinity_boosts_the_users_artists():
+    songs = [make_song(0, artist="Loved Band"), make_song(1, artist="Stranger, Loved Band"), make_song(2)]
+    affinity = affinity_scores(songs, {"loved band": 2.0, "other": 1.0})
+    assert affinity.tolist() == [1.0, 1.0, 0.0]
+
+    kept, local_scores = cascade_shortlist(
+        songs, LocalJudge(), size=1, artist_weights={"loved band": 1.0}, affinity_weight=0.5
+    )
+    assert kept[0].artist in ("Loved Band", "Stranger, Loved Band")
+    assert set(local_scores) == set(songs)
+
+
+@pytest.mark.asyncio
+async def test_prerank_uses_the_requests_own_artist_weights_and_genres():
+    services = make_fake_services(LatencyModel(kind="fixed", median_s=0), LatencyModel(kind="fixed", median_s=0), seed=0)
+    with ExitStack() as patches:
+        install_fakes(patches, services)
+        service = RecommendationService()
+        user_context, artist_weights = await service.get_user_context("session")
+    assert user_context["genres"] == ["indie", "pop"]
+    assert artist_weights and all(name == name.lower() for name in artist_weights)
+
+    songs = [make_song(0, artist="Folk Duo", genre="indie folk"), make_song(1, artist="Loud Band", genre="metal")]
+    folk_fan = RequestContext(
+        image_analysis={"energy_level": "low", "genres": ["folk"]}, artist_weights={"folk duo": 1.0}
+    )
+    metal_fan = RequestContext(
+        image_analysis={"energy_level": "high", "genres": ["metal"]}, artist_weights={"loud band": 1.0}
+    )
+    # Shortlists of interleaved requests follow their own context
+    for _ in range(2):
+        assert service.cascade_shortlist(folk_fan, songs, size=1)[0] == [songs[0]]
+        assert service.cascade_shortlist(metal_fan, songs, size=1)[0] == [songs[1]]
+
+
+def test_blend_stays_on_engine_scale():
+    songs = [make_song(i) for i in range(3)]
+    engine = {songs[0]: 4.0, songs[1]: 3.9, songs[2]: 1.0}
+    local = {songs[0]: 0.1, songs[1]: 0.9, songs[2]: 0.5}
+    blended = blend(engine, local, weight=0.25)
+    assert max(blended.values()) <= 4.0
+    # A clear local preference breaks a near tie in the engine's scores
+    assert blended[songs[1]] > blended[songs[0]]
+    assert blended[songs[2]] < blended[songs[0]]
+    assert blend(engine, local, weight=0) == engine
+
+
+def test_cascade_plan_fetches_everything_and_keeps_budgeted_shortlist():
+    planner = PoolPlanner(judge_latency_s=1.0)
+    plain = planner.plan("tourney", latency_budget_s=5)
+    cascade = planner.plan("tourney", latency_budget_s=5, cascade=True)
+    assert cascade.cascade and cascade.pool_size == plain.pool_size == 32
+    assert sum(cascade.source_targets.values()) >= MAX_FETCHED_SONGS
+    assert sum(plain.source_targets.values()) < sum(cascade.source_targets.values())
+
+
+def test_cascade_request_end_to_end():
+    from benchmarks.load_benchmark import parse_args, run_load
+    args = parse_args([
+        "--users", "1", "--requests", "1", "--llm-median-s", "0.001", "--spotify-median-s", "0.001",
+        "--cascade", "--llm-call-budget", "45",
+    ])
+    report = asyncio.run(run_load(args))
+    assert report["results"]["status_codes"] == {"200": 1}
+    # 3 brackets over a 16-song shortlist, plus the context calls
+    assert report["results"]["calls"]["gemini"]["judge"] <= 45
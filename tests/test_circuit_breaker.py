@@ -0,0 +1,92 @@
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.core.metrics import BREAKER_STATE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    options = dict(window_s=10, min_calls=4, failure_rate=0.5, open_s=5, half_open_probes=2, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker("test", "judge", **options)
+
+
+def test_opens_on_error_rate_after_min_calls():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert BREAKER_STATE.labels(service="test", call="judge").value == 2
+    assert 0 < breaker.retry_after_s() <= 5
+
+
+def test_slow_calls_count_as_failures():
+    clock = FakeClock()
+    breaker = make_breaker(clock, slow_call_s=2.0)
+    for _ in range(4):
+        breaker.record(True, 3.0)
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    clock.now += 11
+    breaker.record(False, 0.1)
+    for _ in range(3):
+        breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probes_close_or_reopen():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    clock.now += 5
+    assert breaker.state == HALF_OPEN
+    # Only half_open_probes trial calls are let through
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+    clock.now += 5
+    assert breaker.allow() and breaker.allow()
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert BREAKER_STATE.labels(service="test", call="judge").value == 0
+
+
+def test_cancelled_probe_frees_its_slot():
+    clock = FakeClock()
+    breaker = make_breaker(clock, half_open_probes=1)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    clock.now += 5
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
@@ -0,0 +1,124 @@
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.circuit_breaker import reset_breakers
+from app.rec_service.tourney import Tourney
+from tests.helpers import make_song
+
+
+class GatedJudge:
+    """Picks the more popular song; matchups between gated songs wait for release"""
+    def __init__(self, gated=(), error: Exception = None):
+        self.gated = set(gated)
+        self.error = error
+        self.release = asyncio.Event()
+        self.calls = []
+
+    async def get_recommendation(self, song_1, song_2, prompt_template):
+        self.calls.append((song_1.popularity_score, song_2.popularity_score))
+        if {song_1.popularity_score, song_2.popularity_score} <= self.gated:
+            await self.release.wait()
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return 0 if song_1.popularity_score >= song_2.popularity_score else 1
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+def use_judge(monkeypatch, judge):
+    monkeypatch.setattr("app.rec_service.tourney.gemini_service", judge)
+    monkeypatch.setattr("app.rec_service.tourney.openai_service", judge)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 2, 5, 8, 13])
+async def test_placements_match_round_by_round_bracket(monkeypatch, size):
+    judge = GatedJudge()
+    use_judge(monkeypatch, judge)
+    tourney = Tourney([make_song(i) for i in range(size)], "", num_tournaments=1, use_alternating_services=False)
+    tourney.pending_songs[0] = []
+
+    results = await tourney._run_single_tourney(list(tourney.pool), 0)
+
+    assert len(results) == size
+    assert len(judge.calls) == size - 1
+    # The most popular song wins every matchup it plays
+    assert max(results, key=results.get).popularity_score == size - 1
+    # As many songs knocked out at each level as a round-by-round bracket of this size
+    expected, remaining, level = Counter(), size, 1
+    while remaining > 1:
+        expected[2 * level - 1] += remaining // 2
+        remaining -= remaining // 2
+        level += 1
+    expected[2 * level - 1] += 1
+    assert Counter(results.values()) == expected
+    assert not tourney.pending_songs
+
+
+@pytest.mark.asyncio
+async def test_next_level_starts_before_slow_matchup_resolves(monkeypatch):
+    judge = GatedJudge(gated={0, 1})
+    use_judge(monkeypatch, judge)
+    tourney = Tourney([make_song(i) for i in range(8)], "", num_tournaments=1, use_alternating_services=False)
+    tourney.pending_songs[0] = []
+    bracket = asyncio.create_task(tourney._run_single_tourney(list(tourney.pool), 0))
+
+    # The other three level-1 winners pair up while 0 vs 1 is still pending
+    for _ in range(100):
+        if any(set(call) == {3, 5} or set(call) == {3, 7} or set(call) == {5, 7} for call in judge.calls):
+            break
+        await asyncio.sleep(0)
+    else:
+        pytest.fail(f"No level-2 matchup started before the slow one resolved: {judge.calls}")
+    assert not bracket.done()
+
+    judge.release.set()
+    results = await bracket
+    assert results[make_song(7)] == 7
+    assert len(judge.calls) == 7
+
+
+@pytest.mark.asyncio
+async def test_late_song_joins_running_bracket(monkeypatch):
+    judge = GatedJudge(gated={0, 1})
+    use_judge(monkeypatch, judge)
+    tourney = Tourney([make_song(i) for i in range(4)], "", num_tournaments=1, use_alternating_services=False)
+    tourney.pending_songs[0] = []
+    bracket = asyncio.create_task(tourney._run_single_tourney(list(tourney.pool), 0))
+
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert tourney.admit(make_song(9))
+    judge.release.set()
+    results = await bracket
+
+    # Picked up when the slow matchup resolves, the late song skips to level 2 and wins
+    assert len(results) == 5
+    assert max(results, key=results.get).title == "Song 9"
+    assert results[make_song(0)] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_matchup_cancels_the_bracket(monkeypatch):
+    judge = GatedJudge(gated={0, 1}, error=RuntimeError("judge down"))
+    use_judge(monkeypatch, judge)
+    tourney = Tourney([make_song(i) for i in range(4)], "", num_tournaments=1, use_alternating_services=False)
+    tourney.pending_songs[0] = []
+
+    with pytest.raises(RuntimeError, match="judge down"):
+        await tourney._run_single_tourney(list(tourney.pool), 0)
+    assert not tourney.pending_songs
@@ -0,0 +1,63 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from app.utils.file_handlers import read_upload, sanitize_filename
+from app.utils.image_processing import preprocess_image
+
+
+def make_upload(data: bytes, filename: str = "photo.jpg") -> UploadFile:
+    spooled = SpooledTemporaryFile(max_size=1024)
+    spooled.write(data)
+    spooled.seek(0)
+    return UploadFile(file=spooled, size=len(data), filename=filename)
+
+
+def test_sanitize_filename():
+    assert sanitize_filename("../../etc/passwd") == "passwd"
+    assert sanitize_filename("..\\..\\boot.ini") == "boot.ini"
+    assert sanitize_filename("my photo (1).HEIC") == "my_photo__1_.HEIC"
+    assert sanitize_filename(".hidden") == "hidden"
+    assert sanitize_filename(None) == "upload"
+
+
+def test_upload_is_read_once_into_bytes():
+    upload = asyncio.run(read_upload(make_upload(b"x" * 100), max_bytes=1000))
+    assert upload.data == b"x" * 100
+    assert upload.size == 100
+
+
+def test_oversized_upload_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_upload(make_upload(b"x" * 2000), max_bytes=1000))
+    assert error.value.status_code == 413
+
+
+def test_oversized_upload_of_unknown_size_is_rejected():
+    upload = make_upload(b"x" * 2000)
+    upload.size = None
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_upload(upload, max_bytes=1000))
+    assert error.value.status_code == 413
+
+
+def test_upload_rolled_over_to_disk_is_read_whole():
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), (10, 200, 30)).save(buffer, format="JPEG")
+    photo = buffer.getvalue()
+
+    # The spooled file is past its 1 KiB memory limit, so Starlette's copy is on disk
+    upload = asyncio.run(read_upload(make_upload(photo), max_bytes=10 ** 7))
+    assert upload.data == photo
+    prepared = preprocess_image(upload.data, max_edge=400)
+    assert (prepared.width, prepared.height) == (400, 300)
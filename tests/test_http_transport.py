@@ -0,0 +1,107 @@
+import asyncio
+import sys
+from pathlib import Path
+import pytest
+import pytest_asyncio
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import httpx
+import spotipy
+from aiohttp import web
+from app.core.config import settings
+from app.core.http_transport import HttpTransport
+
+
+@pytest_asyncio.fixture
+async def server():
+    """Local HTTP server recording the client port of every request, one port per connection"""
+    ports = []
+
+    async def handle(request):
+        ports.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_route("*", "/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/", ports
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_warmed_connections_are_reused(server, monkeypatch):
+    url, ports = server
+    monkeypatch.setattr(settings, "HTTP_WARM_CONNECTIONS", True)
+    transport = HttpTransport()
+    transport.add_warm_url("weather", "aiohttp", url)
+    transport.add_warm_url("openai", "httpx", url)
+    transport.add_warm_url("spotify", "requests", url)
+    openai_transport = transport.httpx_transport("openai")
+    spotify_session = transport.requests_session("spotify")
+
+    await transport.start()
+    assert len(ports) == 3
+
+    for _ in range(3):
+        async with transport.aiohttp_session().get(url) as response:
+            await response.read()
+        async with httpx.AsyncClient(transport=openai_transport) as client:
+            await client.get(url)
+        await asyncio.to_thread(spotify_session.get, url)
+    # Three clients, one connection each, opened at startup
+    assert len(ports) == 12
+    assert len(set(ports)) == 3
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_warm_up_does_not_fail_startup(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_WARM_CONNECTIONS", True)
+    transport = HttpTransport(warm_timeout_s=0.5)
+    transport.add_warm_url("weather", "aiohttp", "http://127.0.0.1:1/")
+    transport.add_warm_url("openai", "httpx", "http://127.0.0.1:1/")
+    transport.httpx_transport("openai")
+    await transport.start()
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_session_is_shared_and_closed():
+    transport = HttpTransport()
+    session = transport.aiohttp_session()
+    assert transport.aiohttp_session() is session
+    await transport.close()
+    assert session.closed
+
+
+def test_spotipy_client_does_not_close_shared_session():
+    transport = HttpTransport()
+    session = transport.requests_session("spotify")
+    assert transport.requests_session("spotify") is session
+    pools = session.get_adapter("https://api.spotify.com/").poolmanager.pools
+    session.get_adapter("https://api.spotify.com/").poolmanager.connection_from_url("https://api.spotify.com/")
+
+    client = spotipy.Spotify(auth="token", requests_session=session)
+    del client
+    assert len(pools) == 1
+
+    session.shutdown()
+    assert len(pools) == 0
+
+
+def test_sdk_clients_use_the_shared_transports():
+    from app.core.http_transport import http_transport
+    from app.services.service_instances import gemini_service, openai_service
+
+    assert openai_service.client._client._transport is http_transport.httpx_transport("openai")
+    api_client = gemini_service.client._api_client
+    assert api_client._async_httpx_client._transport is http_transport.httpx_transport("gemini")
+    assert not api_client._use_aiohttp()
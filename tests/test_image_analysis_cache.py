@@ -0,0 +1,109 @@
+import io
+import sys
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import numpy as np
+from PIL import Image
+from app.rec_service.image_analysis_cache import ImageAnalysisCache
+from app.rec_service.recommendation import RecommendationService
+from app.utils.image_processing import hamming_distance, preprocess_image
+
+
+def make_photo(seed: int, brightness: int = 0, size=(1600, 1200)) -> bytes:
+    rng = np.random.default_rng(seed)
+    # Smooth gradients plus coarse blocks, like a real photo rather than noise
+    blocks = rng.integers(0, 200, (6, 8, 3), dtype=np.uint8)
+    pixels = np.kron(blocks, np.ones((size[1] // 6, size[0] // 8, 1), dtype=np.uint8))
+    pixels = np.clip(pixels.astype(np.int16) + brightness, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def test_near_identical_photos_have_close_hashes():
+    original = preprocess_image(make_photo(1)).dhash
+    brighter = preprocess_image(make_photo(1, brightness=15)).dhash
+    recompressed = preprocess_image(preprocess_image(make_photo(1), quality=40).data).dhash
+    different = preprocess_image(make_photo(2)).dhash
+    assert hamming_distance(original, brighter) <= 6
+    assert hamming_distance(original, recompressed) <= 6
+    assert hamming_distance(original, different) > 6
+
+
+def test_cache_is_scoped_per_user_and_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.rec_service.image_analysis_cache.time.monotonic", lambda: clock[0])
+    cache = ImageAnalysisCache(ttl_s=60, max_distance=6, max_entries_per_user=2)
+    analysis = {"mood": "calm"}
+
+    cache.put("user-a", 0b1111, analysis)
+    assert cache.get("user-a", 0b0111) == analysis
+    assert cache.get("user-b", 0b1111) is None
+    assert cache.get("user-a", None) is None
+
+    clock[0] += 61
+    assert cache.get("user-a", 0b1111) is None
+    assert "user-a" not in cache.entries
+
+
+def test_cache_keeps_most_recent_entries():
+    cache = ImageAnalysisCache(ttl_s=60, max_distance=0, max_entries_per_user=2)
+    for dhash in (1, 2, 4):
+        cache.put("user", dhash, {"hash": dhash})
+    assert cache.get("user", 1) is None
+    assert cache.get("user", 4) == {"hash": 4}
+
+
+def test_cache_is_bounded_across_users(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.rec_service.image_analysis_cache.time.monotonic", lambda: clock[0])
+    cache = ImageAnalysisCache(ttl_s=60, max_distance=0, max_entries_per_user=2, max_users=2)
+
+    for user in ("user-a", "user-b", "user-c"):
+        cache.put(user, 1, {"user": user})
+    # The least recently used user is dropped beyond max_users
+    assert len(cache.entries) == 2
+    assert cache.get("user-a", 1) is None
+    assert cache.get("user-c", 1) == {"user": "user-c"}
+
+    # Abandoned users expire without ever being read again
+    clock[0] += 61
+    cache.put("user-d", 1, {"user": "user-d"})
+    assert list(cache.entries) == ["user-d"]
+
+
+class CountingVision:
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_image(self, image_data, track_titles_and_artists, artist_names, mime_type="image/jpeg"):
+        self.calls += 1
+        return {"mood": "calm"}
+
+
+@pytest.mark.asyncio
+async def test_sessions_of_one_user_share_cached_analyses():
+    service = RecommendationService()
+    vision = CountingVision()
+    service.open_ai_service = vision
+
+    async def get_user_id(session_id):
+        return {"before login": "user", "after login": "user"}.get(session_id)
+
+    service.get_user_id = get_user_id
+    photo = make_photo(1)
+
+    assert await service.get_image_analysis(photo, "before login") == {"mood": "calm"}
+    # A new login brings a new session, but the same user sending the same photo is served from the cache
+    assert await service.get_image_analysis(photo, "after login") == {"mood": "calm"}
+    assert vision.calls == 1
+    # Without a user id the session keys the cache
+    await service.get_image_analysis(photo, "unknown session")
+    assert vision.calls == 2
+    assert set(service.image_analysis_cache.entries) == {"user", "unknown session"}
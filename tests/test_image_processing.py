@@ -0,0 +1,41 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from PIL import Image
+from app.utils.image_processing import detect_mime, prepare_image, preprocess_image
+
+
+def make_photo(width: int, height: int, orientation: int = 1) -> bytes:
+    image = Image.new("RGB", (width, height), (200, 120, 40))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def test_downscales_and_applies_exif_orientation():
+    # Orientation 6 means the camera was rotated 90 degrees, so the upright image is portrait
+    prepared = preprocess_image(make_photo(4000, 3000, orientation=6), max_edge=1024, image_format="JPEG", quality=80)
+    assert (prepared.width, prepared.height) == (768, 1024)
+    assert prepared.mime_type == "image/jpeg"
+    assert len(prepared.data) < prepared.original_size
+    assert detect_mime(prepared.data) == "image/jpeg"
+
+
+def test_webp_output_and_small_images_are_not_upscaled():
+    prepared = preprocess_image(make_photo(300, 200), max_edge=1024, image_format="WEBP", quality=80)
+    assert (prepared.width, prepared.height) == (300, 200)
+    assert prepared.mime_type == "image/webp"
+
+
+def test_undecodable_upload_is_passed_through():
+    prepared = asyncio.run(prepare_image(b"not an image"))
+    assert prepared.data == b"not an image"
@@ -0,0 +1,126 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.metrics import EXTERNAL_CALL_RETRIES
+from app.core.prompt_registry import prompt_registry
+from app.services.fake_llm_provider import FakeLLMProvider
+from app.services.gemini_service import GeminiService
+from app.services.llm_provider import is_retryable, parse_timeouts
+from app.services.open_ai_service import OpenAIService
+from tests.helpers import make_song
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def judge_template():
+    return prompt_registry.get("song_recommendation.txt").partial(
+        weather_data="{}", user_context="{}", image_analysis="{}"
+    )
+
+
+def fast_provider(**kwargs) -> FakeLLMProvider:
+    kwargs.setdefault("retry_base_wait_s", 0.001)
+    kwargs.setdefault("retry_max_wait_s", 0.001)
+    return FakeLLMProvider(**kwargs)
+
+
+def test_parse_timeouts_and_retryable_errors():
+    assert parse_timeouts("judge=8, vision=20.5,bad") == {"judge": 8.0, "vision": 20.5}
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(HTTPError(429))
+    assert is_retryable(HTTPError(503))
+    assert not is_retryable(HTTPError(400))
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+@pytest.mark.asyncio
+async def test_fake_provider_is_deterministic():
+    provider = fast_provider()
+    template = judge_template()
+    first = [await provider.get_recommendation(make_song(i), make_song(i + 1), template) for i in range(10)]
+    second = [await provider.get_recommendation(make_song(i), make_song(i + 1), template) for i in range(10)]
+    assert first == second
+    assert set(first) == {0, 1}
+    assert await provider.generate_fitness_scores(make_song(1), {}, {}, {}) == \
+        await provider.generate_fitness_scores(make_song(1), {}, {}, {})
+
+
+@pytest.mark.asyncio
+async def test_judge_parses_winner_and_falls_back_on_invalid_json():
+    template = judge_template()
+    assert await fast_provider(responses={"judge": '{"winner": "2"}'}).get_recommendation(make_song(1), make_song(2), template) == 1
+    assert await fast_provider(responses={"judge": '{"winner": 1}'}).get_recommendation(make_song(1), make_song(2), template) == 0
+    assert await fast_provider(responses={"judge": "Song 1, clearly"}).get_recommendation(make_song(1), make_song(2), template) == 0
+    assert await fast_provider(responses={"fitness": "not json"}).generate_fitness_scores(make_song(1), {}, {}, {}) == 0
+    assert await fast_provider(responses={"user_context": "[]"}).generate_user_context("x", [], [], [], [], [], [], []) == {}
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    before = EXTERNAL_CALL_RETRIES.labels(service="fake", call="judge").value
+    provider = fast_provider(failures=[HTTPError(429), HTTPError(503)], responses={"judge": '{"winner": "2"}'})
+    assert await provider.get_recommendation(make_song(1), make_song(2), judge_template()) == 1
+    assert len(provider.requests) == 3
+    assert EXTERNAL_CALL_RETRIES.labels(service="fake", call="judge").value == before + 2
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_are_not_retried():
+    provider = fast_provider(failures=[HTTPError(400)])
+    with pytest.raises(HTTPError):
+        await provider.generate_fitness_scores(make_song(1), {}, {}, {})
+    assert len(provider.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_hung_call_times_out_per_attempt():
+    provider = fast_provider(latency_s=1.0, timeouts={"judge": 0.02}, max_attempts=2)
+    start = asyncio.get_running_loop().time()
+    with pytest.raises(asyncio.TimeoutError):
+        await provider.get_recommendation(make_song(1), make_song(2), judge_template())
+    assert asyncio.get_running_loop().time() - start < 0.5
+    assert len(provider.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_openai_builds_vision_request():
+    service = OpenAIService()
+    response = MagicMock()
+    response.choices[0].message.content = '{"mood": "calm", "genres": ["folk"]}'
+    service.client = MagicMock()
+    service.client.chat.completions.create = AsyncMock(return_value=response)
+
+    analysis = await service.analyze_image(b"not-an-image", ["Song - Artist"], ["Artist"], mime_type="image/webp")
+
+    assert analysis["mood"] == "calm" and analysis["genres"] == ["folk"]
+    messages = service.client.chat.completions.create.call_args.kwargs["messages"]
+    assert len(messages) == 1
+    assert messages[0]["content"][-1]["image_url"]["url"].startswith("data:image/webp;base64,")
+
+
+@pytest.mark.asyncio
+async def test_gemini_vision_uses_async_client():
+    service = GeminiService()
+    response = MagicMock()
+    response.text = '{"mood": "bright", "energy_level": "high"}'
+    service.client = MagicMock()
+    service.client.aio.models.generate_content = AsyncMock(return_value=response)
+    service.client.models.generate_content = MagicMock(side_effect=AssertionError("sync client used"))
+
+    analysis = await service.analyze_image(b"not-an-image", [], [], mime_type="image/jpeg")
+
+    assert analysis["mood"] == "bright" and analysis["energy_level"] == "high"
+    contents = service.client.aio.models.generate_content.call_args.kwargs["contents"]
+    assert contents[-1].inline_data.mime_type == "image/jpeg"
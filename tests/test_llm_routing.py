@@ -0,0 +1,128 @@
+import asyncio
+import sys
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.circuit_breaker import OPEN, CircuitOpenError, get_breaker, reset_breakers
+from app.core.metrics import LLM_HEDGES, LLM_HEDGE_WINS, LLM_REROUTES
+from app.services.llm_routing import route_call
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+class SlowProvider:
+    def __init__(self, name: str, latency_s: float, answer=None, error: Exception = None):
+        self.name = name
+        self.latency_s = latency_s
+        self.answer = answer
+        self.error = error
+        self.started = 0
+        self.cancelled = 0
+
+    async def judge(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.latency_s)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def judge(provider):
+    return provider.judge()
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    primary, backup = SlowProvider("p", 0.0, answer=0), SlowProvider("b", 0.0, answer=1)
+    assert await route_call("judge", primary, backup, judge, hedge_after_s=0.5) == 0
+    assert backup.started == 0
+
+
+@pytest.mark.asyncio
+async def test_no_threshold_calls_primary_only():
+    primary, backup = SlowProvider("p", 0.05, answer=0), SlowProvider("b", 0.0, answer=1)
+    assert await route_call("unhedged_call", primary, backup, judge) == 0
+    assert backup.started == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    hedges = LLM_HEDGES.labels(call="judge", provider="b").value
+    wins = LLM_HEDGE_WINS.labels(call="judge", winner="hedge").value
+    primary, backup = SlowProvider("p", 5.0, answer=0), SlowProvider("b", 0.01, answer=1)
+
+    start = asyncio.get_running_loop().time()
+    assert await route_call("judge", primary, backup, judge, hedge_after_s=0.02) == 1
+    assert asyncio.get_running_loop().time() - start < 1.0
+    assert primary.cancelled == 1
+    assert LLM_HEDGES.labels(call="judge", provider="b").value == hedges + 1
+    assert LLM_HEDGE_WINS.labels(call="judge", winner="hedge").value == wins + 1
+
+
+@pytest.mark.asyncio
+async def test_primary_can_still_win_after_hedging():
+    primary, backup = SlowProvider("p", 0.05, answer=0), SlowProvider("b", 5.0, answer=1)
+    assert await route_call("judge", primary, backup, judge, hedge_after_s=0.01) == 0
+    assert backup.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_answer_does_not_win():
+    primary = SlowProvider("p", 0.0, error=RuntimeError("HTTP 500"))
+    backup = SlowProvider("b", 0.01, answer=1)
+    assert await route_call("judge", primary, backup, judge, hedge_after_s=1.0) == 1
+
+    failing_backup = SlowProvider("b", 0.0, error=ValueError("bad"))
+    with pytest.raises(RuntimeError):
+        await route_call("judge", SlowProvider("p", 0.0, error=RuntimeError("HTTP 500")), failing_backup, judge, hedge_after_s=1.0)
+
+
+@pytest.mark.asyncio
+async def test_failed_call_falls_back_without_hedging():
+    reroutes = LLM_REROUTES.labels(call="fitness", provider="p").value
+    primary = SlowProvider("p", 0.0, error=RuntimeError("HTTP 500"))
+    backup = SlowProvider("b", 0.0, answer=42)
+    assert await route_call("fitness", primary, backup, judge) == 42
+    assert LLM_REROUTES.labels(call="fitness", provider="p").value == reroutes + 1
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_routes_to_healthy_provider():
+    primary = SlowProvider("p", 0.0, error=RuntimeError("HTTP 503"))
+    backup = SlowProvider("b", 0.0, answer=1)
+    for _ in range(get_breaker("p", "judge").min_calls):
+        assert await route_call("judge", primary, backup, judge) == 1
+    assert get_breaker("p", "judge").state == OPEN
+
+    started = primary.started
+    assert await route_call("judge", primary, backup, judge) == 1
+    # The open provider is not called at all
+    assert primary.started == started
+
+
+@pytest.mark.asyncio
+async def test_both_breakers_open_fails_fast():
+    primary = SlowProvider("p", 0.0, answer=0)
+    backup = SlowProvider("b", 0.0, answer=1)
+    for name in ("p", "b"):
+        breaker = get_breaker(name, "judge")
+        for _ in range(breaker.min_calls):
+            breaker.record(False, 0.0)
+    with pytest.raises(CircuitOpenError) as exc_info:
+        await route_call("judge", primary, backup, judge)
+    assert exc_info.value.retry_after_s > 0
+    assert primary.started == backup.started == 0
@@ -0,0 +1,36 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from benchmarks.load_benchmark import parse_args, percentile, run_load
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+def test_load_benchmark_with_fakes():
+    args = parse_args(["--users", "2", "--requests", "2", "--llm-median-s", "0.001", "--spotify-median-s", "0.001"])
+    report = asyncio.run(run_load(args))
+    results = report["results"]
+    assert results["status_codes"] == {"200": 2}
+    assert results["llm_calls_per_request"] > 0
+    assert results["calls"]["gemini"]["judge"] > 0
+    assert results["p50_s"] <= results["p99_s"]
+
+
+def test_load_benchmark_genetic_engine_with_fakes():
+    args = parse_args([
+        "--engine", "genetic", "--users", "2", "--requests", "2", "--llm-median-s", "0.001", "--spotify-median-s", "0.001",
+    ])
+    report = asyncio.run(run_load(args))
+    assert report["results"]["status_codes"] == {"200": 2}
+    assert report["results"]["llm_calls_per_request"] > 0
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.circuit_breaker import reset_breakers
+from app.models.song import Pool_Song
+from app.rec_service.local_judge import FEATURES, LocalJudge
+from app.rec_service.tourney import Tourney
+from app.services.llm_routing import route_call
+from app.services.spotify_service import SpotifyService
+
+
+def make_song(title: str, popularity=50, release_date="2015-01-01", duration_ms=210000, genre=None) -> Pool_Song:
+    return Pool_Song(
+        title=title, artist=f"{title} artist", album="Album", img_link="", spotify_link=f"https://open.spotify.com/track/{title}",
+        popularity_score=popularity, release_date=release_date, duration_ms=duration_ms, genre=genre,
+    )
+
+
+@pytest.mark.asyncio
+async def test_prefers_less_popular_of_otherwise_equal_songs():
+    judge = LocalJudge()
+    hit = make_song("hit", popularity=90)
+    deep_cut = make_song("deep cut", popularity=10)
+    assert await judge.get_recommendation(deep_cut, hit) == 0
+    assert await judge.get_recommendation(hit, deep_cut) == 1
+    assert judge.margin(deep_cut, hit) > 0
+    assert 0 <= await judge.generate_fitness_scores(hit) < await judge.generate_fitness_scores(deep_cut) <= 100
+
+
+@pytest.mark.asyncio
+async def test_context_outweighs_popularity():
+    judge = LocalJudge(image_analysis={"energy_level": "low", "genres": ["folk"]})
+    fitting_hit = make_song("fitting hit", popularity=95, genre="folk")
+    obscure_misfit = make_song("obscure misfit", popularity=5, genre="metal")
+    assert await judge.get_recommendation(fitting_hit, obscure_misfit) == 0
+
+
+@pytest.mark.asyncio
+async def test_context_genres_and_energy_change_the_verdict():
+    metal = make_song("metal", genre="metal")
+    folk = make_song("folk", genre="folk, acoustic")
+    calm = LocalJudge(image_analysis={"mood": "calm", "energy_level": "low", "genres": ["folk"]})
+    loud = LocalJudge(image_analysis={"mood": "intense", "energy_level": "high", "genres": ["metal"]})
+    assert await calm.get_recommendation(metal, folk) == 1
+    assert await loud.get_recommendation(metal, folk) == 0
+    # Compacted JSON context (what the GA passes) behaves like the dict
+    compact = json.dumps({"energy_level": "low", "genres": ["folk"]})
+    assert await LocalJudge().generate_fitness_scores(folk, "{}", "{}", compact) == \
+        await LocalJudge(image_analysis={"energy_level": "low", "genres": ["folk"]}).generate_fitness_scores(folk)
+
+
+class StubSpotify:
+    """Answers the two spotipy calls get_user_top_tracks makes, in Spotify's response shapes"""
+    GENRES = {"a1": ["norwegian black metal"], "a2": ["indie folk", "chamber folk"], "a3": []}
+
+    def __init__(self):
+        self.artist_calls = []
+
+    def current_user_top_tracks(self, time_range, limit):
+        def track(name, artist_id, popularity):
+            return {
+                "name": name, "artists": [{"id": artist_id, "name": f"{name} artist"}], "popularity": popularity,
+                "duration_ms": 210000, "external_urls": {"spotify": f"https://open.spotify.com/track/{name}"},
+                "album": {"name": "Album", "images": [], "release_date": "2015-01-01", "album_type": "album", "id": name},
+            }
+        return {"items": [track("metal", "a1", 50), track("folk", "a2", 50), track("unknown", "a3", 50)]}
+
+    def artists(self, artist_ids):
+        self.artist_calls.append(list(artist_ids))
+        return {"artists": [{"id": artist_id, "genres": self.GENRES[artist_id]} for artist_id in artist_ids]}
+
+
+@pytest.mark.asyncio
+async def test_genre_and_energy_vary_for_songs_from_spotify_service():
+    service = SpotifyService()
+    stub = StubSpotify()
+    service.get_user_spotify_client = lambda session_id: stub
+    metal, folk, unknown = await service.get_user_top_tracks("session", limit=50)
+    assert metal.genre == "norwegian black metal"
+    assert folk.genre == "indie folk, chamber folk"
+    assert unknown.genre == ""
+
+    calm = LocalJudge(image_analysis={"energy_level": "low", "genres": ["folk"]})
+    loud = LocalJudge(image_analysis={"energy_level": "high", "genres": ["metal"]})
+    genre, energy = FEATURES.index("genre"), FEATURES.index("energy")
+    calm_features, loud_features = calm.features([metal, folk, unknown]), loud.features([metal, folk, unknown])
+    assert calm_features[1, genre] == 1.0 and calm_features[0, genre] == 0.0
+    assert loud_features[0, genre] == 1.0 and loud_features[1, genre] == 0.0
+    assert calm_features[1, energy] > calm_features[0, energy]
+    assert loud_features[0, energy] > loud_features[1, energy]
+    assert calm_features[2, genre] == calm_features[2, energy] == 0.5
+    assert await calm.get_recommendation(metal, folk) == 1
+    assert await loud.get_recommendation(metal, folk) == 0
+
+    # Artist genres are cached, so a second fetch makes no artist lookups
+    await service.get_user_top_tracks("session", limit=50)
+    assert stub.artist_calls == [["a1", "a2", "a3"]]
+
+
+def test_scores_are_vectorised_and_fast():
+    judge = LocalJudge(weights={"popularity": 1.0, "recency": 0, "duration": 0, "genre": 0, "energy": 0})
+    songs = [make_song(str(i), popularity=i % 101) for i in range(1000)]
+    start = time.perf_counter()
+    scores = judge.scores(songs)
+    elapsed = time.perf_counter() - start
+    assert scores.shape == (1000,)
+    assert scores[0] == pytest.approx(1.0) and scores[100] == pytest.approx(0.0)
+    assert judge.features(songs).shape == (1000, len(FEATURES))
+    assert elapsed < 0.5
+
+
+def test_rejects_all_zero_weights():
+    with pytest.raises(ValueError):
+        LocalJudge(weights={feature: 0 for feature in FEATURES})
+
+
+class FailingProvider:
+    name = "failing"
+
+    async def get_recommendation(self, song_1, song_2, prompt_template):
+        raise RuntimeError("HTTP 503")
+
+
+@pytest.mark.asyncio
+async def test_local_judge_answers_when_providers_fail():
+    reset_breakers()
+    judge = LocalJudge()
+    hit, deep_cut = make_song("hit", popularity=95), make_song("deep cut", popularity=5)
+    result = await route_call(
+        "judge", FailingProvider(), None, lambda provider: provider.get_recommendation(hit, deep_cut, None), fallback=judge
+    )
+    assert result == 1
+    reset_breakers()
+
+
+@pytest.mark.asyncio
+async def test_tourney_in_local_mode_makes_no_llm_calls():
+    songs = [make_song(str(i), popularity=(i * 37) % 100) for i in range(16)]
+    tourney = Tourney(songs, prompt_template=None, num_tournaments=2, local_judge=LocalJudge(), judge_mode="local")
+    recommendations = await tourney.run_tourney(num_recommendations=3)
+    assert recommendations[0][0].popularity_score == min(song.popularity_score for song in songs)
@@ -0,0 +1,35 @@
+import logging
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.logging_config import RequestIdFilter, SamplingFilter, request_id_var, sampled
+
+
+def make_record(**extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", logging.DEBUG, __file__, 1, "message %s", ("arg",), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_request_id_filter_uses_context():
+    token = request_id_var.set("abc123")
+    try:
+        record = make_record()
+        assert RequestIdFilter().filter(record)
+        assert record.request_id == "abc123"
+    finally:
+        request_id_var.reset(token)
+
+
+def test_sampling_filter_only_thins_tagged_events():
+    sampling = SamplingFilter({"tourney.matchup": 0.0, "genetic.fitness": 1.0})
+    assert sampling.filter(make_record())
+    assert not sampling.filter(make_record(**sampled("tourney.matchup")))
+    assert sampling.filter(make_record(**sampled("genetic.fitness")))
+    assert sampling.filter(make_record(**sampled("other.event")))
@@ -0,0 +1,38 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import pytest
+from app.core.media_pool import MediaPool, MediaPoolSaturated
+from app.core.metrics import MEDIA_POOL_REJECTED, REGISTRY
+
+
+@pytest.mark.asyncio
+async def test_pool_runs_work_and_rejects_when_saturated():
+    pool = MediaPool(max_workers=1, max_queue=1, queue_timeout_s=0.2)
+    await pool.start()
+    rejected = MEDIA_POOL_REJECTED.labels(task="sleep")
+    rejected_before = rejected.value
+    try:
+        assert await pool.run("pow", pow, 2, 10) == 1024
+
+        # One task runs, one waits past the queue timeout, one finds the queue full
+        results = await asyncio.gather(
+            pool.run("sleep", time.sleep, 1.0),
+            pool.run("sleep", time.sleep, 0.0),
+            pool.run("sleep", time.sleep, 0.0),
+            return_exceptions=True,
+        )
+    finally:
+        pool.shutdown()
+
+    assert results[0] is None
+    assert all(isinstance(result, MediaPoolSaturated) for result in results[1:])
+    assert rejected.value == rejected_before + 2
+    assert 'media_task_seconds_count{task="pow",phase="run"} 1' in REGISTRY.render()
@@ -0,0 +1,53 @@
+import pytest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.metrics import MetricsRegistry, REGISTRY, RATE_LIMITED, EXTERNAL_CALL_ERRORS, track_call
+
+
+class RateLimitedError(Exception):
+    status_code = 429
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage latency", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="ranking")
+    histogram.observe(0.5, stage="ranking")
+    histogram.observe(5.0, stage="ranking")
+
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="ranking",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="ranking",le="1.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="ranking",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="ranking"} 3' in text
+
+
+def test_track_call_counts_errors_and_rate_limits():
+    errors = EXTERNAL_CALL_ERRORS.labels(service="spotify", call="test_call")
+    limited = RATE_LIMITED.labels(service="spotify", call="test_call")
+    errors_before, limited_before = errors.value, limited.value
+
+    with pytest.raises(RateLimitedError):
+        with track_call("spotify", "test_call"):
+            raise RateLimitedError()
+
+    assert errors.value == errors_before + 1
+    assert limited.value == limited_before + 1
+    assert 'external_call_seconds_count{service="spotify",call="test_call"}' in REGISTRY.render()
+
+
+def test_metric_types_must_implement_children_and_samples():
+    from app.core.metrics import _Metric
+
+    class Incomplete(_Metric):
+        metric_type = "untyped"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Missing overrides")
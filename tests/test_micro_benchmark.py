@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from benchmarks.micro_benchmark import run_benchmark
+
+
+def test_tourney_uses_n_minus_one_judge_calls_per_bracket():
+    result = run_benchmark("tourney", 64, repeat=1)
+    assert result["judge_calls"] == 3 * 63
+    assert result["peak_kib"] > 0
+
+
+def test_benchmarks_are_deterministic():
+    first = run_benchmark("genetic", 100, seed=1, repeat=1)
+    second = run_benchmark("genetic", 100, seed=1, repeat=1)
+    assert first["fitness_calls"] == second["fitness_calls"]
+    assert run_benchmark("candidate_pool", 500, repeat=1)["judge_calls"] == 0
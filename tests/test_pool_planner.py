@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.rec_service.pool_planner import PoolPlanner, MAX_FETCHED_SONGS
+from app.models.song import Pool_Song
+
+
+def make_song(title: str, artist: str) -> Pool_Song:
+    return Pool_Song(title=title, artist=artist, album="Album", img_link="", spotify_link="")
+
+
+def test_tourney_plan_without_budget_keeps_default_size():
+    planner = PoolPlanner(judge_latency_s=1.0)
+    plan = planner.plan("tourney")
+    assert plan.pool_size == 75
+    assert plan.estimated_llm_calls == 3 * 74
+    # Fetch a little more than we keep, far less than every source's maximum
+    assert plan.pool_size < sum(plan.source_targets.values()) < MAX_FETCHED_SONGS
+
+
+def test_tourney_plan_shrinks_for_budgets():
+    planner = PoolPlanner(judge_latency_s=1.0)
+    assert planner.plan("tourney", latency_budget_s=5).pool_size == 32
+    assert planner.plan("tourney", llm_call_budget=60).pool_size == 21
+    assert planner.plan("tourney", latency_budget_s=5, llm_call_budget=60).pool_size == 21
+
+
+def test_tree_plan_counts_replays(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.TOURNEY_SELECTION", "tree")
+    planner = PoolPlanner(judge_latency_s=1.0)
+    plan = planner.plan("tourney")
+    assert plan.pool_size == 75
+    assert plan.estimated_llm_calls == 74 + 4 * 7
+    assert planner.plan("tourney", llm_call_budget=60).pool_size == 37
+    assert planner.plan("tourney", latency_budget_s=20).pool_size == 16
+
+
+def test_genetic_plan_reduces_generations_for_latency_budget():
+    planner = PoolPlanner(fitness_latency_s=1.0)
+    plan = planner.plan("genetic", latency_budget_s=6)
+    assert plan.ga_generations == 5
+    assert plan.min_pool_size >= plan.ga_population_size
+    assert plan.pool_size >= plan.ga_population_size
+
+
+def test_stratify_spreads_sources_and_artists():
+    planner = PoolPlanner(max_per_artist=2)
+    songs = [make_song(f"A{i}", "Big Artist") for i in range(20)]
+    songs += [make_song(f"B{i}", f"Artist {i}") for i in range(5)]
+    sources = {song: ("top_artists" if song.title.startswith("A") else "saved_tracks") for song in songs}
+
+    kept = planner.stratify(songs, sources, pool_size=6)
+    assert len(kept) == 6
+    assert len(set(kept)) == 6
+    assert sum(1 for song in kept if song.artist == "Big Artist") == 2
+
+
+def test_stratify_relaxes_artist_cap_to_fill_pool():
+    planner = PoolPlanner(max_per_artist=1)
+    songs = [make_song(f"A{i}", "Only Artist") for i in range(10)]
+    kept = planner.stratify(songs, {}, pool_size=4)
+    assert len(kept) == 4
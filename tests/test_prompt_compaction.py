@@ -0,0 +1,41 @@
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.metrics import REGISTRY
+from app.core.prompt_compaction import compact_context, estimate_tokens, record_prompt_tokens
+
+
+def test_compact_context_drops_whitespace_and_empty_fields():
+    context = {
+        "mood": "calm",
+        "genres": ["indie", "", "folk"],
+        "musical_characteristics": {"tempo": "", "instrumentation": []},
+        "energy_level": None,
+    }
+    compact = compact_context(context)
+    assert json.loads(compact) == {"genres": ["indie", "folk"], "mood": "calm"}
+    assert len(compact) < len(json.dumps(context, indent=2)) / 2
+    # Already compacted context passes through unchanged
+    assert compact_context(compact) is compact
+
+
+def test_compact_context_respects_token_budget():
+    context = {"description": "word " * 2000, "genres": [f"genre {i}" for i in range(200)]}
+    compact = compact_context(context, max_tokens=100)
+    assert estimate_tokens(compact) <= 100
+    assert json.loads(compact)["description"].endswith("…")
+
+
+def test_keys_are_sorted_for_a_stable_prompt_prefix():
+    assert compact_context({"b": 1, "a": 2}) == compact_context({"a": 2, "b": 1}) == '{"a":2,"b":1}'
+
+
+def test_prompt_tokens_are_recorded_per_call_type():
+    record_prompt_tokens("gemini", "test_call", "x" * 400)
+    assert 'llm_prompt_tokens_sum{service="gemini",call="test_call"} 100' in REGISTRY.render()
@@ -0,0 +1,51 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import pytest
+from app.core.prompt_registry import PROMPT_FIELDS, PromptRegistry, PromptTemplate, PromptTemplateError
+
+
+def test_shipped_prompts_load_and_validate():
+    registry = PromptRegistry()
+    registry.load()
+    for name in PROMPT_FIELDS:
+        assert registry.get(name).fields == PROMPT_FIELDS[name]
+
+
+def test_format_matches_str_format_and_partial_keeps_json_braces():
+    text = "Context: {context}\n{{literal}} Song: {title} by {artist}"
+    template = PromptTemplate.parse("test.txt", text)
+    values = dict(context="x", title="Song", artist="Artist", unused=1)
+    assert template.format(**values) == text.format(**values)
+
+    partial = template.partial(context='{"mood": "calm"}')
+    assert partial.fields == {"title", "artist"}
+    assert partial.format(title="Song", artist="Artist") == 'Context: {"mood": "calm"}\n{literal} Song: Song by Artist'
+    with pytest.raises(KeyError):
+        partial.format(title="Song")
+
+
+def test_placeholder_mismatch_fails_at_load(tmp_path, monkeypatch):
+    for name in PROMPT_FIELDS:
+        (tmp_path / name).write_text("no placeholders")
+    monkeypatch.setattr("app.core.prompt_registry.PROMPT_FIELDS", {"image_analysis.txt": frozenset({"top_songs"})})
+    with pytest.raises(PromptTemplateError, match="missing placeholders"):
+        PromptRegistry(prompts_dir=tmp_path).load()
+
+
+def test_hot_reload_picks_up_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.prompt_registry.PROMPT_FIELDS", {"judge.txt": frozenset({"song"})})
+    path = tmp_path / "judge.txt"
+    path.write_text("Rate {song}")
+    registry = PromptRegistry(prompts_dir=tmp_path, hot_reload=True)
+    assert registry.get("judge.txt").format(song="A") == "Rate A"
+
+    path.write_text("Judge {song}")
+    os.utime(path, (1, 1))
+    assert registry.get("judge.txt").format(song="A") == "Judge A"
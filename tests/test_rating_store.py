@@ -0,0 +1,158 @@
+import asyncio
+import random
+import sys
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.rec_service.rating_store import (
+    DEFAULT_RATING,
+    SQLiteRatingStore,
+    context_bucket,
+    elo_update,
+    set_rating_store,
+    track_key,
+)
+from app.rec_service.recommendation import RecommendationService, RequestContext
+from app.rec_service.tourney import Tourney
+from tests.helpers import make_song
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteRatingStore(str(tmp_path / "ratings" / "ratings.sqlite3"))
+    set_rating_store(store)
+    yield store
+    set_rating_store(None)
+
+
+def test_elo_update_moves_ratings_symmetrically():
+    ratings = elo_update({}, [("a", "b")], k_factor=32)
+    assert ratings["a"] == (DEFAULT_RATING + 16, 1)
+    assert ratings["b"] == (DEFAULT_RATING - 16, 1)
+    # An expected win moves less than an upset
+    ratings = elo_update(ratings, [("a", "b"), ("b", "a")], k_factor=32)
+    assert ratings["a"][0] < DEFAULT_RATING + 16
+    assert ratings["a"][1] == ratings["b"][1] == 3
+
+
+def test_context_bucket_is_coarse():
+    assert context_bucket({"isDaytime": True}, {"energy_level": "high"}) == "high:day"
+    assert context_bucket({"isDaytime": False}, {"mood": "calm and peaceful"}) == "low:night"
+    assert context_bucket({}, {}) == "mid:any"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_accumulates_ratings(store):
+    await store.record("user", "mid:day", [("a", "b"), ("a", "c")])
+    await store.record("user", "mid:day", [("a", "b")])
+
+    ratings = await store.get("user", "mid:day", ["a", "b", "c", "unknown"])
+    assert set(ratings) == {"a", "b", "c"}
+    assert ratings["a"][1] == 3
+    assert ratings["a"][0] > ratings["c"][0] > ratings["b"][0]
+    # Users and buckets are kept apart
+    assert await store.get("other user", "mid:day", ["a"]) == {}
+    assert await store.get("user", "high:night", ["a"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_ratings_round_trip_through_recommendation_service(store):
+    service = RecommendationService()
+    context = RequestContext(
+        session_id="session", user_id="user", location_weather_analysis={"isDaytime": True}, image_analysis={"energy_level": "low"}
+    )
+    songs = [make_song(i) for i in range(4)]
+
+    assert await service.load_ratings(context, songs) == {}
+    await service.save_ratings(context, [(songs[3], songs[0]), (songs[3], songs[1])])
+
+    ratings = await service.load_ratings(context, songs)
+    assert set(ratings) == {songs[0], songs[1], songs[3]}
+    assert ratings[songs[3]] > DEFAULT_RATING > ratings[songs[0]]
+    assert await store.get("user", "low:day", [track_key(songs[3])])
+
+
+@pytest.mark.asyncio
+async def test_overlapping_requests_keep_their_own_context(store):
+    service = RecommendationService()
+
+    async def get_user_id(session_id):
+        return {"night session": "night owl", "day session": "early bird"}[session_id]
+
+    async def get_image_analysis(image_data, session_id):
+        # The first request's photo takes longer, so the second request prepares in between
+        await asyncio.sleep(0.05 if session_id == "night session" else 0)
+        return {"energy_level": "low" if session_id == "night session" else "high"}
+
+    async def get_location_weather_analysis(location):
+        return {"isDaytime": location == "day"}
+
+    async def get_user_context(session_id):
+        return {"genres": [session_id]}, {f"{session_id} artist": 1.0}
+
+    async def get_audio_analysis(audio_data):
+        return {}
+
+    service.get_user_id = get_user_id
+    service.get_image_analysis = get_image_analysis
+    service.get_location_weather_analysis = get_location_weather_analysis
+    service.get_user_context = get_user_context
+    service.get_audio_analysis = get_audio_analysis
+    songs = [make_song(i) for i in range(4)]
+
+    async def request(session_id, location, winner):
+        context = await service.prepare(b"", None, location, session_id)
+        await service.save_ratings(context, [(songs[winner], songs[0])])
+        return context
+
+    night, day = await asyncio.gather(request("night session", "night", 3), request("day session", "day", 2))
+
+    assert (night.user_id, night.location_weather_analysis, night.image_analysis) == \
+        ("night owl", {"isDaytime": False}, {"energy_level": "low"})
+    assert (day.user_id, day.location_weather_analysis, day.image_analysis) == \
+        ("early bird", {"isDaytime": True}, {"energy_level": "high"})
+    assert night.artist_weights == {"night session artist": 1.0} and day.artist_weights == {"day session artist": 1.0}
+    assert night.prompt_template.segments != day.prompt_template.segments
+    # Each request's judgements land under its own user and context bucket
+    assert set(await store.get("night owl", "low:night", [track_key(song) for song in songs])) == \
+        {track_key(songs[3]), track_key(songs[0])}
+    assert set(await store.get("early bird", "high:day", [track_key(song) for song in songs])) == \
+        {track_key(songs[2]), track_key(songs[0])}
+    assert await store.get("night owl", "high:day", [track_key(songs[3])]) == {}
+    assert await store.get("early bird", "low:night", [track_key(songs[2])]) == {}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_records_keep_every_update(store):
+    # Two stores on one file stand in for two app processes
+    other = SQLiteRatingStore(store.path)
+    try:
+        await asyncio.gather(*(
+            (store if i % 2 else other).record("user", "mid:day", [("a", "b")]) for i in range(20)
+        ))
+        ratings = await store.get("user", "mid:day", ["a", "b"])
+        assert ratings["a"][1] == ratings["b"][1] == 20
+        assert ratings == elo_update({}, [("a", "b")] * 20)
+    finally:
+        await other.close()
+
+
+def test_seeded_brackets_pair_strong_with_weak(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.RATING_SEED_NOISE", 0.0)
+    songs = [make_song(i) for i in range(9)]
+    ratings = {song: DEFAULT_RATING + 10 * i for i, song in enumerate(songs)}
+    tourney = Tourney(list(songs), "", seed_ratings=ratings)
+
+    random.seed(0)
+    order = tourney._bracket_order(tourney.pool)
+
+    pairs = {frozenset((order[i].popularity_score, order[i + 1].popularity_score)) for i in range(0, 8, 2)}
+    assert pairs == {frozenset((8, 0)), frozenset((7, 1)), frozenset((6, 2)), frozenset((5, 3))}
+    # The middle seed gets the bye
+    assert order[-1].popularity_score == 4
+
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.rec_service.candidate_pool import CandidatePool
+from app.rec_service.tourney import Tourney
+from tests.helpers import make_song
+
+
+class FakeSpotifyService:
+    """Returns each source's songs after a fixed delay"""
+    def __init__(self, delays: dict):
+        self.delays = delays
+
+    async def _songs(self, source: str, start: int):
+        await asyncio.sleep(self.delays[source])
+        return [make_song(start + i) for i in range(5)]
+
+    async def get_user_top_artists(self, session_id, time_range, limit):
+        return []
+
+    async def get_user_top_tracks(self, session_id, **kwargs):
+        return await self._songs("top_tracks", 0)
+
+    async def get_user_saved_tracks(self, session_id, *args):
+        return await self._songs("saved_tracks", 100)
+
+
+class FakeJudge:
+    """Always picks the song with the higher popularity"""
+    async def get_recommendation(self, song_1, song_2, prompt_template):
+        await asyncio.sleep(0.01)
+        return 0 if song_1.popularity_score >= song_2.popularity_score else 1
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_songs_as_sources_arrive():
+    spotify = FakeSpotifyService({"top_tracks": 0.0, "saved_tracks": 0.05})
+    pool = CandidatePool([], "session", spotify)
+    fill_task = asyncio.create_task(pool.add_songs_parallel())
+
+    size = await pool.wait_for_size(5)
+    assert size == 5
+    assert not pool.finished
+
+    streamed = [song async for song in pool.stream(start=size)]
+    await fill_task
+    assert len(streamed) == 5
+    assert all(song.popularity_score >= 100 for song in streamed)
+
+
+@pytest.mark.asyncio
+async def test_tourney_admits_late_songs(monkeypatch):
+    monkeypatch.setattr("app.rec_service.tourney.gemini_service", FakeJudge())
+    tourney = Tourney([make_song(i) for i in range(8)], "", num_tournaments=2, use_alternating_services=False)
+
+    async def admit_later():
+        await asyncio.sleep(0.005)
+        assert tourney.admit(make_song(500))
+        assert not tourney.admit(make_song(500))
+
+    admit_task = asyncio.create_task(admit_later())
+    results = await tourney.run_tourney(num_recommendations=3)
+    await admit_task
+
+    assert len(tourney.pool) == 9
+    # The late song has the highest popularity so it must win every bracket
+    assert results[0][0].title == "Song 500"
+    assert not tourney.pending_songs
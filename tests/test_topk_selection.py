@@ -0,0 +1,149 @@
+import random
+import sys
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.metrics import CACHE_REQUESTS
+from app.rec_service.comparison_cache import ComparisonCache, cache_aware_order, context_fingerprint
+from app.rec_service.recommendation import RecommendationService, RequestContext
+from app.rec_service.topk_selection import TopKSelector, tree_comparisons
+from app.rec_service.tourney import Tourney
+from tests.helpers import PopularityJudge, make_song
+
+
+@pytest.fixture
+def judge(monkeypatch):
+    judge = PopularityJudge()
+    monkeypatch.setattr("app.rec_service.tourney.gemini_service", judge)
+    return judge
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 2, 5, 33, 75])
+async def test_selects_exact_top_k_in_order(judge, size):
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(size)]
+    selector = TopKSelector(list(songs), "", use_alternating_services=False)
+
+    results = await selector.run_tourney(num_recommendations=5)
+
+    expected = sorted(songs, key=lambda song: song.popularity_score, reverse=True)[:5]
+    assert [song for song, _probability in results] == expected
+    assert sum(probability for _song, probability in results) == pytest.approx(100)
+    assert judge.calls == len(selector.comparisons) <= tree_comparisons(size, 5)
+
+
+@pytest.mark.asyncio
+async def test_uses_far_fewer_judgements_than_brackets(judge):
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(75)]
+    await TopKSelector(list(songs), "", use_alternating_services=False).run_tourney(5)
+    tree_calls = judge.calls
+    await Tourney(list(songs), "", use_alternating_services=False).run_tourney(5)
+    assert tree_calls < (judge.calls - tree_calls) / 2
+
+
+@pytest.mark.asyncio
+async def test_comparison_cache_answers_repeat_matchups(judge):
+    random.seed(0)
+    cache = ComparisonCache()
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(20)]
+    hits = CACHE_REQUESTS.labels(cache="comparison", result="hit").value
+
+    first = await TopKSelector(list(songs), "context", use_alternating_services=False, comparison_cache=cache).run_tourney(3)
+    calls = judge.calls
+    second = await TopKSelector(list(songs), "context", use_alternating_services=False, comparison_cache=cache).run_tourney(3)
+
+    assert [song for song, _p in first] == [song for song, _p in second]
+    # The leaves are shuffled again, but first-round pairs are the ones already judged
+    repeat_calls = judge.calls - calls
+    assert repeat_calls < calls / 2
+    assert CACHE_REQUESTS.labels(cache="comparison", result="hit").value - hits >= 10
+
+    # Another context does not share judgements
+    await TopKSelector(list(songs), "other context", use_alternating_services=False, comparison_cache=cache).run_tourney(3)
+    assert judge.calls - calls - repeat_calls >= 19
+
+
+@pytest.mark.asyncio
+async def test_each_request_fingerprints_its_own_context(judge, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.COMPARISON_CACHE_ENABLED", True)
+    monkeypatch.setattr("app.core.config.settings.TOURNEY_SELECTION", "tree")
+    service = RecommendationService()
+
+    def sunny():
+        return RequestContext(location_weather_analysis={"isDaytime": True}, image_analysis={"mood": "happy"})
+
+    def rainy():
+        return RequestContext(location_weather_analysis={"isDaytime": False}, image_analysis={"mood": "calm"})
+
+    def fingerprint(context):
+        return context_fingerprint(service.prepare_prompt_template(context))
+
+    assert fingerprint(sunny()) == fingerprint(sunny())
+    assert fingerprint(sunny()) != fingerprint(rainy())
+
+    random.seed(0)
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(20)]
+    await service.find_recommendations(sunny(), list(songs))
+    first_calls = judge.calls
+    # The shared service does not reuse the first request's judgements under another context
+    await service.find_recommendations(rainy(), list(songs))
+    assert judge.calls - first_calls >= len(songs) - 1
+    # but does under the same one
+    calls = judge.calls
+    await service.find_recommendations(sunny(), list(songs))
+    assert judge.calls - calls < first_calls / 2
+
+
+def test_cache_is_unordered_and_bounded(monkeypatch):
+    cache = ComparisonCache(ttl_s=10, max_entries=2)
+    a, b, c = make_song(1), make_song(2), make_song(3)
+    fingerprint = context_fingerprint("context")
+    cache.put(fingerprint, a, b)
+    assert cache.get(fingerprint, b, a) == a
+    cache.put(fingerprint, c, a)
+    cache.put(fingerprint, c, b)
+    assert len(cache) == 2
+    assert cache.get(fingerprint, a, b) is None
+
+    monkeypatch.setattr("app.rec_service.comparison_cache.time.monotonic", lambda: float("inf"))
+    assert cache.get(fingerprint, c, b) is None
+
+
+def test_cache_aware_order_pairs_known_outcomes():
+    cache = ComparisonCache()
+    fingerprint = context_fingerprint("context")
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(11)]
+    for first, second in ((0, 1), (2, 3), (4, 5), (6, 7)):
+        cache.put(fingerprint, songs[first], songs[second])
+
+    order = cache_aware_order(songs, cache, fingerprint)
+
+    assert sorted(order, key=lambda song: song.title) == sorted(songs, key=lambda song: song.title)
+    pairs = {frozenset((order[i].title, order[i + 1].title)) for i in range(0, 10, 2)}
+    for first, second in ((0, 1), (2, 3), (4, 5), (6, 7)):
+        assert frozenset((f"Song {first}", f"Song {second}")) in pairs
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("aware", [True, False])
+async def test_repeat_request_reuses_first_round(judge, monkeypatch, aware):
+    monkeypatch.setattr("app.core.config.settings.COMPARISON_CACHE_AWARE_PAIRING", aware)
+    cache = ComparisonCache()
+    songs = [make_song(i, popularity_score=(i * 37) % 101) for i in range(64)]
+    await Tourney(list(songs), "context", use_alternating_services=False, comparison_cache=cache).run_tourney(5)
+
+    repeat = Tourney(list(songs), "context", use_alternating_services=False, comparison_cache=cache)
+    await repeat.run_tourney(5)
+
+    assert repeat.matchups == 3 * 63
+    if aware:
+        # Every first-round pair of every bracket was judged in the first request
+        assert repeat.cached_matchups >= 3 * 32
+        assert repeat.cached_fraction > 0.5
+    else:
+        assert repeat.cached_fraction < 0.5
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import pytest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.core.tracing import FileSpanExporter, OTLPHttpSpanExporter, span, start_trace, traced
+
+
+def test_span_is_noop_outside_trace():
+    with span("untraced") as current:
+        assert current is None
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_threads():
+    def blocking_call():
+        with span("thread.call"):
+            return 1
+
+    async def fetch(index):
+        await asyncio.sleep(0.001)
+        return await asyncio.to_thread(blocking_call)
+
+    with start_trace("GET /test") as trace:
+        with span("stage", engine="tourney"):
+            await asyncio.gather(*(traced("fetch", fetch(i), index=i) for i in range(3)))
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+
+    tree = trace.to_dict()["root"]
+    stage, failing = tree["children"]
+    assert stage["attributes"] == {"engine": "tourney"}
+    assert [child["name"] for child in stage["children"]] == ["fetch"] * 3
+    assert all(child["children"][0]["name"] == "thread.call" for child in stage["children"])
+    assert failing["status"] == "error"
+    assert all(s.end_ns is not None for s in trace.spans)
+
+
+def test_exporters(tmp_path):
+    with start_trace("GET /test") as trace:
+        with span("child"):
+            pass
+
+    path = tmp_path / "traces.jsonl"
+    FileSpanExporter(str(path)).export(trace)
+    exported = json.loads(path.read_text())
+    assert exported["trace_id"] == trace.trace_id
+    assert exported["root"]["children"][0]["name"] == "child"
+
+    otlp = OTLPHttpSpanExporter("http://localhost:4318/v1/traces", "test").to_otlp(trace)
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["name"] for s in spans} == {"GET /test", "child"}
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+
+
+def test_middleware_returns_span_tree_when_requested():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.main import tracing_middleware
+
+    app = FastAPI()
+    app.middleware("http")(tracing_middleware)
+
+    @app.get("/work")
+    async def work():
+        with span("stage"):
+            return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/work").json() == {"ok": True}
+    body = client.get("/work", headers={"X-Trace": "1"}).json()
+    assert body["response"] == {"ok": True}
+    assert body["trace"]["root"]["children"][0]["name"] == "stage"
+    assert client.get("/work?trace=1").json()["trace"]["root"]["name"] == "GET /work"
+
+
+def test_exporter_without_export_fails_at_construction():
+    from app.core.tracing import SpanExporter
+
+    class Incomplete(SpanExporter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
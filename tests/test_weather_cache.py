@@ -0,0 +1,94 @@
+import asyncio
+import sys
+from pathlib import Path
+import pytest
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from fastapi import HTTPException
+from app.core.metrics import CACHE_REQUESTS
+from app.services.weather_service import WeatherService, geohash, parse_location
+
+
+class CountingFetch:
+    def __init__(self, latency_s: float = 0.01, error: Exception = None):
+        self.latency_s = latency_s
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, latitude, longitude):
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        if self.error:
+            raise self.error
+        return {"isDaytime": True, "latitude": latitude}
+
+
+def test_geohash_matches_reference():
+    assert geohash(42.6, -5.6, 5) == "ezs42"
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_parse_location():
+    assert parse_location("40.7128,-74.0060") == (40.7128, -74.006)
+    assert parse_location(" 40.7, -74.0 ") == (40.7, -74.0)
+    assert parse_location(None) is None
+    assert parse_location("somewhere") is None
+    assert parse_location("123,0") is None
+
+
+@pytest.mark.asyncio
+async def test_nearby_concurrent_lookups_share_one_fetch(monkeypatch):
+    service = WeatherService()
+    fetch = CountingFetch()
+    monkeypatch.setattr(service, "_fetch_current_weather", fetch)
+
+    lookups = {result: CACHE_REQUESTS.labels(cache="weather", result=result).value for result in ("hit", "miss", "coalesced")}
+
+    # About 100m apart, in the same ~5km cell
+    results = await asyncio.gather(*(service.get_current_weather(40.7128 + i * 0.0002, -74.0060) for i in range(5)))
+    assert fetch.calls == 1
+    assert all(result == results[0] for result in results)
+    # One lookup fetched, the others joined it; none was served from the cache
+    assert {
+        result: CACHE_REQUESTS.labels(cache="weather", result=result).value - count for result, count in lookups.items()
+    } == {"hit": 0, "miss": 1, "coalesced": 4}
+
+    # Later lookups in the cell come from the cache, another city is fetched
+    await service.get_current_weather(40.7130, -74.0061)
+    assert fetch.calls == 1
+    await service.get_current_weather(51.5074, -0.1278)
+    assert fetch.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_not_cached(monkeypatch):
+    service = WeatherService()
+    fetch = CountingFetch(error=HTTPException(status_code=500, detail="down"))
+    monkeypatch.setattr(service, "_fetch_current_weather", fetch)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await service.get_current_weather(40.7128, -74.0060)
+    assert fetch.calls == 2
+    assert not service._in_flight
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_lookup(monkeypatch):
+    service = WeatherService()
+    fetch = CountingFetch(latency_s=0.05)
+    monkeypatch.setattr(service, "_fetch_current_weather", fetch)
+
+    first = asyncio.create_task(service.get_current_weather(40.7128, -74.0060))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(service.get_current_weather(40.7128, -74.0060))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert (await second)["isDaytime"] is True
+    assert fetch.calls == 1
+